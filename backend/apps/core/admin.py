@@ -1,8 +1,8 @@
 from django.contrib import admin
 from apps.core.models import (
-    SystemSettings, ImportJob, ExportJob, EmailTemplate,
+    SystemSettings, ImportJob, ExportJob, EmailTemplate, OutgoingEmail,
     SystemLog, BackupSchedule, BackupRecord, APIRequestLog,
-    Notification, SystemHealthCheck
+    Notification, SystemHealthCheck, TaskStatus
 )
 
 
@@ -17,19 +17,25 @@ class SystemSettingsAdmin(admin.ModelAdmin):
 @admin.register(ImportJob)
 class ImportJobAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'status', 'created_count', 'updated_count', 'error_count', 'created_at')
-    list_filter = ('status', 'created_at')
+    list_filter = ('status', 'dry_run', 'created_at')
     search_fields = ('file_path', 'user__email')
-    readonly_fields = ('created_at', 'started_at', 'completed_at', 'task_id')
+    readonly_fields = (
+        'created_at', 'updated_at', 'started_at', 'completed_at', 'task_id', 'checkpoint_offset',
+        'validation_report'
+    )
 
     fieldsets = (
         ('Basic Info', {
-            'fields': ('user', 'file_path', 'status', 'task_id')
+            'fields': ('user', 'supplier', 'file_path', 'status', 'task_id', 'dry_run')
         }),
         ('Statistics', {
-            'fields': ('total_processed', 'created_count', 'updated_count', 'error_count')
+            'fields': (
+                'total_processed', 'created_count', 'updated_count', 'unchanged_count',
+                'error_count', 'checkpoint_offset', 'validation_report'
+            )
         }),
         ('Timestamps', {
-            'fields': ('created_at', 'started_at', 'completed_at')
+            'fields': ('created_at', 'started_at', 'updated_at', 'completed_at')
         }),
         ('Errors', {
             'fields': ('error_message', 'error_traceback'),
@@ -43,7 +49,15 @@ class ExportJobAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'status', 'total_exported', 'created_at')
     list_filter = ('status', 'created_at')
     search_fields = ('file_path', 'user__email')
-    readonly_fields = ('created_at', 'started_at', 'completed_at', 'task_id')
+    readonly_fields = ('created_at', 'started_at', 'completed_at', 'task_id', 'timings', 'file_size', 'checksum', 'watermark', 'tombstone_count')
+
+
+@admin.register(TaskStatus)
+class TaskStatusAdmin(admin.ModelAdmin):
+    list_display = ('task_id', 'name', 'user', 'status', 'progress_current', 'progress_total', 'created_at')
+    list_filter = ('status', 'name', 'created_at')
+    search_fields = ('task_id', 'name', 'user__email')
+    readonly_fields = ('created_at', 'updated_at', 'started_at', 'finished_at')
 
 
 @admin.register(EmailTemplate)
@@ -54,6 +68,14 @@ class EmailTemplateAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
 
 
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'subject', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('subject',)
+    readonly_fields = ('created_at', 'updated_at', 'sent_at', 'attempts', 'error_message')
+
+
 @admin.register(SystemLog)
 class SystemLogAdmin(admin.ModelAdmin):
     list_display = ('level', 'module', 'message_short', 'user', 'created_at')
@@ -71,13 +93,20 @@ class BackupScheduleAdmin(admin.ModelAdmin):
     list_display = ('name', 'backup_type', 'frequency', 'is_active', 'last_run', 'next_run')
     list_filter = ('backup_type', 'frequency', 'is_active')
     search_fields = ('name',)
+    readonly_fields = ('last_run', 'locked_until')
+
+    def save_model(self, request, obj, form, change):
+        # Новое время или периодичность: следующий запуск вычисляется заново
+        if change and {'frequency', 'scheduled_time', 'is_active'} & set(form.changed_data):
+            obj.next_run = None
+        super().save_model(request, obj, form, change)
 
 
 @admin.register(BackupRecord)
 class BackupRecordAdmin(admin.ModelAdmin):
-    list_display = ('id', 'schedule', 'status', 'file_size_mb', 'duration', 'created_at')
-    list_filter = ('status', 'schedule', 'created_at')
-    readonly_fields = ('created_at', 'completed_at')
+    list_display = ('id', 'schedule', 'backup_type', 'status', 'file_size_mb', 'duration', 'created_at')
+    list_filter = ('status', 'backup_type', 'schedule', 'created_at')
+    readonly_fields = ('created_at', 'completed_at', 'details')
 
     def file_size_mb(self, obj):
         if obj.file_size:
@@ -4,3 +4,12 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
     verbose_name = 'Core'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from apps.core.email_templates import invalidate_email_templates
+        from apps.core.models import EmailTemplate
+
+        # Скомпилированные шаблоны писем сбрасываются при любом изменении EmailTemplate
+        post_save.connect(invalidate_email_templates, sender=EmailTemplate, dispatch_uid='email_templates_save')
+        post_delete.connect(invalidate_email_templates, sender=EmailTemplate, dispatch_uid='email_templates_delete')
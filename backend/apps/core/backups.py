@@ -0,0 +1,465 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tarfile
+import time
+from calendar import monthrange
+from datetime import datetime, time as dt_time, timedelta
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+
+from apps.core.formats import COMPRESSIONS, open_binary_writer
+
+
+DATABASE_DIR = 'database'
+MEDIA_DIR = 'media'
+# Текущее состояние медиа: путь -> размер, mtime, sha256 и архив с этой версией файла
+MANIFEST_NAME = 'manifest.json'
+COPY_BUFFER_SIZE = 1024 * 1024
+# Архив моложе этого срока (секунды) не считается брошенным: его снимок мог еще не дописать манифест
+ORPHAN_ARCHIVE_GRACE = 60 * 60
+
+
+def backup_timestamp():
+    return timezone.localtime().strftime('%Y%m%d_%H%M%S_%f')
+
+
+def compress_file(source_path, target_path, compression):
+    """Потоковое сжатие файла (без чтения целиком в память); размер результата"""
+    temp_path = target_path + '.tmp'
+    try:
+        with open(source_path, 'rb') as source, open(temp_path, 'wb') as raw:
+            stream, checksum = open_binary_writer(raw, compression)
+            shutil.copyfileobj(source, stream, COPY_BUFFER_SIZE)
+            stream.close()
+        os.replace(temp_path, target_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return checksum.size
+
+
+class BackupRestarted(Exception):
+    """Снимок порциями начинается заново слишком часто из-за записи в базу"""
+
+
+def backup_database(target_dir, compression='none', pages=None, pause=None, max_restarts=None):
+    """
+    Снимок SQLite через online backup API: копирование идет порциями по pages
+    страниц, между порциями база свободна для записи. Запись из другого
+    соединения заставляет SQLite начинать копирование заново; после
+    max_restarts перезапусков оставшееся копируется за один шаг (запись
+    ждет только это время). Снимок проверяется (quick_check) и сжимается потоково.
+    """
+    database = settings.DATABASES['default']
+    if database['ENGINE'] != 'django.db.backends.sqlite3':
+        raise Exception("Ошибка резервного копирования: поддерживается только SQLite")
+    pages = pages or settings.BACKUP_PAGES_PER_STEP
+    pause = settings.BACKUP_STEP_PAUSE if pause is None else pause
+    max_restarts = settings.BACKUP_MAX_RESTARTS if max_restarts is None else max_restarts
+
+    os.makedirs(target_dir, exist_ok=True)
+    snapshot_path = os.path.join(target_dir, f'db_{backup_timestamp()}.sqlite3')
+    temp_path = snapshot_path + '.tmp'
+    progress = {'steps': 0, 'pages': 0, 'restarts': 0, 'remaining': None, 'single_step': False}
+
+    def on_step(status, remaining, total):
+        progress['steps'] += 1
+        progress['pages'] = total
+        # После перезапуска остаток не уменьшается
+        if progress['remaining'] is not None and remaining >= progress['remaining']:
+            progress['restarts'] += 1
+            if progress['restarts'] > max_restarts:
+                raise BackupRestarted()
+        progress['remaining'] = remaining
+        if remaining and pause:
+            time.sleep(pause)
+
+    try:
+        source = sqlite3.connect(str(database['NAME']))
+        target = sqlite3.connect(temp_path)
+        try:
+            try:
+                source.backup(target, pages=pages, progress=on_step)
+            except BackupRestarted:
+                progress['single_step'] = True
+                source.backup(target, pages=-1)
+            check = target.execute('PRAGMA quick_check').fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+        if check != 'ok':
+            raise Exception(f"Ошибка проверки снимка базы: {check}")
+
+        if compression == 'none':
+            os.replace(temp_path, snapshot_path)
+            final_path = snapshot_path
+        else:
+            final_path = snapshot_path + COMPRESSIONS[compression]
+            compress_file(temp_path, final_path, compression)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return {
+        'path': final_path,
+        'size': os.path.getsize(final_path),
+        'pages': progress['pages'],
+        'steps': progress['steps'],
+        'restarts': progress['restarts'],
+        'single_step': progress['single_step'],
+    }
+
+
+class HashingReader:
+    """Чтение файла в архив с попутным подсчетом SHA-256"""
+
+    def __init__(self, file):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.sha256.update(data)
+        return data
+
+
+class MediaSnapshot:
+    """
+    Инкрементальная копия MEDIA_ROOT.
+
+    Манифест хранит для каждого файла размер, mtime, SHA-256 и архив,
+    где лежит его текущая версия. Файл с прежними размером и mtime не
+    читается; при совпадении размера и другом mtime сравнивается хеш.
+    В новый tar (сжатие на лету) попадают только новые и измененные файлы;
+    для восстановления последнего состояния нужны архивы, на которые
+    ссылается манифест.
+    """
+
+    def __init__(self, target_dir, compression='none', media_root=None, exclude=None, full=False):
+        self.target_dir = target_dir
+        self.compression = compression
+        self.media_root = os.path.realpath(str(media_root or settings.MEDIA_ROOT))
+        self.exclude = set(settings.BACKUP_MEDIA_EXCLUDE if exclude is None else exclude)
+        self.full = full
+        self.manifest_path = os.path.join(target_dir, MANIFEST_NAME)
+        self.stats = {'files': 0, 'changed': 0, 'unchanged': 0, 'removed': 0, 'errors': 0, 'bytes_added': 0}
+
+    def load_manifest(self):
+        if self.full or not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, encoding='utf-8') as file:
+            return json.load(file)['files']
+
+    def save_manifest(self, files):
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'created_at': timezone.now().isoformat(), 'files': files}, file, separators=(',', ':'))
+        os.replace(temp_path, self.manifest_path)
+
+    def walk(self):
+        """(относительный путь, полный путь, stat) для всех файлов медиа, кроме исключенных каталогов"""
+        stack = [self.media_root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                self.stats['errors'] += 1
+                continue
+            with entries:
+                for entry in entries:
+                    relative = os.path.relpath(entry.path, self.media_root)
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if directory != self.media_root or entry.name not in self.exclude:
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            yield relative, entry.path, entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+
+    def run(self):
+        from apps.core.images import file_sha256
+
+        os.makedirs(self.target_dir, exist_ok=True)
+        previous = self.load_manifest()
+        archive_name = f'media_{backup_timestamp()}.tar' + COMPRESSIONS[self.compression]
+        archive_path = os.path.join(self.target_dir, archive_name)
+        temp_path = archive_path + '.tmp'
+        files = {}
+
+        try:
+            with open(temp_path, 'wb') as raw:
+                stream, checksum = open_binary_writer(raw, self.compression)
+                # Потоковый режим tar: архив пишется последовательно, без перемотки
+                with tarfile.open(fileobj=stream, mode='w|') as tar:
+                    for relative, full_path, stat in self.walk():
+                        self.stats['files'] += 1
+                        entry = previous.get(relative)
+                        if entry and entry['size'] == stat.st_size:
+                            if entry['mtime_ns'] == stat.st_mtime_ns:
+                                files[relative] = entry
+                                self.stats['unchanged'] += 1
+                                continue
+                            try:
+                                same = file_sha256(full_path) == entry['sha256']
+                            except OSError:
+                                same = False
+                            if same:
+                                files[relative] = {**entry, 'mtime_ns': stat.st_mtime_ns}
+                                self.stats['unchanged'] += 1
+                                continue
+
+                        try:
+                            tarinfo = tar.gettarinfo(full_path, arcname=relative)
+                            with open(full_path, 'rb') as file:
+                                reader = HashingReader(file)
+                                tar.addfile(tarinfo, reader)
+                        except OSError:
+                            # Файл удален или меняется во время копирования: прежняя версия остается в манифесте
+                            self.stats['errors'] += 1
+                            if entry:
+                                files[relative] = entry
+                            continue
+                        files[relative] = {
+                            'size': tarinfo.size,
+                            'mtime_ns': stat.st_mtime_ns,
+                            'sha256': reader.sha256.hexdigest(),
+                            'archive': archive_name,
+                        }
+                        self.stats['changed'] += 1
+                        self.stats['bytes_added'] += tarinfo.size
+                stream.close()
+
+            if self.stats['changed']:
+                os.replace(temp_path, archive_path)
+            else:
+                os.remove(temp_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.stats['removed'] = len(set(previous) - set(files))
+        self.save_manifest(files)
+        if not self.stats['changed']:
+            return {**self.stats, 'path': None, 'size': 0}
+        return {**self.stats, 'path': archive_path, 'size': checksum.size}
+
+
+def run_backup(backup_type='database', schedule=None, compress=None, media_full=False, record=None):
+    """
+    Резервная копия базы и/или медиа с записью результата, размера и длительности в BackupRecord.
+    record - запись, заранее созданная планировщиком (статус pending).
+    """
+    BackupRecord = apps.get_model('core', 'BackupRecord')
+
+    if compress is None:
+        compress = schedule.compress_backup if schedule is not None else True
+    compression = settings.BACKUP_COMPRESSION if compress else 'none'
+    include_database = backup_type in ('database', 'full')
+    include_media = backup_type in ('media', 'full') or (schedule is not None and schedule.include_media)
+
+    if record is None:
+        record = BackupRecord.objects.create(schedule=schedule, backup_type=backup_type, status='running')
+    else:
+        BackupRecord.objects.filter(pk=record.pk).update(status='running')
+    started = time.monotonic()
+    details = {'compression': compression}
+    try:
+        if include_database:
+            details['database'] = backup_database(
+                os.path.join(settings.BACKUP_ROOT, DATABASE_DIR), compression=compression
+            )
+        if include_media:
+            details['media'] = MediaSnapshot(
+                os.path.join(settings.BACKUP_ROOT, MEDIA_DIR), compression=compression, full=media_full
+            ).run()
+    except Exception as e:
+        BackupRecord.objects.filter(pk=record.pk).update(
+            status='failed',
+            error_message=str(e),
+            duration=timedelta(seconds=time.monotonic() - started),
+            completed_at=timezone.now(),
+            details=details,
+        )
+        raise
+
+    paths = [part['path'] for part in (details.get('database'), details.get('media')) if part and part['path']]
+    BackupRecord.objects.filter(pk=record.pk).update(
+        status='completed',
+        file_path=paths[0] if paths else '',
+        file_size=sum(part['size'] for part in (details.get('database'), details.get('media')) if part),
+        duration=timedelta(seconds=time.monotonic() - started),
+        completed_at=timezone.now(),
+        details=details,
+    )
+    record.refresh_from_db()
+    return record
+
+
+def add_months(value, months, day):
+    """Дата через months месяцев с днем day (последний день, если месяц короче)"""
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    return value.replace(year=year, month=month, day=min(day, monthrange(year, month)[1]))
+
+
+def compute_next_run(schedule, after=None):
+    """
+    Следующий запуск графика строго после after (в местном времени, в scheduled_time).
+    День недели и число месяца берутся из прежнего next_run; пропущенные
+    запуски не догоняются.
+    """
+    after = after or timezone.now()
+    scheduled_time = schedule.scheduled_time
+    if isinstance(scheduled_time, str):
+        scheduled_time = dt_time.fromisoformat(scheduled_time)
+
+    anchor = timezone.localtime(schedule.next_run or after).date()
+    candidate = anchor
+    steps = 0
+    while True:
+        run_at = timezone.make_aware(datetime.combine(candidate, scheduled_time))
+        if run_at > after:
+            return run_at
+        steps += 1
+        if schedule.frequency == 'monthly':
+            candidate = add_months(anchor, steps, anchor.day)
+        elif schedule.frequency == 'weekly':
+            candidate = anchor + timedelta(days=7 * steps)
+        else:
+            candidate = anchor + timedelta(days=steps)
+
+
+def release_schedule(schedule_id):
+    BackupSchedule = apps.get_model('core', 'BackupSchedule')
+    BackupSchedule.objects.filter(pk=schedule_id).update(locked_until=None)
+
+
+def dispatch_due_schedules(now=None):
+    """
+    Запуск графиков, время которых пришло. График захватывается одним
+    условным UPDATE (свободная блокировка): сразу выставляются locked_until,
+    last_run и следующий next_run, поэтому параллельный тик или еще не
+    закончившаяся прошлая копия не приведут к повторному запуску.
+    """
+    from django.db.models import Q
+    from apps.core.tasks import generate_backup_task
+
+    BackupSchedule = apps.get_model('core', 'BackupSchedule')
+    BackupRecord = apps.get_model('core', 'BackupRecord')
+
+    now = now or timezone.now()
+    unlocked = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    dispatched = []
+    for schedule in BackupSchedule.objects.filter(unlocked, is_active=True, next_run__lte=now).order_by('next_run'):
+        claimed = BackupSchedule.objects.filter(unlocked, pk=schedule.pk, next_run=schedule.next_run).update(
+            locked_until=now + timedelta(seconds=settings.BACKUP_LOCK_TIMEOUT),
+            last_run=now,
+            next_run=compute_next_run(schedule, now),
+        )
+        if not claimed:
+            continue
+        record = BackupRecord.objects.create(schedule=schedule, backup_type=schedule.backup_type, status='pending')
+        try:
+            generate_backup_task.delay(schedule.backup_type, schedule_id=schedule.id, record_id=record.id)
+        except Exception as e:
+            BackupRecord.objects.filter(pk=record.pk).update(
+                status='failed', error_message=f"Ошибка постановки задачи: {e}", completed_at=timezone.now()
+            )
+            release_schedule(schedule.id)
+            continue
+        dispatched.append(record.id)
+    return dispatched
+
+
+def referenced_media_archives():
+    """Архивы медиа, в которых лежат текущие версии файлов (их удалять нельзя)"""
+    manifest_path = os.path.join(settings.BACKUP_ROOT, MEDIA_DIR, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return set()
+    with open(manifest_path, encoding='utf-8') as file:
+        return {entry['archive'] for entry in json.load(file)['files'].values()}
+
+
+def sweep_orphan_media_archives(keep):
+    """
+    Удаляет архивы медиа, на которые не ссылаются ни манифест, ни оставшиеся копии
+    (например, архив удаленной копии, который манифест тогда еще держал).
+    Свежие архивы не трогаются: снимок мог переименовать архив, но еще не записать манифест.
+    """
+    media_dir = os.path.join(settings.BACKUP_ROOT, MEDIA_DIR)
+    if not os.path.isdir(media_dir):
+        return 0
+    threshold = time.time() - ORPHAN_ARCHIVE_GRACE
+    removed = 0
+    for name in os.listdir(media_dir):
+        if not name.startswith('media_') or '.tar' not in name or name.endswith('.tmp') or name in keep:
+            continue
+        path = os.path.join(media_dir, name)
+        try:
+            if os.path.getmtime(path) > threshold:
+                continue
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def prune_backups():
+    """
+    Удаляет завершенные копии графиков сверх keep_backups одним запросом
+    (номер копии внутри графика - оконная функция). Архив медиа удаляется,
+    только если манифест на него больше не ссылается; архивы, которые манифест
+    отпустил позже, подбирает sweep_orphan_media_archives.
+    """
+    from django.db.models import F, Window
+    from django.db.models.functions import RowNumber
+
+    BackupRecord = apps.get_model('core', 'BackupRecord')
+
+    expired = list(
+        BackupRecord.objects.filter(schedule__isnull=False, status='completed').annotate(
+            position=Window(
+                expression=RowNumber(),
+                partition_by=[F('schedule_id')],
+                order_by=F('created_at').desc(),
+            )
+        ).filter(position__gt=F('schedule__keep_backups')).values_list('id', 'details')
+    )
+
+    referenced = referenced_media_archives()
+    stats = {'records': len(expired), 'files': 0, 'kept_archives': 0, 'orphans': 0}
+    for record_id, details in expired:
+        for part in ('database', 'media'):
+            path = (details.get(part) or {}).get('path')
+            if not path:
+                continue
+            if part == 'media' and os.path.basename(path) in referenced:
+                stats['kept_archives'] += 1
+                continue
+            try:
+                os.remove(path)
+                stats['files'] += 1
+            except FileNotFoundError:
+                pass
+    if expired:
+        BackupRecord.objects.filter(id__in=[record_id for record_id, details in expired]).delete()
+
+    # Пока идет копия, манифест может быть в процессе перезаписи - уборку откладываем
+    if BackupRecord.objects.filter(status='running').exists():
+        return stats
+    keep = set(referenced)
+    for details in BackupRecord.objects.values_list('details', flat=True):
+        path = ((details or {}).get('media') or {}).get('path')
+        if path:
+            keep.add(os.path.basename(path))
+    stats['orphans'] = sweep_orphan_media_archives(keep)
+    return stats
@@ -0,0 +1,295 @@
+import json
+import os
+import platform
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from django.conf import settings
+from django.utils import timezone
+
+
+BENCHMARK_SUPPLIER_USERNAME = 'benchmark_supplier'
+
+# Сгенерированные данные отличаются префиксами, чтобы их можно было дополнять и удалять
+GENERATED_USERNAME_PREFIX = 'gen_'
+GENERATED_SKU_PREFIX = 'GEN-'
+GENERATED_CATEGORY_PREFIX = 'Синтетическая категория '
+GENERATED_PASSWORD = 'benchmark123'
+
+PRODUCT_WORDS = [
+    'кабель', 'монитор', 'бумага', 'ручка', 'стол', 'кресло', 'принтер', 'картридж',
+    'ноутбук', 'клавиатура', 'мышь', 'папка', 'степлер', 'маркер', 'лампа', 'шкаф',
+]
+PRODUCT_ADJECTIVES = ['офисный', 'складской', 'компактный', 'усиленный', 'базовый', 'премиум']
+
+
+@contextmanager
+def timer(results, name):
+    """Записывает длительность блока в results[name] (секунды)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        results[name] = round(time.perf_counter() - started, 4)
+
+
+def get_benchmark_supplier():
+    """Отдельный поставщик для бенчмарков, чтобы не трогать рабочие данные"""
+    from django.apps import apps
+    from django.contrib.auth import get_user_model
+
+    Supplier = apps.get_model('suppliers', 'Supplier')
+    user, created = get_user_model().objects.get_or_create(
+        username=BENCHMARK_SUPPLIER_USERNAME,
+        defaults={'email': 'benchmark@procurepro.local', 'user_type': 'supplier'}
+    )
+    supplier, created = Supplier.objects.get_or_create(user=user, defaults={'name': 'Benchmark Supplier'})
+    return supplier
+
+
+def iter_synthetic_goods(products, categories, parameters=5, seed=42, sku_prefix='BENCH'):
+    """Детерминированный поток товаров; категории идут непрерывными блоками"""
+    rnd = random.Random(seed)
+    categories = max(1, min(categories, products))
+    for index in range(products):
+        yield {
+            'code': f'{sku_prefix}-{index:08d}',
+            'name': f'Товар {index}',
+            'category': f'Категория {index * categories // products:05d}',
+            'price': round(rnd.uniform(10, 100000), 2),
+            'quantity': rnd.randint(0, 500),
+            'description': f'Описание товара {index}',
+            'parameters': {f'Параметр {p}': f'Значение {rnd.randint(1, 50)}' for p in range(parameters)},
+        }
+
+
+def write_synthetic_yaml(file_path, products, categories, parameters=5, seed=42, sku_prefix='BENCH'):
+    """Потоково пишет синтетический каталог в YAML (categories -> goods)"""
+    import yaml
+    from apps.core.import_export import chunked
+    try:
+        from yaml import CSafeDumper as Dumper
+    except ImportError:
+        from yaml import SafeDumper as Dumper
+
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    current = None
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write('categories:\n')
+        goods = iter_synthetic_goods(products, categories, parameters, seed, sku_prefix)
+        for batch in chunked(goods, 500):
+            while batch:
+                category = batch[0]['category']
+                if category != current:
+                    current = category
+                    file.write(f'- name: {json.dumps(category, ensure_ascii=False)}\n  goods:\n')
+                same = [good for good in batch if good['category'] == category]
+                batch = batch[len(same):]
+                for good in same:
+                    del good['category']
+                dumped = yaml.dump(same, Dumper=Dumper, allow_unicode=True, default_flow_style=False)
+                file.write(''.join(f'  {line}\n' for line in dumped.splitlines()))
+    return file_path
+
+
+def write_results(file_path, name, results):
+    """Сохраняет результаты бенчмарка в JSON для сравнения между запусками"""
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    payload = {
+        'benchmark': name,
+        'created_at': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': settings.DATABASES['default']['ENGINE'],
+        'results': results,
+    }
+    with open(file_path, 'w', encoding='utf-8') as file:
+        json.dump(payload, file, ensure_ascii=False, indent=2)
+    return file_path
+
+
+def generated_product_values(index, seed=42):
+    """Детерминированные поля товара с номером index (не зависят от размера пачки)"""
+    rnd = random.Random(f'{seed}-{index}')
+    word = PRODUCT_WORDS[index % len(PRODUCT_WORDS)]
+    return rnd, {
+        'sku': f'{GENERATED_SKU_PREFIX}{index:08d}',
+        'name': f'{word.capitalize()} {rnd.choice(PRODUCT_ADJECTIVES)} {index}',
+        'description': f'Товар для закупок: {word}, модель {index}',
+        'price': Decimal(f'{rnd.uniform(10, 100000):.2f}'),
+        'quantity': rnd.randint(0, 500),
+        'min_quantity': rnd.choice([1, 1, 1, 5, 10]),
+    }
+
+
+def generate_catalog(suppliers=10, categories=100, products=10000, characteristics=5, customers=100,
+                     carts=50, orders=1000, seed=42, batch_size=5000, log=None):
+    """
+    Дополняет БД синтетическим каталогом до заданных размеров через bulk_create.
+
+    Уже созданные объекты с теми же номерами не пересоздаются, поэтому
+    каталог можно наращивать: 10k -> 100k -> 1M товаров.
+    Корзины и заказы создаются у сгенерированных покупателей.
+    """
+    from django.apps import apps
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+    from datetime import timedelta
+    from apps.products.importer import compute_content_hash
+
+    User = get_user_model()
+    Supplier = apps.get_model('suppliers', 'Supplier')
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+    ProductCharacteristic = apps.get_model('products', 'ProductCharacteristic')
+    Cart = apps.get_model('cart', 'Cart')
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+
+    log = log or (lambda message: None)
+    timings = {}
+    password = make_password(GENERATED_PASSWORD)
+
+    def ensure_users(kind, count, user_type):
+        names = [f'{GENERATED_USERNAME_PREFIX}{kind}_{index:05d}' for index in range(count)]
+        existing = set(User.objects.filter(username__in=names).values_list('username', flat=True))
+        User.objects.bulk_create([
+            User(username=name, email=f'{name}@procurepro.local', user_type=user_type, password=password)
+            for name in names if name not in existing
+        ], batch_size=batch_size)
+        return list(User.objects.filter(username__in=names).order_by('username'))
+
+    with timer(timings, 'users'):
+        supplier_users = ensure_users('supplier', suppliers, 'supplier')
+        customer_users = ensure_users('customer', customers, 'client')
+
+        existing = set(Supplier.objects.filter(user__in=supplier_users).values_list('user_id', flat=True))
+        Supplier.objects.bulk_create([
+            Supplier(user=user, name=f'Синтетический поставщик {index:05d}')
+            for index, user in enumerate(supplier_users) if user.id not in existing
+        ])
+        supplier_ids = list(Supplier.objects.filter(user__in=supplier_users).order_by('name').values_list('id', flat=True))
+
+        # bulk_create не вызывает сигналы, корзины создаются явно
+        existing = set(Cart.objects.filter(user__in=customer_users).values_list('user_id', flat=True))
+        Cart.objects.bulk_create([Cart(user=user) for user in customer_users if user.id not in existing])
+
+    with timer(timings, 'categories'):
+        names = [f'{GENERATED_CATEGORY_PREFIX}{index:05d}' for index in range(categories)]
+        existing = set(Category.objects.filter(name__in=names).values_list('name', flat=True))
+        Category.objects.bulk_create([
+            Category(name=name, slug=f'gen-category-{index:05d}', display_order=index)
+            for index, name in enumerate(names) if name not in existing
+        ], batch_size=batch_size)
+        category_ids, category_names = zip(*Category.objects.filter(name__in=names).order_by('name').values_list('id', 'name'))
+
+    with timer(timings, 'products'):
+        start = Product.objects.filter(sku__startswith=GENERATED_SKU_PREFIX).count()
+        for batch_start in range(start, products, batch_size):
+            batch = []
+            parameters = {}
+            for index in range(batch_start, min(batch_start + batch_size, products)):
+                rnd, values = generated_product_values(index, seed)
+                category = index * len(category_ids) // products
+                parameters[values['sku']] = [
+                    (f'Параметр {number}', f'Значение {rnd.randint(1, 50)}') for number in range(characteristics)
+                ]
+                # Хеш как у импорта: повторная загрузка выгрузки не меняет товары
+                values['content_hash'] = compute_content_hash(
+                    dict(values, parameters=dict(parameters[values['sku']])), category_names[category]
+                )
+                values['is_available'] = values['quantity'] >= values['min_quantity']
+                batch.append(Product(
+                    category_id=category_ids[category],
+                    supplier_id=supplier_ids[index % len(supplier_ids)],
+                    **values
+                ))
+            Product.objects.bulk_create(batch, batch_size=batch_size)
+
+            product_ids = {product.sku: product.pk for product in batch}
+            if None in product_ids.values():
+                product_ids = dict(Product.objects.filter(sku__in=list(product_ids)).values_list('sku', 'id'))
+            ProductCharacteristic.objects.bulk_create([
+                ProductCharacteristic(product_id=product_ids[sku], name=name, value=value)
+                for sku, items in parameters.items() for name, value in items
+            ], batch_size=batch_size)
+            log(f'Товары: {min(batch_start + batch_size, products)} / {products}')
+
+    rnd = random.Random(seed)
+    product_count = min(products, Product.objects.filter(sku__startswith=GENERATED_SKU_PREFIX).count())
+    product_ids = list(
+        Product.objects.filter(sku__startswith=GENERATED_SKU_PREFIX, is_available=True).order_by('id')
+        .values_list('id', 'price')[:max(product_count, 1)]
+    )
+
+    with timer(timings, 'carts'):
+        fill_carts(customer_users[:carts], product_ids, rnd, batch_size)
+
+    with timer(timings, 'orders'):
+        existing = Order.objects.filter(user__in=customer_users).count()
+        now = timezone.now()
+        for batch_start in range(existing, orders, batch_size):
+            batch = []
+            items = []
+            for index in range(batch_start, min(batch_start + batch_size, orders)):
+                order = Order(
+                    user=customer_users[index % len(customer_users)],
+                    status=rnd.choice([choice for choice, label in Order.STATUS_CHOICES]),
+                    shipping_address=f'г. Москва, ул. Синтетическая, д. {index % 200 + 1}',
+                )
+                lines = rnd.sample(product_ids, min(rnd.randint(1, 5), len(product_ids)))
+                order.total_amount = 0
+                for product_id, price in lines:
+                    quantity = rnd.randint(1, 10)
+                    order.total_amount += price * quantity
+                    items.append((order, OrderItem(product_id=product_id, quantity=quantity, price=price)))
+                batch.append(order)
+            Order.objects.bulk_create(batch, batch_size=batch_size)
+            for order, item in items:
+                item.order = order
+            OrderItem.objects.bulk_create([item for order, item in items], batch_size=batch_size)
+
+            # auto_now_add не дает задать дату при создании: раскладываем заказы по 90 дням
+            by_day = {}
+            for order in batch:
+                by_day.setdefault(order.pk % 90, []).append(order.pk)
+            for day, ids in by_day.items():
+                Order.objects.filter(pk__in=ids).update(created_at=now - timedelta(days=day, hours=day % 24))
+
+    return {
+        'suppliers': len(supplier_ids),
+        'categories': len(category_ids),
+        'products': Product.objects.filter(sku__startswith=GENERATED_SKU_PREFIX).count(),
+        'customers': len(customer_users),
+        'orders': Order.objects.filter(user__in=customer_users).count(),
+        'timings': timings,
+    }
+
+
+def fill_carts(users, product_ids, rnd, batch_size=5000, items_per_cart=3):
+    """Кладет в пустые корзины пользователей несколько доступных товаров"""
+    from django.apps import apps
+
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+
+    empty = Cart.objects.filter(user__in=users, items__isnull=True)
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product_id=product_id, quantity=1)
+        for cart in empty
+        for product_id, price in rnd.sample(product_ids, min(items_per_cart, len(product_ids)))
+    ], batch_size=batch_size)
+
+
+def clear_generated_catalog():
+    """Удаляет сгенерированных пользователей, поставщиков (с товарами) и категории"""
+    from django.apps import apps
+    from django.contrib.auth import get_user_model
+
+    Category = apps.get_model('products', 'Category')
+    DeletedProduct = apps.get_model('products', 'DeletedProduct')
+
+    get_user_model().objects.filter(username__startswith=GENERATED_USERNAME_PREFIX).delete()
+    Category.objects.filter(name__startswith=GENERATED_CATEGORY_PREFIX).delete()
+    DeletedProduct.objects.filter(sku__startswith=GENERATED_SKU_PREFIX).delete()
@@ -0,0 +1,163 @@
+import threading
+import time
+from django.apps import apps
+from django.core.cache import cache
+from django.template import Context, Engine
+
+
+# Версия шаблонов в общем кеше: меняется при сохранении, другие процессы перечитывают шаблоны
+VERSION_CACHE_KEY = 'email_templates:version'
+# Без общего кеша (locmem) изменения из других процессов подхватываются не позже чем через TTL секунд
+TEMPLATE_TTL = 60
+
+# Письма - обычный текст: экранирование HTML не нужно
+engine = Engine(autoescape=False)
+
+ORDER_LINES = (
+    "{% for item in items %}\n"
+    "- {{ item.product.name }} x {{ item.quantity }}: {{ item.total_price }} руб.{% endfor %}"
+)
+
+# Шаблоны по умолчанию, если в БД нет активного EmailTemplate нужного типа
+DEFAULT_TEMPLATES = {
+    'order_confirmation': (
+        'Подтверждение заказа - #{{ order.id }}',
+        """
+        Уважаемый(ая) {{ user.first_name|default:user.username }},
+
+        Благодарим за ваш заказ! Детали заказа:
+
+        Номер заказа: #{{ order.id }}
+        Общая сумма: {{ order.total_amount }} руб.
+        Адрес доставки: {{ order.shipping_address }}
+
+        Состав заказа:
+        """ + ORDER_LINES + "\n\nМы уведомим вас, когда заказ будет отправлен."
+    ),
+    'admin_notification': (
+        'Новый заказ - #{{ order.id }}',
+        """
+        Поступил новый заказ:
+
+        Номер заказа: #{{ order.id }}
+        Клиент: {{ user.email }}
+        Общая сумма: {{ order.total_amount }} руб.
+        Адрес доставки: {{ order.shipping_address }}
+
+        Состав заказа:
+        """ + ORDER_LINES
+    ),
+    'order_status_update': (
+        'Статус заказа #{{ order.id }} изменен',
+        """
+            Статус вашего заказа #{{ order.id }} изменен на: {{ status }}
+
+            Текущий статус: {{ status }}
+            Сумма заказа: {{ order.total_amount }} руб.
+            Адрес доставки: {{ order.shipping_address }}
+
+            Спасибо, что выбрали наш магазин!
+            """
+    ),
+    'notification': (
+        '{{ subject }}',
+        '{{ message }}'
+    ),
+    'daily_sales_report': (
+        'Ежедневный отчет о продажах - {{ date|date:"d.m.Y" }}',
+        """
+        Ежедневный отчет о продажах:
+
+        Период: последние 24 часа
+        Всего заказов: {{ total_orders }}
+        Завершенных заказов: {{ completed_orders }}
+        Общая сумма продаж: {{ total_sales }} руб.
+
+        Популярные товары:
+        {% for product in popular_products %}
+- {{ product.product__name }}: {{ product.total_sold }} шт.{% endfor %}"""
+    ),
+}
+
+
+class EmailTemplateRegistry:
+    """
+    Скомпилированные шаблоны писем в памяти процесса.
+
+    Запись хранится по template_type вместе с updated_at строки БД:
+    при перезагрузке заново компилируются только измененные шаблоны.
+    Перезагрузка (один запрос за всеми активными шаблонами) происходит,
+    когда меняется версия в кеше (сохранение шаблона) или истек TTL.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.compiled = {}
+        self.defaults = {}
+        self.version = None
+        self.loaded_at = 0
+        self.stats = {'loads': 0, 'compiles': 0}
+
+    def get(self, template_type):
+        """(шаблон темы, шаблон текста) для типа письма"""
+        self.refresh()
+        entry = self.compiled.get(template_type)
+        if entry is not None:
+            return entry[1], entry[2]
+        return self.get_default(template_type)
+
+    def get_default(self, template_type):
+        if template_type not in self.defaults:
+            if template_type not in DEFAULT_TEMPLATES:
+                raise ValueError(f"Неизвестный тип письма {template_type!r}")
+            subject, body = DEFAULT_TEMPLATES[template_type]
+            self.defaults[template_type] = (engine.from_string(subject), engine.from_string(body))
+            self.stats['compiles'] += 2
+        return self.defaults[template_type]
+
+    def refresh(self):
+        version = cache.get(VERSION_CACHE_KEY)
+        if version == self.version and time.monotonic() - self.loaded_at < TEMPLATE_TTL:
+            return
+        with self.lock:
+            self.load(version)
+
+    def load(self, version=None):
+        EmailTemplate = apps.get_model('core', 'EmailTemplate')
+
+        compiled = {}
+        for template_type, updated_at, subject, body in EmailTemplate.objects.filter(
+            is_active=True
+        ).values_list('template_type', 'updated_at', 'subject', 'body'):
+            current = self.compiled.get(template_type)
+            if current is not None and current[0] == updated_at:
+                compiled[template_type] = current
+                continue
+            compiled[template_type] = (updated_at, engine.from_string(subject), engine.from_string(body))
+            self.stats['compiles'] += 2
+
+        self.compiled = compiled
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.stats['loads'] += 1
+
+    def invalidate(self):
+        """Сброс после изменения шаблона: в этом процессе сразу, в остальных - через версию в кеше"""
+        cache.set(VERSION_CACHE_KEY, time.time_ns(), None)
+        self.loaded_at = 0
+
+
+registry = EmailTemplateRegistry()
+
+
+def render_email(template_type, context):
+    """Тема и текст письма по шаблону типа template_type"""
+    subject_template, body_template = registry.get(template_type)
+    context = Context(context, autoescape=False)
+    # Тема письма - одна строка
+    subject = ' '.join(subject_template.render(context).split())
+    return subject, body_template.render(context)
+
+
+def invalidate_email_templates(sender, **kwargs):
+    registry.invalidate()
@@ -0,0 +1,308 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import yaml
+
+from apps.core.import_export import YAMLDumper, iter_yaml_goods
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Колонки CSV, общие для обеих раскладок характеристик
+CSV_COLUMNS = [
+    'sku', 'name', 'category', 'supplier', 'price', 'quantity',
+    'min_quantity', 'description', 'is_available', 'deleted', 'image', 'images'
+]
+CSV_PARAMETER_PREFIX = 'param:'
+CSV_LONG_COLUMNS = ['parameter', 'value']
+SNIFF_SIZE = 4096
+
+# Сжатие файлов экспорта: название -> расширение
+COMPRESSIONS = {
+    'none': '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class CatalogFormat:
+    """Кодек формата файла каталога: потоковое чтение товаров и запись пачками"""
+    name = None
+    extensions = ()
+    # Нужен ли писателю заранее полный список названий характеристик
+    needs_parameter_names = False
+
+    def iter_goods(self, file_path, categories=None):
+        raise NotImplementedError
+
+    def write_header(self, file, parameter_names=None):
+        pass
+
+    def write_batch(self, file, records, parameter_names=None):
+        raise NotImplementedError
+
+    def write_footer(self, file, exported):
+        pass
+
+
+class YAMLFormat(CatalogFormat):
+    """YAML: формат поставщика (categories -> goods) и список товаров"""
+    name = 'yaml'
+    extensions = ('.yaml', '.yml')
+
+    def iter_goods(self, file_path, categories=None):
+        return iter_yaml_goods(file_path, categories)
+
+    def write_batch(self, file, records, parameter_names=None):
+        # Блочные списки, записанные подряд, складываются в один общий список
+        yaml.dump(records, file, Dumper=YAMLDumper, allow_unicode=True, default_flow_style=False)
+
+    def write_footer(self, file, exported):
+        if not exported:
+            file.write('[]\n')
+
+
+class JSONLinesFormat(CatalogFormat):
+    """JSON Lines: один товар на строку"""
+    name = 'jsonl'
+    extensions = ('.jsonl', '.ndjson')
+
+    def iter_goods(self, file_path, categories=None):
+        with open(file_path, 'r', encoding='utf-8-sig') as file:
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    good = json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"строка {line_number}: некорректный JSON ({e})")
+                if isinstance(good, dict):
+                    yield good
+
+    def write_batch(self, file, records, parameter_names=None):
+        file.write(''.join(
+            json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in records
+        ))
+
+
+class CSVFormat(CatalogFormat):
+    """
+    CSV с характеристиками в одной из раскладок:
+    - wide: по колонке "param:<название>" на каждую характеристику;
+    - long: строка на характеристику (колонки parameter, value), строки
+      одного товара идут подряд.
+    При чтении раскладка и разделитель определяются по заголовку.
+    """
+    extensions = ('.csv',)
+
+    def __init__(self, name='csv', layout='wide'):
+        self.name = name
+        self.layout = layout
+        self.needs_parameter_names = layout == 'wide'
+
+    def iter_goods(self, file_path, categories=None):
+        with open(file_path, 'r', encoding='utf-8-sig', newline='') as file:
+            reader = csv.DictReader(file, dialect=self.sniff_dialect(file))
+            fields = reader.fieldnames or []
+            parameter_columns = [
+                column for column in fields if column.startswith(CSV_PARAMETER_PREFIX)
+            ]
+            long_layout = all(column in fields for column in CSV_LONG_COLUMNS)
+
+            current = None
+            for row in reader:
+                good = {
+                    column: value for column, value in row.items()
+                    if column in CSV_COLUMNS and value not in (None, '')
+                }
+                if long_layout:
+                    sku = good.get('sku')
+                    if current is None or sku is None or sku != current.get('sku'):
+                        if current is not None:
+                            yield current
+                        current = good
+                        current['parameters'] = {}
+                    if row.get('parameter'):
+                        current['parameters'][row['parameter']] = row.get('value') or ''
+                    continue
+
+                good['parameters'] = {
+                    column[len(CSV_PARAMETER_PREFIX):]: row[column]
+                    for column in parameter_columns if row.get(column) not in (None, '')
+                }
+                yield good
+
+            if current is not None:
+                yield current
+
+    def sniff_dialect(self, file):
+        header = file.readline()
+        file.seek(0)
+        try:
+            return csv.Sniffer().sniff(header, delimiters=',;\t')
+        except csv.Error:
+            return csv.excel
+
+    def write_header(self, file, parameter_names=None):
+        if self.layout == 'wide':
+            columns = CSV_COLUMNS + [CSV_PARAMETER_PREFIX + name for name in parameter_names or []]
+        else:
+            columns = CSV_COLUMNS + CSV_LONG_COLUMNS
+        csv.writer(file).writerow(columns)
+
+    def write_batch(self, file, records, parameter_names=None):
+        writer = csv.writer(file)
+        rows = []
+        for record in records:
+            row = [record.get(column, '') for column in CSV_COLUMNS]
+            characteristics = {item['name']: item['value'] for item in record.get('characteristics', [])}
+            if self.layout == 'wide':
+                rows.append(row + [characteristics.get(name, '') for name in parameter_names or []])
+            elif characteristics:
+                rows.extend(row + [name, value] for name, value in characteristics.items())
+            else:
+                rows.append(row + ['', ''])
+        writer.writerows(rows)
+
+
+FORMATS = {
+    'yaml': YAMLFormat(),
+    'jsonl': JSONLinesFormat(),
+    'csv': CSVFormat('csv', layout='wide'),
+    'csv_long': CSVFormat('csv_long', layout='long'),
+}
+
+def supported_extensions():
+    return sorted({ext for codec in FORMATS.values() for ext in codec.extensions})
+
+
+def format_from_extension(file_path):
+    """Кодек по расширению файла (без учета .gz/.zst) или None"""
+    ext = os.path.splitext(strip_compression_extension(file_path))[1].lower()
+    for codec in FORMATS.values():
+        if ext in codec.extensions:
+            return codec
+    return None
+
+
+def sniff_format(sample):
+    """Определяет формат по началу файла или возвращает None"""
+    if isinstance(sample, bytes):
+        sample = sample.decode('utf-8', errors='ignore')
+    sample = sample.lstrip('\ufeff')
+    lines = [line for line in sample.splitlines() if line.strip()]
+    if not lines:
+        return None
+
+    first = lines[0].strip()
+    if first.startswith('{'):
+        return FORMATS['jsonl']
+    # Ключ YAML, элемент списка, начало документа или директива
+    if first.startswith(('-', '#', '%', '[')) or re.match(r'^[^,;\t]+:(\s|$)', first):
+        return FORMATS['yaml']
+    try:
+        csv.Sniffer().sniff(lines[0], delimiters=',;\t')
+        return FORMATS['csv']
+    except csv.Error:
+        return None
+
+
+def get_format(file_path=None, file_format=None):
+    """
+    Кодек по явному имени формата, расширению файла или содержимому
+    (если расширение неизвестно, а файл уже существует).
+    """
+    if file_format:
+        if file_format not in FORMATS:
+            raise ValueError(f"Неизвестный формат {file_format!r}")
+        return FORMATS[file_format]
+
+    codec = format_from_extension(file_path) if file_path else None
+    if codec is not None:
+        return codec
+    if file_path and os.path.exists(file_path):
+        with open(file_path, 'rb') as file:
+            codec = sniff_format(file.read(SNIFF_SIZE))
+        if codec is not None:
+            return codec
+    raise ValueError(f"Не удалось определить формат файла {file_path}")
+
+
+def iter_goods(file_path, categories=None, file_format=None):
+    """Потоковое чтение товаров из файла любого поддерживаемого формата"""
+    return get_format(file_path, file_format).iter_goods(file_path, categories)
+
+
+def available_compressions():
+    """Поддерживаемые методы сжатия (zstd - только при установленном zstandard)"""
+    return [name for name in COMPRESSIONS if name != 'zstd' or zstandard is not None]
+
+
+def strip_compression_extension(file_path):
+    for ext in COMPRESSIONS.values():
+        if ext and file_path.lower().endswith(ext):
+            return file_path[:-len(ext)]
+    return file_path
+
+
+def compressed_path(file_path, compression):
+    """Путь файла с расширением сжатия (file.yaml -> file.yaml.gz)"""
+    return strip_compression_extension(file_path) + COMPRESSIONS[compression]
+
+
+class ChecksumWriter(io.RawIOBase):
+    """Пропускает байты в файл, попутно считая размер и SHA-256 записанного"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.raw.write(data)
+        self.sha256.update(data)
+        self.size += len(data)
+        return len(data)
+
+    @property
+    def checksum(self):
+        return self.sha256.hexdigest()
+
+
+def open_text_writer(raw, compression='none'):
+    """
+    Текстовый поток поверх бинарного файла со сжатием на лету.
+    Возвращает (поток, ChecksumWriter); размер и контрольная сумма
+    считаются по сжатым байтам, то есть по файлу на диске.
+    """
+    buffered, checksum = open_binary_writer(raw, compression)
+    return io.TextIOWrapper(buffered, encoding='utf-8', newline=''), checksum
+
+
+def open_binary_writer(raw, compression='none'):
+    """Буферизованный бинарный поток со сжатием на лету; (поток, ChecksumWriter)"""
+    if compression not in available_compressions():
+        raise ValueError(f"Сжатие {compression!r} недоступно")
+
+    checksum = ChecksumWriter(raw)
+    if compression == 'gzip':
+        # mtime=0: одинаковые данные дают одинаковый файл и контрольную сумму
+        stream = gzip.GzipFile(fileobj=checksum, mode='wb', compresslevel=GZIP_LEVEL, mtime=0)
+    elif compression == 'zstd':
+        stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(checksum, closefd=False)
+    else:
+        stream = checksum
+    return io.BufferedWriter(stream, buffer_size=WRITE_BUFFER_SIZE), checksum
@@ -0,0 +1,277 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from billiard.pool import Pool
+from django.apps import apps
+from django.conf import settings
+from PIL import Image, ImageOps
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff')
+# Формат миниатюры -> (формат Pillow, расширение, параметры сохранения)
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', '.webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', '.jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+# Формат Pillow -> расширение оригинала (MPO - JPEG с камер)
+ORIGINAL_EXTENSIONS = {'JPEG': '.jpg', 'MPO': '.jpg', 'TIFF': '.tif'}
+ORIGINALS_DIR = 'images'
+THUMBNAILS_DIR = 'thumbnails'
+HASH_CHUNK_SIZE = 1024 * 1024
+# Файлов на одну передачу задания в процесс пула
+POOL_CHUNK_SIZE = 4
+# Ориентации EXIF, при которых ширина и высота меняются местами
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def hash_file(path):
+    """(путь, sha256, ошибка) - выполняется в процессе пула"""
+    try:
+        return path, file_sha256(path), None
+    except OSError as e:
+        return path, None, str(e)
+
+
+def save_atomic(target, write):
+    """Запись файла через временный файл в том же каталоге и rename"""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+    os.close(fd)
+    try:
+        write(temp_path)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def flatten(image):
+    """RGB без прозрачности (фон белый) для JPEG"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_image(source_path, sha256, media_root, sizes):
+    """
+    Обработка одного изображения в процессе пула: копия оригинала под именем
+    по хешу и миниатюры всех размеров в WebP и JPEG. Пути в результате
+    указаны относительно MEDIA_ROOT.
+    """
+    try:
+        with Image.open(source_path) as image:
+            extension = ORIGINAL_EXTENSIONS.get(image.format, '.' + (image.format or 'jpg').lower())
+            width, height = image.size
+            if image.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+
+            # JPEG декодируется сразу в уменьшенном масштабе, не крупнее нужного
+            largest = max(sizes.values())
+            image.draft('RGB', (largest, largest))
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if image.mode in ('LA', 'P') else 'RGB')
+
+            thumbnails = {}
+            thumbnail_dir = os.path.join(THUMBNAILS_DIR, sha256[:2], sha256)
+            # От большего размера к меньшему: каждая миниатюра уменьшается из предыдущей
+            current = image
+            for size_name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+                current = current.copy()
+                current.thumbnail((size, size), Image.LANCZOS)
+                thumbnails[size_name] = {}
+                for image_format, (pil_format, thumbnail_ext, options) in THUMBNAIL_FORMATS.items():
+                    output = flatten(current) if pil_format == 'JPEG' else current
+                    relative = os.path.join(thumbnail_dir, size_name + thumbnail_ext)
+                    save_atomic(
+                        os.path.join(media_root, relative),
+                        lambda path: output.save(path, pil_format, **options)
+                    )
+                    thumbnails[size_name][image_format] = relative
+
+        original = os.path.join(ORIGINALS_DIR, sha256[:2], sha256 + extension)
+        if not os.path.exists(os.path.join(media_root, original)):
+            save_atomic(os.path.join(media_root, original), lambda path: shutil.copyfile(source_path, path))
+
+        return {
+            'sha256': sha256,
+            'original': original,
+            'width': width,
+            'height': height,
+            'file_size': os.path.getsize(source_path),
+            'thumbnails': thumbnails,
+        }
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        return {'sha256': sha256, 'error': str(e)}
+
+
+class ImagePipeline:
+    """
+    Прием изображений: хеширование и обработка Pillow в пуле процессов.
+
+    Файл с одинаковым содержимым сохраняется и обрабатывается один раз:
+    повторные ссылки (в том же импорте или позже) получают уже созданный
+    ImageAsset. Пул создается при первой обработке и живет до close().
+    """
+
+    def __init__(self, workers=None, sizes=None):
+        workers = settings.IMAGE_WORKERS if workers is None else workers
+        self.workers = workers or os.cpu_count() or 1
+        self.sizes = sizes or settings.IMAGE_THUMBNAIL_SIZES
+        self.root = os.path.realpath(settings.IMAGE_IMPORT_ROOT)
+        self.media_root = str(settings.MEDIA_ROOT)
+        self.pool = None
+        self.stats = {'created': 0, 'reused': 0, 'errors': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            # Заданий в пуле к этому моменту нет (map синхронный), кроме прерванного по time limit
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def map(self, function, *iterables):
+        if self.workers <= 1:
+            return list(map(function, *iterables))
+        if self.pool is None:
+            # Пул billiard, а не multiprocessing: процесс воркера Celery (prefork) - демон,
+            # и стандартная библиотека не дает ему порождать дочерние процессы
+            self.pool = Pool(processes=self.workers)
+        return self.pool.starmap(function, zip(*iterables), chunksize=POOL_CHUNK_SIZE)
+
+    def resolve_path(self, path):
+        """Абсолютный путь к файлу внутри IMAGE_IMPORT_ROOT или ValueError"""
+        full_path = os.path.realpath(os.path.join(self.root, str(path)))
+        if os.path.commonpath([full_path, self.root]) != self.root:
+            raise ValueError(f"путь {path} вне каталога изображений")
+        if os.path.splitext(full_path)[1].lower() not in IMAGE_EXTENSIONS:
+            raise ValueError(f"{path}: неподдерживаемый формат изображения")
+        if not os.path.isfile(full_path):
+            raise ValueError(f"файл {path} не найден")
+        return full_path
+
+    def ingest(self, paths):
+        """
+        Принимает пути из файла импорта (относительно IMAGE_IMPORT_ROOT).
+        Возвращает ({путь: ImageAsset}, {путь: ошибка}).
+        """
+        resolved = {}
+        errors = {}
+        for path in dict.fromkeys(paths):
+            try:
+                resolved[path] = self.resolve_path(path)
+            except ValueError as e:
+                errors[path] = str(e)
+        self.stats['errors'] += len(errors)
+
+        assets, file_errors = self.ingest_files(resolved.values())
+        result = {}
+        for path, full_path in resolved.items():
+            if full_path in assets:
+                result[path] = assets[full_path]
+            else:
+                errors[path] = file_errors[full_path]
+        return result, errors
+
+    def ingest_files(self, full_paths):
+        """Абсолютные пути -> ({путь: ImageAsset}, {путь: ошибка})"""
+        ImageAsset = apps.get_model('products', 'ImageAsset')
+
+        full_paths = list(dict.fromkeys(full_paths))
+        hashes = {}
+        errors = {}
+        for full_path, sha256, error in self.map(hash_file, full_paths):
+            if error:
+                errors[full_path] = error
+            else:
+                hashes[full_path] = sha256
+
+        existing = {asset.sha256: asset for asset in ImageAsset.objects.filter(sha256__in=set(hashes.values()))}
+        to_render = {}
+        for full_path, sha256 in hashes.items():
+            if sha256 not in existing:
+                to_render.setdefault(sha256, full_path)
+        self.stats['reused'] += len(set(hashes.values()) & set(existing))
+
+        failed = {}
+        new_assets = []
+        count = len(to_render)
+        for result in self.map(render_image, list(to_render.values()), list(to_render),
+                               [self.media_root] * count, [self.sizes] * count):
+            if 'error' in result:
+                failed[result['sha256']] = result['error']
+                continue
+            new_assets.append(ImageAsset(
+                sha256=result['sha256'],
+                original=result['original'],
+                width=result['width'],
+                height=result['height'],
+                file_size=result['file_size'],
+                thumbnails=result['thumbnails'],
+            ))
+
+        if new_assets:
+            # Параллельный импорт мог уже создать запись с тем же хешем
+            ImageAsset.objects.bulk_create(new_assets, ignore_conflicts=True)
+            existing.update(
+                (asset.sha256, asset)
+                for asset in ImageAsset.objects.filter(sha256__in=[asset.sha256 for asset in new_assets])
+            )
+            self.stats['created'] += len(new_assets)
+
+        assets = {}
+        for full_path, sha256 in hashes.items():
+            if sha256 in existing:
+                assets[full_path] = existing[sha256]
+            else:
+                errors[full_path] = failed.get(sha256, 'изображение не обработано')
+        self.stats['errors'] += len(errors)
+        return assets, errors
+
+    def attach_uploaded(self, objects):
+        """
+        Миниатюры для изображений, загруженных через админку или API.
+        Поле image переводится на общий файл по хешу, загруженная копия удаляется.
+        """
+        from django.core.files.storage import default_storage
+
+        objects = [obj for obj in objects if obj.image]
+        if not objects:
+            return 0
+
+        assets, errors = self.ingest_files(default_storage.path(obj.image.name) for obj in objects)
+        updated = {}
+        for obj in objects:
+            source = obj.image.name
+            asset = assets.get(default_storage.path(source))
+            if asset is None:
+                continue
+            obj.image = asset.original.name
+            obj.image_asset = asset
+            obj.__class__.objects.filter(pk=obj.pk).update(image=obj.image.name, image_asset=asset)
+            updated[source] = asset.original.name
+
+        for source, target in updated.items():
+            if source != target and default_storage.exists(source):
+                default_storage.delete(source)
+        return len(objects) - len(errors)
@@ -1,81 +1,824 @@
 import yaml
 import os
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
 from django.apps import apps
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+try:
+    # C-реализация парсера и эмиттера (libyaml) в разы быстрее чистого Python
+    from yaml import CSafeLoader as YAMLLoader, CSafeDumper as YAMLDumper
+except ImportError:
+    from yaml import SafeLoader as YAMLLoader, SafeDumper as YAMLDumper
+
+
+IMPORT_CHUNK_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+MAX_ERROR_DETAILS = 50
+# Строки, зафиксированные позже своего updated_at (долгая транзакция), попадают в следующую дельту
+DELTA_OVERLAP = timedelta(minutes=5)
 
 
 class ProductExporter:
-    """Экспорт товаров в YAML файлы"""
+    """Потоковый экспорт товаров в YAML, CSV и JSON Lines"""
 
-    def __init__(self):
+    def __init__(self, chunk_size=EXPORT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
         self.stats = {
             'exported': 0,
-            'errors': 0
+            'tombstones': 0,
+            'errors': 0,
+            'timings': {}
         }
 
-    def export_to_yaml(self, file_path):
+    def get_queryset(self, supplier_id=None, since=None, until=None):
+        """
+        Товары для экспорта: все доступные или (при since) только измененные
+        в интервале (since, until], включая снятые с продажи.
+        """
+        Product = apps.get_model('products', 'Product')
+        ProductCharacteristic = apps.get_model('products', 'ProductCharacteristic')
+
+        if since is None:
+            products = Product.objects.filter(is_available=True)
+        else:
+            products = Product.objects.filter(updated_at__gt=since, updated_at__lte=until)
+        products = products.select_related(
+            'category', 'supplier'
+        ).prefetch_related(
+            Prefetch('characteristics', queryset=ProductCharacteristic.objects.only('id', 'product_id', 'name', 'value'))
+        ).only(
+            'id', 'sku', 'name', 'description', 'price', 'quantity', 'min_quantity', 'is_available',
+            'category__name', 'supplier__name'
+        ).order_by('pk')
+        if supplier_id:
+            products = products.filter(supplier_id=supplier_id)
+        return products
+
+    def get_deleted_queryset(self, supplier_id=None, since=None, until=None):
+        """Удаленные в интервале товары, артикул которых с тех пор не появился снова"""
+        Product = apps.get_model('products', 'Product')
+        DeletedProduct = apps.get_model('products', 'DeletedProduct')
+
+        deleted = DeletedProduct.objects.filter(
+            deleted_at__gt=since, deleted_at__lte=until
+        ).exclude(
+            sku__in=Product.objects.values('sku')
+        ).order_by('pk')
+        if supplier_id:
+            deleted = deleted.filter(supplier_id=supplier_id)
+        return deleted.values_list('sku', 'supplier_name')
+
+    def serialize_product(self, product):
+        if not product.is_available:
+            return self.serialize_tombstone(product.sku, product.supplier.name)
+        return {
+            'sku': product.sku,
+            'name': product.name,
+            'description': product.description,
+            'category': product.category.name,
+            'supplier': product.supplier.name,
+            'price': float(product.price),
+            'quantity': product.quantity,
+            'min_quantity': product.min_quantity,
+            'is_available': product.is_available,
+            'characteristics': [
+                {
+                    'name': char.name,
+                    'value': char.value
+                }
+                for char in product.characteristics.all()
+            ]
+        }
+
+    def serialize_tombstone(self, sku, supplier, deleted=False):
+        """Запись о снятом с продажи (deleted=False) или удаленном товаре"""
+        return {
+            'sku': sku,
+            'supplier': supplier,
+            'is_available': False,
+            'deleted': deleted,
+        }
+
+    def get_parameter_names(self, supplier_id=None, since=None, until=None):
+        """Названия всех характеристик экспортируемых товаров (для заголовка CSV)"""
+        ProductCharacteristic = apps.get_model('products', 'ProductCharacteristic')
+
+        characteristics = ProductCharacteristic.objects.filter(product__is_available=True)
+        if since is not None:
+            characteristics = characteristics.filter(
+                product__updated_at__gt=since, product__updated_at__lte=until
+            )
+        if supplier_id:
+            characteristics = characteristics.filter(product__supplier_id=supplier_id)
+        return list(characteristics.order_by('name').values_list('name', flat=True).distinct())
+
+    def export_to_yaml(self, file_path, supplier_id=None):
         """Экспорт товаров в YAML файл"""
+        return self.export_to_file(file_path, supplier_id, file_format='yaml')
+
+    def export_to_file(self, file_path, supplier_id=None, file_format=None, compression='none', since=None,
+                       on_progress=None):
+        """
+        Экспорт товаров в файл; формат задается явно или по расширению.
+
+        Товары читаются через iterator(chunk_size) с одним prefetch на пачку,
+        каждая пачка сразу дописывается в файл кодеком формата (при
+        compression - через потоковое сжатие). Запись идет во временный файл,
+        который затем атомарно переименовывается.
+
+        С since экспорт инкрементальный: только товары, измененные после since,
+        и записи-надгробия для снятых с продажи и удаленных. Верхняя граница
+        (watermark) фиксируется в начале и возвращается в stats - это since
+        для следующего инкрементального экспорта. Нижняя граница сдвигается
+        назад на DELTA_OVERLAP: строки, зафиксированные уже после
+        watermark прошлого экспорта, но с более ранним updated_at, не теряются,
+        поэтому соседние дельты могут повторять товары (загрузка по артикулу).
+        on_progress(записано) вызывается после каждой пачки.
+        """
+        from apps.core.formats import compressed_path, get_format, open_text_writer
+
+        timings = {'fetch': 0.0, 'serialize': 0.0, 'write': 0.0}
+        started = time.perf_counter()
+        watermark = timezone.now()
+        requested_since = since
+        if since is not None:
+            since = since - DELTA_OVERLAP
+        temp_path = None
         try:
-            Product = apps.get_model('products', 'Product')
-            Category = apps.get_model('products', 'Category')
-            ProductCharacteristic = apps.get_model('products', 'ProductCharacteristic')
-            Supplier = apps.get_model('suppliers', 'Supplier')
-
-            products = Product.objects.select_related(
-                'category', 'supplier'
-            ).prefetch_related('characteristics').filter(is_available=True)
-
-            export_data = []
-
-            for product in products:
-                product_data = {
-                    'name': product.name,
-                    'description': product.description,
-                    'category': product.category.name,
-                    'supplier': product.supplier.name,
-                    'price': float(product.price),
-                    'quantity': product.quantity,
-                    'min_quantity': product.min_quantity,
-                    'is_available': product.is_available,
-                    'characteristics': [
-                        {
-                            'name': char.name,
-                            'value': char.value
-                        }
-                        for char in product.characteristics.all()
-                    ]
-                }
-                export_data.append(product_data)
-                self.stats['exported'] += 1
+            codec = get_format(file_path, file_format)
+            file_path = compressed_path(file_path, compression)
+            parameter_names = None
+            if codec.needs_parameter_names:
+                mark = time.perf_counter()
+                parameter_names = self.get_parameter_names(supplier_id, since, watermark)
+                timings['fetch'] += time.perf_counter() - mark
 
             # Создаем директорию если не существует
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(
+                dir=os.path.dirname(file_path), prefix='.', suffix='.tmp'
+            )
+
+            with os.fdopen(fd, 'wb') as raw:
+                file, checksum = open_text_writer(raw, compression)
+                with file:
+                    codec.write_header(file, parameter_names)
+                    products = self.get_queryset(supplier_id, since, watermark).iterator(chunk_size=self.chunk_size)
+                    for batch in self.iter_batches(products, timings):
+                        mark = time.perf_counter()
+                        export_data = [self.serialize_product(product) for product in batch]
+                        timings['serialize'] += time.perf_counter() - mark
 
-            with open(file_path, 'w', encoding='utf-8') as file:
-                yaml.dump(export_data, file, allow_unicode=True, default_flow_style=False)
+                        tombstones = sum(1 for product in batch if not product.is_available)
+                        self.write_batch(file, codec, export_data, parameter_names, timings)
+                        self.stats['exported'] += len(batch) - tombstones
+                        self.stats['tombstones'] += tombstones
+                        if on_progress is not None:
+                            on_progress(self.stats['exported'] + self.stats['tombstones'])
 
+                    if since is not None:
+                        deleted = self.get_deleted_queryset(supplier_id, since, watermark).iterator(
+                            chunk_size=self.chunk_size
+                        )
+                        for batch in self.iter_batches(deleted, timings):
+                            export_data = [
+                                self.serialize_tombstone(sku, supplier, deleted=True) for sku, supplier in batch
+                            ]
+                            self.write_batch(file, codec, export_data, parameter_names, timings)
+                            self.stats['tombstones'] += len(batch)
+
+                    codec.write_footer(file, self.stats['exported'] + self.stats['tombstones'])
+                raw.flush()
+                os.fsync(raw.fileno())
+
+            # mkstemp создает файл с правами 0600
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, file_path)
+            temp_path = None
+
+            timings['total'] = time.perf_counter() - started
+            self.stats.update({
+                'file_path': file_path,
+                'file_format': codec.name,
+                'compression': compression,
+                'file_size': checksum.size,
+                'checksum': checksum.checksum,
+                'since': requested_since,
+                'watermark': watermark,
+                'timings': {key: round(value, 4) for key, value in timings.items()},
+            })
             return self.stats
 
         except Exception as e:
             self.stats['errors'] += 1
             raise Exception(f"Ошибка экспорта в файл {file_path}: {str(e)}")
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def iter_batches(self, rows, timings):
+        while True:
+            mark = time.perf_counter()
+            batch = list(islice(rows, self.chunk_size))
+            timings['fetch'] += time.perf_counter() - mark
+            if not batch:
+                return
+            yield batch
+
+    def write_batch(self, file, codec, export_data, parameter_names, timings):
+        mark = time.perf_counter()
+        codec.write_batch(file, export_data, parameter_names)
+        timings['write'] += time.perf_counter() - mark
+
+
+class YAMLEventReader:
+    """Чтение YAML по событиям парсера: значения собираются по одному, а не всем документом"""
+
+    def __init__(self, stream):
+        self.loader = YAMLLoader(stream)
+        self.anchors = {}
+
+    def peek(self):
+        return self.loader.peek_event()
+
+    def next(self):
+        return self.loader.get_event()
+
+    def at(self, event_class):
+        return isinstance(self.loader.peek_event(), event_class)
+
+    def load(self):
+        """Собирает и конструирует очередное значение (скаляр, список или словарь)"""
+        return self.loader.construct_document(self._compose())
+
+    def skip(self):
+        self._compose()
+
+    def _resolve_tag(self, node_class, event, value=None):
+        if event.tag is None or event.tag == '!':
+            return self.loader.resolve(node_class, value, event.implicit)
+        return event.tag
+
+    def _compose(self):
+        event = self.next()
+        if isinstance(event, yaml.AliasEvent):
+            return self.anchors[event.anchor]
+
+        if isinstance(event, yaml.ScalarEvent):
+            node = yaml.ScalarNode(
+                self._resolve_tag(yaml.ScalarNode, event, event.value), event.value,
+                event.start_mark, event.end_mark, style=event.style
+            )
+        elif isinstance(event, yaml.SequenceStartEvent):
+            node = yaml.SequenceNode(
+                self._resolve_tag(yaml.SequenceNode, event), [],
+                event.start_mark, None, flow_style=event.flow_style
+            )
+            while not self.at(yaml.SequenceEndEvent):
+                node.value.append(self._compose())
+            node.end_mark = self.next().end_mark
+        elif isinstance(event, yaml.MappingStartEvent):
+            node = yaml.MappingNode(
+                self._resolve_tag(yaml.MappingNode, event), [],
+                event.start_mark, None, flow_style=event.flow_style
+            )
+            while not self.at(yaml.MappingEndEvent):
+                key = self._compose()
+                node.value.append((key, self._compose()))
+            node.end_mark = self.next().end_mark
+        else:
+            raise yaml.YAMLError(f"Неожиданное событие YAML: {event}")
+
+        if event.anchor is not None:
+            self.anchors[event.anchor] = node
+        return node
+
+
+def iter_yaml_goods(file_path, categories=None):
+    """
+    Потоковое чтение товаров из YAML файла.
+
+    Поддерживаются форматы:
+    - файл поставщика: categories -> [{name, description, goods: [...]}];
+    - файл магазина: categories -> [{id, name}], goods -> [{category: id, ...}];
+    - список товаров (формат экспорта) и поток документов по одному товару.
+    В словарь categories складываются описания встреченных категорий.
+    """
+    if categories is None:
+        categories = {}
+
+    with open(file_path, 'rb') as stream:
+        reader = YAMLEventReader(stream)
+        reader.next()  # StreamStart
+        while not reader.at(yaml.StreamEndEvent):
+            reader.next()  # DocumentStart
+            if reader.at(yaml.SequenceStartEvent):
+                reader.next()
+                while not reader.at(yaml.SequenceEndEvent):
+                    good = reader.load()
+                    if isinstance(good, dict):
+                        yield good
+                reader.next()
+            elif reader.at(yaml.MappingStartEvent):
+                yield from _iter_yaml_mapping(reader, categories)
+            else:
+                reader.skip()
+            reader.next()  # DocumentEnd
+
+
+def _iter_yaml_mapping(reader, categories):
+    category_names = {}
+    header = {}
+    has_goods = False
+
+    reader.next()  # MappingStart
+    while not reader.at(yaml.MappingEndEvent):
+        key = reader.load()
+        if key in ('categories', 'goods') and reader.at(yaml.SequenceStartEvent):
+            has_goods = True
+            reader.next()
+            while not reader.at(yaml.SequenceEndEvent):
+                if key == 'categories':
+                    yield from _iter_yaml_category(reader, categories, category_names)
+                    continue
+                good = reader.load()
+                if isinstance(good, dict):
+                    if good.get('category') in category_names:
+                        good['category'] = category_names[good['category']]
+                    yield good
+            reader.next()
+        else:
+            header[key] = reader.load()
+    reader.next()  # MappingEnd
+
+    # Документ без categories/goods считаем отдельным товаром
+    if not has_goods and 'name' in header:
+        yield header
+
+
+def _iter_yaml_category(reader, categories, category_names):
+    if not reader.at(yaml.MappingStartEvent):
+        reader.skip()
+        return
+
+    fields = {}
+    pending = []
+    reader.next()
+    while not reader.at(yaml.MappingEndEvent):
+        key = reader.load()
+        if key == 'goods' and reader.at(yaml.SequenceStartEvent):
+            reader.next()
+            while not reader.at(yaml.SequenceEndEvent):
+                good = reader.load()
+                if not isinstance(good, dict):
+                    continue
+                if 'name' in fields:
+                    good.setdefault('category', fields['name'])
+                    yield good
+                else:
+                    # Название категории может идти после списка товаров
+                    pending.append(good)
+            reader.next()
+        else:
+            fields[key] = reader.load()
+    reader.next()
+
+    name = fields.get('name')
+    if name is not None:
+        categories.setdefault(str(name), fields.get('description') or '')
+        if 'id' in fields:
+            category_names[fields['id']] = str(name)
+    for good in pending:
+        good.setdefault('category', name)
+        yield good
+
+
+def chunked(iterable, size):
+    """Разбивает поток на списки фиксированного размера"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ImportRecordError(ValueError):
+    """Ошибка в данных отдельного товара"""
+
+
+class ImportCancelled(Exception):
+    """Задача импорта отменена пользователем"""
+
+
+def record_sku(good):
+    """Артикул товара из файла (sku, code или id) или None"""
+    sku = good.get('sku') or good.get('code') or good.get('id')
+    if sku in (None, ''):
+        return None
+    return str(sku)
+
+
+def to_decimal(value):
+    """Decimal из значения файла или None, если это не конечное число"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    return number if number.is_finite() else None
+
+
+def to_int(value):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    if not number.is_finite() or number != number.to_integral_value():
+        return None
+    return int(number)
+
+
+def price_limit():
+    """Верхняя граница цены (не включительно), которую вмещает Product.price"""
+    Product = apps.get_model('products', 'Product')
+    price_field = Product._meta.get_field('price')
+    return Decimal(10) ** (price_field.max_digits - price_field.decimal_places)
+
+
+def normalize_record(good):
+    """Приводит товар из файла к единому виду"""
+    sku = record_sku(good)
+    if sku is None:
+        raise ImportRecordError("не указан артикул (sku/code/id)")
+
+    name = good.get('name')
+    if not name:
+        raise ImportRecordError(f"товар {sku}: не указано название")
+
+    category = good.get('category')
+    if category in (None, ''):
+        raise ImportRecordError(f"товар {sku}: не указана категория")
+
+    # Те же правила разбора чисел, что и в ImportValidator: проверка и импорт дают одинаковый результат
+    price = to_decimal(good.get('price'))
+    if price is None or price < 0:
+        raise ImportRecordError(f"товар {sku}: некорректная цена {good.get('price')!r}")
+    # Цена, не помещающаяся в DecimalField, иначе уронила бы транзакцию всей пачки
+    if price >= price_limit():
+        raise ImportRecordError(f"товар {sku}: цена должна быть меньше {price_limit()}")
+
+    quantity = good.get('quantity')
+    quantity = to_int(quantity) if quantity not in (None, '') else 0
+    min_quantity = good.get('min_quantity')
+    if min_quantity not in (None, ''):
+        min_quantity = to_int(min_quantity)
+        if min_quantity is None:
+            raise ImportRecordError(f"товар {sku}: некорректное минимальное количество")
+    else:
+        min_quantity = None
+    if quantity is None:
+        raise ImportRecordError(f"товар {sku}: некорректное количество")
+    if quantity < 0 or (min_quantity is not None and min_quantity < 0):
+        raise ImportRecordError(f"товар {sku}: отрицательное количество")
+
+    parameters = good.get('parameters')
+    if parameters is None:
+        parameters = {
+            item['name']: item.get('value', '')
+            for item in good.get('characteristics') or []
+            if isinstance(item, dict) and item.get('name')
+        }
+    elif not isinstance(parameters, dict):
+        raise ImportRecordError(f"товар {sku}: parameters должен быть словарем")
+
+    image, images = record_images(good, sku)
+
+    return {
+        'sku': sku,
+        'name': str(name),
+        'category': str(category),
+        'supplier': good.get('supplier'),
+        'price': price,
+        'quantity': quantity,
+        'min_quantity': min_quantity,
+        'description': str(good.get('description') or ''),
+        'parameters': {str(key): str(value) for key, value in parameters.items()},
+        'image': image,
+        'images': images,
+    }
+
+
+def record_images(good, sku):
+    """Локальные пути изображений товара: image и images (список или строка через ';')"""
+    image = good.get('image')
+    images = good.get('images') or []
+    if isinstance(images, str):
+        images = images.split(';')
+    elif not isinstance(images, list):
+        raise ImportRecordError(f"товар {sku}: images должен быть списком путей")
+    images = [str(path).strip() for path in images if path not in (None, '') and str(path).strip()]
+    return (str(image).strip() or None) if image not in (None, '') else None, images
 
 
 class ProductImporter:
-    """Импорт товаров из YAML файлов"""
+    """Потоковый импорт товаров из YAML, CSV и JSON Lines"""
 
-    def __init__(self):
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
         self.stats = {
+            'processed': 0,
             'created': 0,
             'updated': 0,
+            'unchanged': 0,
             'errors': 0
         }
+        self.error_details = []
+        self.category_descriptions = {}
+        self.category_ids = {}
+        self.supplier_ids = {}
+        self.supplier_id = None
+        # Пул обработки изображений создается при первом товаре с картинками
+        self.images = None
+
+    def import_from_file(self, file_path, supplier_id=None, start_offset=0, on_progress=None, file_format=None):
+        """
+        Импорт товаров из файла; формат задается явно или определяется
+        по расширению и содержимому.
+
+        start_offset - сколько товаров с начала файла пропустить (возобновление
+        с контрольной точки); on_progress(offset, stats) вызывается после
+        каждой зафиксированной пачки.
+        """
+        from apps.core.formats import iter_goods
 
-    def import_from_file(self, file_path, supplier_id=None):
-        """Импорт товаров из YAML файла"""
         try:
-            # Заглушка для реализации импорта
-            # В реальном приложении здесь будет парсинг YAML и создание/обновление товаров
+            self.prepare(supplier_id)
+            goods = iter_goods(file_path, self.category_descriptions, file_format)
+            offset = 0
+            for chunk in chunked(goods, self.chunk_size):
+                if offset + len(chunk) <= start_offset:
+                    offset += len(chunk)
+                    continue
+                if offset < start_offset:
+                    chunk = chunk[start_offset - offset:]
+                    offset = start_offset
+                self.import_chunk(chunk)
+                offset += len(chunk)
+                if on_progress is not None:
+                    on_progress(offset, self.stats)
+
+            if self.error_details:
+                self.stats['error_details'] = self.error_details
+            if self.images is not None:
+                self.stats['images'] = self.images.stats
             return self.stats
+        except ImportCancelled:
+            raise
         except Exception as e:
             self.stats['errors'] += 1
             raise Exception(f"Ошибка импорта из файла {file_path}: {str(e)}")
+        finally:
+            self.close()
+
+    def close(self):
+        if self.images is not None:
+            self.images.close()
+
+    def prepare(self, supplier_id=None):
+        """Загружает справочники категорий и поставщиков в память"""
+        Category = apps.get_model('products', 'Category')
+        Supplier = apps.get_model('suppliers', 'Supplier')
+
+        self.supplier_id = int(supplier_id) if supplier_id else None
+        if self.supplier_id and not Supplier.objects.filter(id=self.supplier_id).exists():
+            raise ValueError(f"Поставщик {self.supplier_id} не найден")
+
+        self.category_ids = {}
+        for category_id, name in Category.objects.order_by('id').values_list('id', 'name'):
+            self.category_ids.setdefault(name, category_id)
+
+        if self.supplier_id is None:
+            self.supplier_ids = dict(Supplier.objects.values_list('name', 'id'))
+
+    def add_error(self, message):
+        self.stats['errors'] += 1
+        if len(self.error_details) < MAX_ERROR_DETAILS:
+            self.error_details.append(message)
+
+    def import_chunk(self, goods):
+        """Записывает пачку товаров: один запрос на чтение и пакетные вставки/обновления"""
+        from apps.products.importer import compute_content_hash
+        Product = apps.get_model('products', 'Product')
+
+        records = {}
+        for good in goods:
+            self.stats['processed'] += 1
+            try:
+                record = normalize_record(good)
+                record['supplier_id'] = self.resolve_supplier(record)
+            except ImportRecordError as e:
+                self.add_error(str(e))
+                continue
+            record['content_hash'] = compute_content_hash(record, record['category'])
+            # Повтор артикула внутри файла: побеждает последнее вхождение
+            records.pop(record['sku'], None)
+            records[record['sku']] = record
+
+        if not records:
+            return
+
+        existing = {
+            sku: (product_id, supplier_id, content_hash, min_quantity, is_delisted)
+            for sku, product_id, supplier_id, content_hash, min_quantity, is_delisted in Product.objects.filter(
+                sku__in=list(records)
+            ).values_list('sku', 'id', 'supplier_id', 'content_hash', 'min_quantity', 'is_delisted')
+        }
+
+        to_create = []
+        to_update = []
+        for sku, record in records.items():
+            if sku in existing:
+                product_id, supplier_id, content_hash, min_quantity, is_delisted = existing[sku]
+                if supplier_id != record['supplier_id']:
+                    self.add_error(f"товар {sku}: артикул принадлежит другому поставщику")
+                    continue
+                if content_hash == record['content_hash']:
+                    self.stats['unchanged'] += 1
+                    continue
+                if record['min_quantity'] is None:
+                    record['min_quantity'] = min_quantity
+                to_update.append(self.build_product(record, pk=product_id, delisted=is_delisted))
+            else:
+                to_create.append(self.build_product(record))
+
+        if not to_create and not to_update:
+            return
+
+        # Изображения обрабатываются до транзакции: это самая долгая часть пачки
+        assets = self.ingest_images(records, to_create + to_update)
+
+        with transaction.atomic():
+            # Метка изменения берется непосредственно перед записью, а не до обработки изображений:
+            # иначе экспорт, начатый в это время, получит watermark позже updated_at незафиксированных строк
+            now = timezone.now()
+            for product in to_create + to_update:
+                product.updated_at = now
+            if to_create:
+                Product.objects.bulk_create(to_create)
+                self.stats['created'] += len(to_create)
+            if to_update:
+                Product.objects.bulk_update(to_update, [
+                    'name', 'category', 'price', 'quantity', 'min_quantity', 'is_available',
+                    'description', 'content_hash', 'updated_at'
+                ])
+                self.stats['updated'] += len(to_update)
+
+            product_ids = self.sync_characteristics(records, to_create, to_update)
+            if assets:
+                self.sync_images(records, product_ids, assets)
+
+    def ingest_images(self, records, products):
+        """Хеширует и обрабатывает изображения измененных товаров, возвращает {путь: ImageAsset}"""
+        from apps.core.images import ImagePipeline
+
+        paths = [
+            path for product in products
+            for path in ([records[product.sku]['image']] if records[product.sku]['image'] else [])
+            + records[product.sku]['images']
+        ]
+        if not paths:
+            return {}
+
+        if self.images is None:
+            self.images = ImagePipeline()
+        assets, errors = self.images.ingest(paths)
+
+        for product in products:
+            record = records[product.sku]
+            failed = [path for path in [record['image']] + record['images'] if path in errors]
+            for path in failed:
+                self.add_error(f"товар {product.sku}: изображение {path}: {errors[path]}")
+            if failed:
+                # Пустой хеш: при следующем импорте товар будет обработан снова
+                product.content_hash = ''
+        return assets
+
+    def sync_images(self, records, product_ids, assets):
+        """Основное изображение (image или первое обработанное из images) и галерея товара"""
+        Product = apps.get_model('products', 'Product')
+        ProductImage = apps.get_model('products', 'ProductImage')
+
+        main_images = []
+        gallery = {}
+        for sku, product_id in product_ids.items():
+            record = records[sku]
+            if record['image']:
+                main = assets.get(record['image'])
+            else:
+                main = next((assets[path] for path in record['images'] if path in assets), None)
+            if main is not None:
+                main_images.append(Product(pk=product_id, image=main.original.name, image_asset=main))
+            if record['images']:
+                gallery[product_id] = [assets[path] for path in record['images'] if path in assets]
+
+        if main_images:
+            Product.objects.bulk_update(main_images, ['image', 'image_asset'])
+        if gallery:
+            ProductImage.objects.filter(product_id__in=list(gallery)).delete()
+            ProductImage.objects.bulk_create([
+                ProductImage(product_id=product_id, image=asset.original.name, image_asset=asset, display_order=order)
+                for product_id, product_assets in gallery.items()
+                for order, asset in enumerate(product_assets)
+            ])
+
+    def resolve_supplier(self, record):
+        if self.supplier_id:
+            return self.supplier_id
+        supplier_id = self.supplier_ids.get(record['supplier'])
+        if supplier_id is None:
+            raise ImportRecordError(f"товар {record['sku']}: неизвестный поставщик {record['supplier']!r}")
+        return supplier_id
+
+    def resolve_category(self, name):
+        category_id = self.category_ids.get(name)
+        if category_id is None:
+            Category = apps.get_model('products', 'Category')
+            category = Category.objects.create(
+                name=name,
+                description=self.category_descriptions.get(name, '')
+            )
+            category_id = self.category_ids[name] = category.id
+        return category_id
+
+    def build_product(self, record, pk=None, delisted=False):
+        from apps.products.models import is_stock_available
+        Product = apps.get_model('products', 'Product')
+        product = Product(
+            pk=pk,
+            sku=record['sku'],
+            name=record['name'][:255],
+            category_id=self.resolve_category(record['category']),
+            supplier_id=record['supplier_id'],
+            price=record['price'],
+            quantity=record['quantity'],
+            description=record['description'],
+            content_hash=record['content_hash'],
+        )
+        if record['min_quantity'] is not None:
+            product.min_quantity = record['min_quantity']
+        # bulk_create/bulk_update не вызывают save(): доступность считается здесь
+        product.is_available = is_stock_available(product.quantity, product.min_quantity, delisted)
+        return product
+
+    def sync_characteristics(self, records, created, updated):
+        """Приводит характеристики товаров к данным файла пакетными запросами"""
+        Product = apps.get_model('products', 'Product')
+        ProductCharacteristic = apps.get_model('products', 'ProductCharacteristic')
+
+        product_ids = {product.sku: product.pk for product in created + updated}
+        missing = [sku for sku, product_id in product_ids.items() if product_id is None]
+        if missing:
+            # bulk_create не вернул id (СУБД без RETURNING)
+            product_ids.update(
+                Product.objects.filter(sku__in=missing).values_list('sku', 'id')
+            )
+
+        current = {}
+        if updated:
+            for char_id, product_id, name, value in ProductCharacteristic.objects.filter(
+                product_id__in=[product.pk for product in updated]
+            ).values_list('id', 'product_id', 'name', 'value'):
+                current[(product_id, name)] = (char_id, value)
+
+        to_create = []
+        to_update = []
+        keep = set()
+        for sku, product_id in product_ids.items():
+            for name, value in records[sku]['parameters'].items():
+                key = (product_id, name[:255])
+                keep.add(key)
+                value = value[:255]
+                if key not in current:
+                    to_create.append(ProductCharacteristic(product_id=product_id, name=key[1], value=value))
+                elif current[key][1] != value:
+                    to_update.append(ProductCharacteristic(pk=current[key][0], value=value))
+
+        to_delete = [char_id for key, (char_id, value) in current.items() if key not in keep]
+
+        if to_create:
+            ProductCharacteristic.objects.bulk_create(to_create)
+        if to_update:
+            ProductCharacteristic.objects.bulk_update(to_update, ['value'])
+        if to_delete:
+            ProductCharacteristic.objects.filter(id__in=to_delete).delete()
+        return product_ids
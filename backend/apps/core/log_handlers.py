@@ -0,0 +1,183 @@
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+
+LEVELS = {
+    logging.DEBUG: 'debug',
+    logging.INFO: 'info',
+    logging.WARNING: 'warning',
+    logging.ERROR: 'error',
+    logging.CRITICAL: 'error',
+}
+
+# Логгер -> SystemLog.module; выбирается самый длинный подходящий префикс
+LOGGER_MODULES = {
+    'apps.orders': 'orders',
+    'apps.users': 'users',
+    'apps.products': 'products',
+    'apps.core.mail': 'email',
+    'apps.core.email_templates': 'email',
+    'apps.core.import_export': 'import',
+    'apps.core.sharding': 'import',
+    'apps.core.validation': 'import',
+}
+
+# Запись самого лога не должна снова попадать в лог
+IGNORED_LOGGERS = ('django.db.backends',)
+
+
+def logger_module(name):
+    best = None
+    for prefix in LOGGER_MODULES:
+        if (name == prefix or name.startswith(prefix + '.')) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return LOGGER_MODULES[best] if best is not None else 'system'
+
+
+def resolved_user_id(user):
+    """id пользователя без запроса к БД: ленивый request.user используется, только если уже загружен"""
+    from django.utils.functional import SimpleLazyObject, empty
+
+    if user is None:
+        return None
+    # Ленивый объект проверяется первым: isinstance с другим классом обращается
+    # к __class__ и загрузил бы пользователя
+    if isinstance(user, SimpleLazyObject):
+        if user._wrapped is empty:
+            return None
+        user = user._wrapped
+    if isinstance(user, int):
+        return user
+    return user.pk if getattr(user, 'is_authenticated', False) else None
+
+
+class SystemLogHandler(logging.Handler):
+    """
+    Обработчик logging, который пишет записи в SystemLog.
+
+    emit() только переводит запись в словарь и кладет в очередь (без ожидания:
+    при переполнении запись отбрасывается). Фоновый поток забирает записи
+    пачками и сохраняет одним bulk_create, так что логирование не добавляет
+    обращений к базе в обработку запроса.
+
+    Дополнительные поля через extra: request, user (объект или id), object
+    (экземпляр модели) или object_id/object_type, system_module.
+    """
+
+    def __init__(self, level=logging.NOTSET, queue_size=10000, batch_size=200, flush_interval=2.0):
+        super().__init__(level)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.start_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.dropped = 0
+        atexit.register(self.flush)
+
+    def filter(self, record):
+        if record.name.startswith(IGNORED_LOGGERS):
+            return False
+        return super().filter(record)
+
+    def emit(self, record):
+        try:
+            entry = self.build_entry(record)
+        except Exception:
+            self.handleError(record)
+            return
+        self.ensure_thread()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def build_entry(self, record):
+        # Запрос DRF оборачивает HttpRequest, пользователь после аутентификации есть в обоих
+        request = getattr(record, 'request', None)
+        request = getattr(request, '_request', request)
+        meta = getattr(request, 'META', {})
+        user = getattr(record, 'user', None)
+        if user is None and request is not None:
+            user = request.__dict__.get('user')
+
+        entry = {
+            'level': LEVELS.get(record.levelno, 'info'),
+            'module': getattr(record, 'system_module', None) or logger_module(record.name),
+            'message': self.format(record),
+            'user_id': resolved_user_id(user),
+            'ip_address': meta.get('REMOTE_ADDR') or None,
+            'user_agent': meta.get('HTTP_USER_AGENT', '')[:500],
+            'object_id': getattr(record, 'object_id', None),
+            'object_type': getattr(record, 'object_type', ''),
+        }
+        instance = getattr(record, 'object', None)
+        if instance is not None and hasattr(instance, '_meta'):
+            entry['object_id'] = instance.pk
+            entry['object_type'] = instance._meta.label
+        return entry
+
+    def ensure_thread(self):
+        # После fork (gunicorn, воркеры Celery) поток родителя в дочернем процессе не работает
+        if self.pid == os.getpid() and self.thread is not None and self.thread.is_alive():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid() and self.thread is not None and self.thread.is_alive():
+                return
+            if self.pid is not None and self.pid != os.getpid():
+                # Записи, скопированные из родителя, запишет сам родитель
+                self.queue = queue.Queue(maxsize=self.queue.maxsize)
+                self.write_lock = threading.Lock()
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name='system-log-writer', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch:
+                self.write(batch)
+
+    def flush(self):
+        """Сохраняет все, что есть в очереди (при завершении процесса)"""
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = []
+        if batch:
+            self.write(batch)
+
+    def write(self, batch):
+        from django.apps import apps
+
+        with self.write_lock:
+            try:
+                SystemLog = apps.get_model('core', 'SystemLog')
+                SystemLog.objects.bulk_create([SystemLog(**entry) for entry in batch])
+            except Exception as e:
+                # Не через logging: ошибка записи лога иначе снова попадет в эту же очередь
+                sys.stderr.write(f"Ошибка записи SystemLog ({len(batch)} записей): {e}\n")
+
+    def close(self):
+        self.flush()
+        super().close()
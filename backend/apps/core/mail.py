@@ -0,0 +1,210 @@
+import logging
+import time
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# Письма в статусе sending дольше этого времени считаются брошенными упавшим воркером
+STALE_SENDING_AFTER = timedelta(minutes=10)
+# Через сколько секунд повторять письма, не ушедшие с первой попытки
+RETRY_DELAY = 60
+# Флаг запланированной отправки: пачка писем запускает одну задачу, а не по задаче на письмо
+DRAIN_SCHEDULED_KEY = 'mail:drain-scheduled'
+
+
+def enqueue_email(subject, body, recipients, from_email=None, kind='', schedule=True):
+    """
+    Кладет письмо в очередь и после фиксации транзакции планирует отправку.
+    Отправка запускается с задержкой EMAIL_OUTBOX_DELAY, чтобы письма
+    успели накопиться и ушли одной пачкой.
+    """
+    OutgoingEmail = apps.get_model('core', 'OutgoingEmail')
+
+    recipients = [email for email in recipients if email]
+    if not recipients:
+        return None
+
+    email = OutgoingEmail.objects.create(
+        kind=kind,
+        subject=subject[:255],
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=recipients,
+    )
+    if schedule:
+        transaction.on_commit(schedule_drain)
+    return email
+
+
+def schedule_drain():
+    try:
+        # Флаг живет до запуска задачи; задача снимает его в начале, и письма,
+        # добавленные во время отправки, планируют следующий запуск
+        if not cache.add(DRAIN_SCHEDULED_KEY, 1, settings.EMAIL_OUTBOX_DELAY):
+            return
+    except Exception as e:
+        logger.warning("Кеш недоступен, отправка писем планируется без объединения: %s", e)
+    try:
+        from apps.core.tasks import drain_email_outbox_task
+        drain_email_outbox_task.apply_async(countdown=settings.EMAIL_OUTBOX_DELAY)
+    except Exception as e:
+        # Письмо остается в очереди и уйдет со следующим запуском отправки
+        logger.warning("Ошибка планирования отправки писем: %s", e)
+
+
+class MailDispatcher:
+    """
+    Отправка очереди писем через одно переиспользуемое соединение.
+
+    Пачка сначала захватывается (pending -> sending одним UPDATE), поэтому
+    несколько воркеров не отправят одно письмо дважды, и уходит одним
+    send_messages. Соединение открывается только при первой непустой пачке.
+    Ошибка SMTP прерывает пачку: принятые до нее письма отмечаются
+    отправленными, письмо с ошибкой возвращается в очередь до
+    EMAIL_OUTBOX_MAX_ATTEMPTS попыток, остальные - без траты попытки.
+    Один проход идет по очереди один раз, вернувшиеся письма ждут
+    следующего запуска.
+    """
+
+    def __init__(self, batch_size=None, max_attempts=None, connection=None):
+        self.batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+        self.max_attempts = max_attempts or settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+        self.connection = connection
+        self.stats = {'sent': 0, 'failed': 0, 'retried': 0, 'batches': 0, 'seconds': 0}
+
+    def drain(self, limit=None):
+        """Отправляет письма, пока очередь не опустеет (или не будет отправлено limit)"""
+        started = time.perf_counter()
+        self.release_stale()
+
+        connection = None
+        last_id = 0
+        try:
+            while limit is None or self.stats['sent'] + self.stats['failed'] < limit:
+                batch = self.claim_batch(last_id)
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                if connection is None:
+                    connection = self.connection or get_connection(fail_silently=False)
+                    try:
+                        connection.open()
+                    except Exception:
+                        self.release([email.id for email in batch], refund_attempt=True)
+                        raise
+                if not self.send_batch(connection, batch):
+                    # После ошибки сервер мог закрыть соединение: следующая пачка переподключится
+                    connection.close()
+                    connection = None
+        finally:
+            if connection is not None:
+                connection.close()
+
+        self.stats['seconds'] = round(time.perf_counter() - started, 4)
+        self.stats['messages_per_second'] = (
+            round(self.stats['sent'] / self.stats['seconds'], 1) if self.stats['seconds'] else None
+        )
+        return self.stats
+
+    def release_stale(self):
+        OutgoingEmail = apps.get_model('core', 'OutgoingEmail')
+        OutgoingEmail.objects.filter(
+            status='sending', updated_at__lt=timezone.now() - STALE_SENDING_AFTER
+        ).update(status='pending', updated_at=timezone.now())
+
+    def claim_batch(self, after_id=0):
+        OutgoingEmail = apps.get_model('core', 'OutgoingEmail')
+
+        ids = list(
+            OutgoingEmail.objects.filter(status='pending', id__gt=after_id).order_by('id')
+            .values_list('id', flat=True)[:self.batch_size]
+        )
+        if not ids:
+            return []
+        now = timezone.now()
+        OutgoingEmail.objects.filter(id__in=ids, status='pending').update(
+            status='sending', attempts=F('attempts') + 1, updated_at=now
+        )
+        # Письма, которые в тот же момент захватил другой воркер, имеют другое updated_at
+        return list(OutgoingEmail.objects.filter(id__in=ids, status='sending', updated_at=now).order_by('id'))
+
+    def send_batch(self, connection, batch):
+        """Отправляет пачку одним send_messages; False, если отправка прервалась ошибкой"""
+        OutgoingEmail = apps.get_model('core', 'OutgoingEmail')
+
+        self.stats['batches'] += 1
+        # Бэкенды отправляют письма по порядку: номер последнего выданного письма
+        # показывает, какие письма уже приняты сервером, если send_messages упадет
+        position = {'current': -1}
+
+        def messages():
+            for index, email in enumerate(batch):
+                position['current'] = index
+                yield EmailMessage(
+                    subject=email.subject,
+                    body=email.body,
+                    from_email=email.from_email,
+                    to=email.recipients,
+                    connection=connection,
+                )
+
+        error = None
+        completed = False
+        try:
+            connection.send_messages(messages())
+            completed = True
+        except Exception as e:
+            error = e
+        finally:
+            # Отметка и при прерывании воркера: принятые сервером письма не уйдут повторно
+            delivered = len(batch) if completed else max(position['current'], 0)
+            sent_ids = [email.id for email in batch[:delivered]]
+            if sent_ids:
+                now = timezone.now()
+                OutgoingEmail.objects.filter(id__in=sent_ids).update(
+                    status='sent', sent_at=now, error_message='', updated_at=now
+                )
+            self.stats['sent'] += len(sent_ids)
+
+        if error is None:
+            return True
+
+        failed = batch[delivered]
+        retry = failed.attempts < self.max_attempts
+        OutgoingEmail.objects.filter(pk=failed.pk).update(
+            status='pending' if retry else 'failed',
+            error_message=str(error),
+            updated_at=timezone.now(),
+        )
+        self.stats['retried' if retry else 'failed'] += 1
+        # Неотправленные письма пачки возвращаются в очередь без траты попытки
+        self.release([email.id for email in batch[delivered + 1:]], refund_attempt=True)
+        return False
+
+    def release(self, ids, refund_attempt=False):
+        OutgoingEmail = apps.get_model('core', 'OutgoingEmail')
+        if ids:
+            changes = {'status': 'pending', 'updated_at': timezone.now()}
+            if refund_attempt:
+                changes['attempts'] = F('attempts') - 1
+            OutgoingEmail.objects.filter(id__in=ids, status='sending').update(**changes)
+
+
+def clear_drain_scheduled():
+    try:
+        cache.delete(DRAIN_SCHEDULED_KEY)
+    except Exception as e:
+        logger.warning("Кеш недоступен: %s", e)
+
+
+def get_admin_emails():
+    User = apps.get_model('users', 'User')
+    return list(User.objects.filter(user_type='admin', is_active=True).values_list('email', flat=True))
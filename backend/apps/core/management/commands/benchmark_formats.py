@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+from django.core.management.base import BaseCommand
+from django.apps import apps
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк экспорта, разбора и импорта каталога в разных форматах (YAML, CSV, JSON Lines)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=20000)
+        parser.add_argument('--categories', type=int, default=200)
+        parser.add_argument('--parameters', type=int, default=5)
+        parser.add_argument('--formats', default=None, help='Список форматов через запятую (по умолчанию все)')
+        parser.add_argument('--output', default=None, help='Путь для JSON с результатами')
+
+    def handle(self, *args, **options):
+        from apps.core.benchmarks import get_benchmark_supplier, timer, write_results, write_synthetic_yaml
+        from apps.core.formats import FORMATS
+        from apps.core.import_export import ProductExporter, ProductImporter
+
+        Product = apps.get_model('products', 'Product')
+
+        formats = [value.strip() for value in (options['formats'] or ','.join(FORMATS)).split(',') if value.strip()]
+        unknown = [name for name in formats if name not in FORMATS]
+        if unknown:
+            self.stderr.write(f"Неизвестные форматы: {', '.join(unknown)}")
+            return
+
+        supplier = get_benchmark_supplier()
+        work_dir = tempfile.mkdtemp(prefix='procurepro_bench_')
+        products = options['products']
+
+        try:
+            # Исходный каталог загружается один раз, экспорт каждого формата идет из БД
+            seed_path = os.path.join(work_dir, 'seed.yaml')
+            write_synthetic_yaml(seed_path, products, options['categories'], options['parameters'])
+            Product.objects.filter(supplier=supplier).delete()
+            ProductImporter().import_from_file(seed_path, supplier.id)
+
+            runs = []
+            for name in formats:
+                codec = FORMATS[name]
+                file_path = os.path.join(work_dir, f'catalog_{name}{codec.extensions[0]}')
+                timings = {}
+
+                with timer(timings, 'export'):
+                    exported = ProductExporter().export_to_file(file_path, supplier.id, name)['exported']
+                with timer(timings, 'parse'):
+                    parsed = sum(1 for good in codec.iter_goods(file_path))
+
+                Product.objects.filter(supplier=supplier).delete()
+                with timer(timings, 'import'):
+                    result = ProductImporter().import_from_file(file_path, supplier.id, file_format=name)
+
+                run = {
+                    'format': name,
+                    'exported': exported,
+                    'parsed': parsed,
+                    'created': result['created'],
+                    'errors': result['errors'],
+                    'file_size': os.path.getsize(file_path),
+                    'seconds': timings,
+                    'products_per_second': {
+                        phase: round(exported / seconds, 1) if seconds else None
+                        for phase, seconds in timings.items()
+                    },
+                }
+                runs.append(run)
+                rates = run['products_per_second']
+                self.stdout.write(
+                    f"{name}: {run['file_size'] / 1024 / 1024:.1f} MB, "
+                    f"экспорт {rates['export']:.0f}/с, разбор {rates['parse']:.0f}/с, "
+                    f"импорт {rates['import']:.0f}/с, ошибок {result['errors']}"
+                )
+
+            if options['output']:
+                write_results(options['output'], 'formats', {
+                    'products': products,
+                    'categories': options['categories'],
+                    'parameters': options['parameters'],
+                    'runs': runs,
+                })
+                self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+        finally:
+            Product.objects.filter(supplier=supplier).delete()
+            shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,77 @@
+import time
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк отправки писем: отдельное соединение на письмо против пачек через одно соединение'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--output', default=None, help='Путь для JSON с результатами')
+
+    def handle(self, *args, **options):
+        from django.apps import apps
+        from django.core.mail import send_mail
+        from apps.core.benchmarks import write_results
+        from apps.core.mail import MailDispatcher, enqueue_email
+        from apps.core.smtp_sink import SMTPSink
+
+        OutgoingEmail = apps.get_model('core', 'OutgoingEmail')
+        count = options['messages']
+        sink = SMTPSink(port=0, keep=0).start()
+        results = {'messages': count, 'batch_size': options['batch_size']}
+
+        smtp = {
+            'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'EMAIL_HOST': '127.0.0.1',
+            'EMAIL_PORT': sink.port,
+            'EMAIL_USE_TLS': False,
+            'EMAIL_USE_SSL': False,
+            'EMAIL_HOST_USER': '',
+            'EMAIL_HOST_PASSWORD': '',
+        }
+        kind = 'benchmark'
+        try:
+            with override_settings(**smtp):
+                # Как раньше: send_mail открывает новое соединение на каждое письмо
+                started = time.perf_counter()
+                for index in range(count):
+                    send_mail(f'Письмо {index}', 'Текст письма', None, [f'user{index}@example.com'])
+                results['per_message_connection'] = self.measure(sink, started, count)
+
+                OutgoingEmail.objects.filter(kind=kind).delete()
+                for index in range(count):
+                    enqueue_email(f'Письмо {index}', 'Текст письма', [f'user{index}@example.com'],
+                                  kind=kind, schedule=False)
+                sink.stats.update(connections=0, messages=0)
+                started = time.perf_counter()
+                stats = MailDispatcher(batch_size=options['batch_size']).drain()
+                results['batched'] = self.measure(sink, started, stats['sent'])
+        finally:
+            sink.stop()
+            OutgoingEmail.objects.filter(kind=kind).delete()
+
+        for name in ('per_message_connection', 'batched'):
+            result = results[name]
+            self.stdout.write(
+                f"{name}: {result['messages_per_second']:.0f} писем/с, "
+                f"соединений {result['connections']}, принято {result['received']}"
+            )
+
+        if options['output']:
+            write_results(options['output'], 'mail', results)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+
+    def measure(self, sink, started, sent):
+        seconds = time.perf_counter() - started
+        result = {
+            'sent': sent,
+            'seconds': round(seconds, 4),
+            'messages_per_second': round(sent / seconds, 1) if seconds else None,
+            'connections': sink.stats['connections'],
+            'received': sink.stats['messages'],
+        }
+        sink.stats.update(connections=0, messages=0)
+        return result
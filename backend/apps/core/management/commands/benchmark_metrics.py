@@ -0,0 +1,63 @@
+import statistics
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+
+class Command(BaseCommand):
+    help = 'Накладные расходы MetricsMiddleware: время запроса с метриками и без них'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/products/products/')
+        parser.add_argument('--requests', type=int, default=500, help='Запросов в одном прогоне')
+        parser.add_argument('--rounds', type=int, default=5, help='Прогонов (с метриками и без чередуются)')
+        parser.add_argument('--output', default=None, help='Путь для JSON с результатами')
+
+    def handle(self, *args, **options):
+        from apps.core.benchmarks import write_results
+
+        without_metrics = [name for name in settings.MIDDLEWARE if name != 'apps.core.middleware.MetricsMiddleware']
+        with_metrics = ['apps.core.middleware.MetricsMiddleware'] + without_metrics
+        metrics_dir = tempfile.mkdtemp(prefix='procurepro_metrics_')
+        # Журнал запросов отключен, чтобы сравнивались только метрики
+        common = {
+            'API_REQUEST_LOG': dict(settings.API_REQUEST_LOG, enabled=False),
+            'METRICS': dict(settings.METRICS, enabled=True, dir=metrics_dir),
+        }
+
+        timings = {'off': [], 'on': []}
+        self.run_round(without_metrics, common, options)  # прогрев
+        for index in range(options['rounds']):
+            for name, middleware in (('off', without_metrics), ('on', with_metrics)):
+                timings[name].append(self.run_round(middleware, common, options))
+
+        off = statistics.median(timings['off'])
+        on = statistics.median(timings['on'])
+        results = {
+            'path': options['path'],
+            'requests': options['requests'],
+            'rounds': options['rounds'],
+            'off_ms_per_request': round(off * 1000, 4),
+            'on_ms_per_request': round(on * 1000, 4),
+            'overhead_percent': round((on - off) / off * 100, 2) if off else None,
+        }
+        self.stdout.write(
+            f"без метрик {results['off_ms_per_request']} мс/запрос, с метриками {results['on_ms_per_request']} "
+            f"мс/запрос, накладные расходы {results['overhead_percent']}%"
+        )
+
+        if options['output']:
+            write_results(options['output'], 'metrics_overhead', results)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+
+    def run_round(self, middleware, common, options):
+        """Среднее время запроса, секунды; у каждого запроса свой адрес, чтобы не сработал throttling"""
+        with override_settings(MIDDLEWARE=middleware, **common):
+            client = Client()
+            started = time.perf_counter()
+            for index in range(options['requests']):
+                client.get(options['path'], REMOTE_ADDR=f'10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}')
+            return (time.perf_counter() - started) / options['requests']
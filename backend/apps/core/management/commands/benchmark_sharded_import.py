@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+from django.apps import apps
+from django.db import connection, connections
+
+
+def _init_worker():
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _import_shard(shard_path, supplier_id):
+    from apps.core.sharding import import_shard
+    return import_shard(shard_path, supplier_id)
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк параллельного (шардированного) импорта на 1/2/4/8 процессах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=20000)
+        parser.add_argument('--categories', type=int, default=200)
+        parser.add_argument('--parameters', type=int, default=5)
+        parser.add_argument('--workers', default='1,2,4,8', help='Список количества процессов через запятую')
+        parser.add_argument('--shards', type=int, default=None, help='Количество шардов (по умолчанию 2 x max workers)')
+        parser.add_argument('--output', default=None, help='Путь для JSON с результатами')
+
+    def handle(self, *args, **options):
+        from apps.core.benchmarks import get_benchmark_supplier, timer, write_results, write_synthetic_yaml
+        from apps.core.sharding import split_into_shards
+
+        Product = apps.get_model('products', 'Product')
+        Category = apps.get_model('products', 'Category')
+
+        workers_list = [int(value) for value in options['workers'].split(',') if value.strip()]
+        # SQLite допускает только одну пишущую транзакцию: процессы ждут друг друга,
+        # и цифры для нескольких процессов не говорят о параллельной записи
+        writes_serialized = connection.vendor == 'sqlite'
+        if writes_serialized and max(workers_list) > 1:
+            self.stderr.write(self.style.WARNING(
+                "База SQLite: запись из процессов выполняется по очереди, ускорение не измеряется. "
+                "Для осмысленных результатов запускайте на PostgreSQL или MySQL."
+            ))
+        shard_count = options['shards'] or 2 * max(workers_list)
+        supplier = get_benchmark_supplier()
+        work_dir = tempfile.mkdtemp(prefix='procurepro_bench_')
+
+        try:
+            file_path = os.path.join(work_dir, 'catalog.yaml')
+            setup = {}
+            with timer(setup, 'generate'):
+                write_synthetic_yaml(file_path, options['products'], options['categories'], options['parameters'])
+            with timer(setup, 'split'):
+                split = split_into_shards(file_path, os.path.join(work_dir, 'shards'), shard_count)
+            shard_paths = [shard['path'] for shard in split['shards']]
+
+            # Категории создаются заранее, чтобы все прогоны были в равных условиях
+            for index in range(min(options['categories'], options['products'])):
+                name = f'Категория {index:05d}'
+                if not Category.objects.filter(name=name).exists():
+                    Category.objects.create(name=name)
+
+            self.stdout.write(
+                f"Файл: {options['products']} товаров, {len(shard_paths)} шардов; "
+                f"генерация {setup['generate']} c, разбиение {setup['split']} c"
+            )
+
+            runs = []
+            for workers in workers_list:
+                Product.objects.filter(supplier=supplier).delete()
+                connections.close_all()
+
+                started = time.perf_counter()
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                    results = list(pool.map(_import_shard, shard_paths, [supplier.id] * len(shard_paths)))
+                elapsed = time.perf_counter() - started
+
+                created = sum(result['created'] for result in results)
+                errors = sum(result['errors'] for result in results)
+                runs.append({
+                    'workers': workers,
+                    'seconds': round(elapsed, 3),
+                    'products_per_second': round(created / elapsed, 1) if elapsed else None,
+                    'created': created,
+                    'errors': errors,
+                })
+                self.stdout.write(
+                    f"workers={workers}: {elapsed:.2f} c, {created / elapsed:.0f} товаров/с, ошибок {errors}"
+                )
+
+            baseline = runs[0]['seconds'] if runs else None
+            for run in runs:
+                run['speedup'] = round(baseline / run['seconds'], 2) if run['seconds'] else None
+
+            if options['output']:
+                write_results(options['output'], 'sharded_import', {
+                    'products': options['products'],
+                    'categories': options['categories'],
+                    'shards': len(shard_paths),
+                    'database': connection.vendor,
+                    'writes_serialized': writes_serialized,
+                    'setup': setup,
+                    'runs': runs,
+                })
+                self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+        finally:
+            Product.objects.filter(supplier=supplier).delete()
+            shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,228 @@
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from unittest.mock import patch
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+DEFAULT_SIZES = '10000,100000,1000000'
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Набор бенчмарков на синтетическом каталоге: импорт, экспорт, список каталога, поиск, '
+        'оформление заказа и статистика поставщика. Результаты пишутся в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Размеры каталога через запятую')
+        parser.add_argument('--format', default='jsonl', help='Формат файла для экспорта и импорта')
+        parser.add_argument('--repeat', type=int, default=20, help='Повторов для каждого запроса API')
+        parser.add_argument('--suppliers', type=int, default=10)
+        parser.add_argument('--categories', type=int, default=100)
+        parser.add_argument('--customers', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--skip', default='', help='Сценарии, которые нужно пропустить, через запятую')
+        parser.add_argument('--output', default=None, help='Путь для JSON с результатами')
+
+    def handle(self, *args, **options):
+        from rest_framework.views import APIView
+        from apps.core.benchmarks import write_results
+        from apps.core.formats import FORMATS
+
+        if options['format'] not in FORMATS:
+            self.stderr.write(f"Неизвестный формат: {options['format']}")
+            return
+
+        sizes = sorted(int(value) for value in options['sizes'].split(',') if value.strip())
+        skip = {value.strip() for value in options['skip'].split(',') if value.strip()}
+        work_dir = tempfile.mkdtemp(prefix='procurepro_suite_')
+        runs = []
+
+        try:
+            # Лимиты запросов и письма из Celery не относятся к измеряемому коду
+            with patch.object(APIView, 'throttle_classes', []), \
+                    patch('apps.orders.views.OrderViewSet._send_order_emails_async'):
+                for size in sizes:
+                    runs.append(self.run_size(size, options, skip, work_dir))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        if options['output']:
+            write_results(options['output'], 'suite', {
+                'sizes': sizes,
+                'format': options['format'],
+                'repeat': options['repeat'],
+                'runs': runs,
+            })
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+
+    def run_size(self, size, options, skip, work_dir):
+        from apps.core.benchmarks import generate_catalog
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Каталог на {size} товаров'))
+        started = time.perf_counter()
+        catalog = generate_catalog(
+            suppliers=options['suppliers'],
+            categories=options['categories'],
+            products=size,
+            customers=options['customers'],
+            carts=0,
+            orders=options['orders'],
+            seed=options['seed'],
+            log=lambda message: None,
+        )
+        run = {
+            'size': size,
+            'catalog': catalog,
+            'generate_seconds': round(time.perf_counter() - started, 4),
+            'scenarios': {},
+        }
+
+        scenarios = [
+            ('export_import', self.bench_export_import),
+            ('catalog_list', self.bench_catalog_list),
+            ('search', self.bench_search),
+            ('checkout', self.bench_checkout),
+            ('supplier_stats', self.bench_supplier_stats),
+        ]
+        for name, method in scenarios:
+            if name in skip:
+                continue
+            # Ошибка одного сценария не должна обрывать весь прогон
+            try:
+                result = method(size, options, work_dir)
+            except Exception as e:
+                result = {'error': str(e)}
+            run['scenarios'][name] = result
+            self.stdout.write(f'  {name}: {self.describe(result)}')
+        return run
+
+    def describe(self, result):
+        if 'error' in result:
+            return self.style.ERROR(f"ошибка: {result['error']}")
+        if 'median_ms' in result:
+            return f"медиана {result['median_ms']} мс, p95 {result['p95_ms']} мс, запросов к БД {result['queries']}"
+        return ', '.join(f'{phase} {rate:.0f} товаров/с' for phase, rate in result['products_per_second'].items())
+
+    def measure(self, request, repeat):
+        """Время ответа API: медиана, p95 и число запросов к БД в последнем вызове"""
+        durations = []
+        queries = 0
+        for attempt in range(repeat):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request(attempt)
+                durations.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise Exception(f"HTTP {response.status_code}: {str(response.data)[:200]}")
+            queries = len(captured)
+        return {
+            'requests': repeat,
+            'median_ms': round(statistics.median(durations), 2),
+            'p95_ms': round(percentile(durations, 0.95), 2),
+            'min_ms': round(min(durations), 2),
+            'queries': queries,
+        }
+
+    def client_for(self, username):
+        from django.contrib.auth import get_user_model
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.get(username=username))
+        return client
+
+    def bench_export_import(self, size, options, work_dir):
+        from apps.core.benchmarks import GENERATED_SKU_PREFIX, timer
+        from apps.core.import_export import ProductExporter, ProductImporter
+        from apps.products.models import Product
+
+        file_path = os.path.join(work_dir, f"catalog_{size}{self.extension(options['format'])}")
+        timings = {}
+        with timer(timings, 'export'):
+            exported = ProductExporter().export_to_file(file_path, file_format=options['format'])['exported']
+        # Сброс хешей заставляет импорт обновить все товары, повторный проход идет без изменений
+        Product.objects.filter(sku__startswith=GENERATED_SKU_PREFIX).update(content_hash='')
+        with timer(timings, 'import_update'):
+            updated = ProductImporter().import_from_file(file_path, file_format=options['format'])
+        with timer(timings, 'import_unchanged'):
+            unchanged = ProductImporter().import_from_file(file_path, file_format=options['format'])
+        os.remove(file_path)
+
+        return {
+            'exported': exported,
+            'updated': updated['updated'],
+            'unchanged': unchanged['unchanged'],
+            'errors': updated['errors'] + unchanged['errors'],
+            'seconds': timings,
+            'products_per_second': {
+                phase: round(exported / seconds, 1) if seconds else None
+                for phase, seconds in timings.items()
+            },
+        }
+
+    def extension(self, file_format):
+        from apps.core.formats import FORMATS
+        return FORMATS[file_format].extensions[0]
+
+    def bench_catalog_list(self, size, options, work_dir):
+        client = self.client_for('gen_customer_00000')
+        return self.measure(
+            lambda attempt: client.get('/api/products/products/', {'page': attempt % 5 + 1}),
+            options['repeat']
+        )
+
+    def bench_search(self, size, options, work_dir):
+        from apps.core.benchmarks import PRODUCT_WORDS
+
+        client = self.client_for('gen_customer_00000')
+        return self.measure(
+            lambda attempt: client.get(
+                '/api/products/products/', {'search': PRODUCT_WORDS[attempt % len(PRODUCT_WORDS)]}
+            ),
+            options['repeat']
+        )
+
+    def bench_checkout(self, size, options, work_dir):
+        from django.contrib.auth import get_user_model
+        from apps.core.benchmarks import GENERATED_SKU_PREFIX, GENERATED_USERNAME_PREFIX, fill_carts
+        from apps.products.models import Product
+
+        repeat = min(options['repeat'], options['customers'])
+        users = list(
+            get_user_model().objects.filter(username__startswith=f'{GENERATED_USERNAME_PREFIX}customer_')
+            .order_by('username')[:repeat]
+        )
+        # Только товары с запасом, чтобы заказ не отклонялся из-за остатков
+        products = list(
+            Product.objects.filter(sku__startswith=GENERATED_SKU_PREFIX, is_available=True, quantity__gte=10)
+            .order_by('id').values_list('id', 'price')[:1000]
+        )
+        fill_carts(users, products, random.Random(options['seed']))
+
+        clients = [self.client_for(user.username) for user in users]
+        return self.measure(
+            lambda attempt: clients[attempt].post(
+                '/api/orders/orders/', {'shipping_address': 'г. Москва, ул. Тестовая, д. 1'}, format='json'
+            ),
+            len(clients)
+        )
+
+    def bench_supplier_stats(self, size, options, work_dir):
+        client = self.client_for('gen_supplier_00000')
+        return self.measure(
+            lambda attempt: client.get('/api/suppliers/my-supplier/stats/'),
+            options['repeat']
+        )
@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from django.apps import apps
+from django.test.utils import override_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Бенчмарк задержки писем под нагрузкой импорта: одна общая очередь против '
+        'отдельных очередей (воркеры Celery в этом же процессе, брокер в памяти)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--imports', type=int, default=4, help='Импортов, запущенных перед письмами')
+        parser.add_argument('--products', type=int, default=5000, help='Товаров в файле одного импорта')
+        parser.add_argument('--emails', type=int, default=20)
+        parser.add_argument('--interval', type=float, default=0.2, help='Пауза между письмами, секунды')
+        parser.add_argument('--concurrency', type=int, default=2, help='Всего потоков воркеров в каждом сценарии')
+        parser.add_argument('--timeout', type=float, default=600)
+        parser.add_argument('--output', default=None, help='Путь для JSON с результатами')
+
+    def handle(self, *args, **options):
+        from procurepro.celery import app as celery_app
+        from apps.core.benchmarks import get_benchmark_supplier, write_results
+
+        Product = apps.get_model('products', 'Product')
+        supplier = get_benchmark_supplier()
+        work_dir = tempfile.mkdtemp(prefix='procurepro_bench_')
+        results = {key: options[key] for key in ('imports', 'products', 'emails', 'interval', 'concurrency')}
+
+        try:
+            # Celery читает настройки из django.conf.settings при каждом обращении
+            with override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                CELERY_BROKER_URL='memory://',
+                CELERY_RESULT_BACKEND='cache+memory://',
+                CELERY_BROKER_TRANSPORT_OPTIONS={'polling_interval': 0.01},
+                CELERY_TASK_ALWAYS_EAGER=False,
+            ):
+                for name in ('shared', 'routed'):
+                    Product.objects.filter(supplier=supplier).delete()
+                    result = results[name] = self.run_scenario(
+                        celery_app, name, supplier, work_dir, options
+                    )
+                    self.stdout.write(
+                        f"{name}: ожидание в очереди p50 {result['queue_wait']['p50']} c, "
+                        f"p95 {result['queue_wait']['p95']} c; до отправки письма p50 {result['latency']['p50']} c, "
+                        f"p95 {result['latency']['p95']} c; импорты {result['import_seconds']} c"
+                    )
+        finally:
+            Product.objects.filter(supplier=supplier).delete()
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        if options['output']:
+            write_results(options['output'], 'task_queues', results)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+
+    def run_scenario(self, app, name, supplier, work_dir, options):
+        """
+        shared - все задачи в одной очереди default, как до разделения;
+        routed - импорт в bulk, письма в email, у каждой очереди свой воркер
+        """
+        from contextlib import ExitStack
+        from celery.contrib.testing.worker import start_worker
+        from celery.signals import task_prerun
+        from apps.core.benchmarks import write_synthetic_yaml
+        from apps.core.mail import enqueue_email
+        from apps.core.tasks import drain_email_outbox_task, import_products_task
+
+        ImportJob = apps.get_model('core', 'ImportJob')
+        OutgoingEmail = apps.get_model('core', 'OutgoingEmail')
+        concurrency = max(options['concurrency'], 2)
+
+        # (очереди, потоков, prefetch_multiplier) - как у воркеров в docker-compose.yml
+        if name == 'shared':
+            workers = [(['default'], concurrency, 1)]
+            bulk_queue = email_queue = 'default'
+        else:
+            workers = [(['bulk'], concurrency - 1, 1), (['email'], 1, 4)]
+            bulk_queue, email_queue = 'bulk', 'email'
+
+        # Ожидание в очереди - до начала выполнения задачи; остальное - работа письма,
+        # включая ожидание блокировки базы (SQLite пишет только в один поток)
+        task_started = {}
+
+        def on_prerun(task_id=None, **kwargs):
+            task_started[task_id] = time.perf_counter()
+
+        task_prerun.connect(on_prerun, weak=False)
+        with ExitStack() as stack:
+            stack.callback(task_prerun.disconnect, on_prerun)
+            for queues, threads, prefetch in workers:
+                stack.enter_context(start_worker(
+                    app, concurrency=threads, pool='threads', perform_ping_check=False,
+                    queues=queues, prefetch_multiplier=prefetch
+                ))
+
+            started = time.perf_counter()
+            imports = []
+            for index in range(options['imports']):
+                file_path = write_synthetic_yaml(
+                    os.path.join(work_dir, f'{name}_{index}.yaml'), options['products'], 20,
+                    sku_prefix=f'QUEUE{index}'
+                )
+                job = ImportJob.objects.create(user=supplier.user, supplier=supplier, file_path=file_path)
+                imports.append(import_products_task.apply_async(kwargs={'job_id': job.id}, queue=bulk_queue))
+
+            # Письма ставятся через равные промежутки; задержка - от постановки задачи до готового результата
+            probes = {}
+            queue_waits = []
+            latencies = []
+            sent = 0
+            next_send = time.perf_counter()
+            deadline = time.monotonic() + options['timeout']
+            while (sent < options['emails'] or probes) and time.monotonic() < deadline:
+                if sent < options['emails'] and time.perf_counter() >= next_send:
+                    enqueue_email(f'Заказ {sent}', 'Текст письма', [f'user{sent}@example.com'],
+                                  kind='benchmark', schedule=False)
+                    probes[drain_email_outbox_task.apply_async(queue=email_queue)] = time.perf_counter()
+                    sent += 1
+                    next_send += options['interval']
+                for probe, sent_at in list(probes.items()):
+                    if probe.ready():
+                        latencies.append(time.perf_counter() - sent_at)
+                        queue_waits.append(task_started.get(probe.id, sent_at) - sent_at)
+                        del probes[probe]
+                time.sleep(0.005)
+
+            for result in imports:
+                result.get(timeout=max(deadline - time.monotonic(), 1), propagate=False)
+            import_seconds = time.perf_counter() - started
+
+        OutgoingEmail.objects.filter(kind='benchmark').delete()
+        return {
+            'queue_wait': self.summary(queue_waits),
+            'latency': self.summary(latencies),
+            'timed_out': len(probes),
+            'import_seconds': round(import_seconds, 3),
+        }
+
+    def summary(self, values):
+        values = sorted(round(value, 4) for value in values)
+        if not values:
+            return {'p50': None, 'p95': None, 'max': None, 'values': []}
+        return {
+            'p50': values[len(values) // 2],
+            'p95': values[min(int(len(values) * 0.95), len(values) - 1)],
+            'max': values[-1],
+            'values': values,
+        }
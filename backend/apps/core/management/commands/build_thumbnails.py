@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.apps import apps
+
+
+class Command(BaseCommand):
+    help = 'Миниатюры для изображений товаров и категорий, у которых их еще нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Процессов обработки (по умолчанию IMAGE_WORKERS)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        from apps.core.images import ImagePipeline
+
+        with ImagePipeline(workers=options['workers']) as pipeline:
+            for label in ('products.Product', 'products.ProductImage', 'products.Category'):
+                Model = apps.get_model(label)
+                queryset = Model.objects.exclude(image='').exclude(image__isnull=True).filter(
+                    image_asset__isnull=True
+                ).order_by('pk')
+
+                processed = 0
+                last_pk = 0
+                while True:
+                    batch = list(queryset.filter(pk__gt=last_pk)[:options['batch_size']])
+                    if not batch:
+                        break
+                    last_pk = batch[-1].pk
+                    processed += pipeline.attach_uploaded(batch)
+                self.stdout.write(f'{label}: обработано {processed}')
+
+        stats = pipeline.stats
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: новых файлов {stats['created']}, повторов {stats['reused']}, ошибок {stats['errors']}"
+        ))
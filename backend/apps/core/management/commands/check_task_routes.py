@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверка маршрутизации задач Celery: каждая задача приложений отправляется '
+        'в брокер в памяти и должна попасть в очередь из CELERY_TASK_ROUTES'
+    )
+
+    def handle(self, *args, **options):
+        from celery import Celery
+        from django.conf import settings
+        from procurepro.celery import app as celery_app
+
+        # Отдельное приложение с брокером и результатами в памяти, без настроек Django:
+        # config_from_object ленивый и вернул бы рабочий брокер поверх memory://
+        app = Celery('procurepro-routes', broker='memory://', backend='cache+memory://')
+        app.conf.update(
+            task_queues=settings.CELERY_TASK_QUEUES,
+            task_routes=settings.CELERY_TASK_ROUTES,
+            task_default_queue=settings.CELERY_TASK_DEFAULT_QUEUE,
+        )
+
+        celery_app.loader.import_default_modules()
+        task_names = sorted(name for name in celery_app.tasks if name.startswith('apps.'))
+        declared = {queue.name for queue in settings.CELERY_TASK_QUEUES}
+        routes = settings.CELERY_TASK_ROUTES
+
+        problems = []
+        for name in routes:
+            if name not in celery_app.tasks:
+                problems.append(f"{name}: маршрут для несуществующей задачи")
+
+        with app.connection_for_write() as connection:
+            # Очереди очищаются ниже: с настоящим брокером это удалило бы рабочие задачи
+            if not connection.as_uri().startswith('memory://'):
+                raise CommandError(f"Проверка должна идти через брокер в памяти, а не {connection.as_uri()}")
+            channel = connection.default_channel
+            for queue in declared:
+                channel.queue_declare(queue=queue)
+                channel.queue_purge(queue)
+
+            producer = app.amqp.Producer(connection)
+            for name in task_names:
+                expected = routes.get(name, {}).get('queue')
+                if expected is None:
+                    problems.append(f"{name}: нет маршрута, задача попадет в очередь по умолчанию")
+                    expected = settings.CELERY_TASK_DEFAULT_QUEUE
+                elif expected not in declared:
+                    problems.append(f"{name}: очередь {expected} не объявлена в CELERY_TASK_QUEUES")
+
+                app.send_task(name, producer=producer)
+                received = [
+                    queue for queue in sorted(declared)
+                    if channel.queue_declare(queue=queue, passive=True).message_count
+                ]
+                for queue in received:
+                    channel.queue_purge(queue)
+
+                if received != [expected]:
+                    problems.append(f"{name}: ожидалась очередь {expected}, получено {received or 'ничего'}")
+                self.stdout.write(f"{name} -> {', '.join(received) or '-'}")
+
+        if problems:
+            raise CommandError('Ошибки маршрутизации:\n' + '\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS(f"Маршруты проверены: задач {len(task_names)}"))
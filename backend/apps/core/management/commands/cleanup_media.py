@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Очистка временных файлов, импортов и выгрузок по правилам MEDIA_RETENTION_POLICIES'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только подсчитать, ничего не удалять')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Файлов в одной пачке удаления')
+
+    def handle(self, *args, **options):
+        from apps.core.retention import RetentionSweeper
+
+        result = RetentionSweeper(batch_size=options['batch_size'], dry_run=options['dry_run']).sweep()
+        for name, stats in result.items():
+            line = (
+                f"{name}: просмотрено {stats['scanned']}, удалено {stats['deleted']} "
+                f"({stats['deleted_bytes'] / 1024 / 1024:.1f} МБ), оставлено {stats['kept']}, "
+                f"защищено {stats['protected']}, ошибок {stats['errors']}"
+            )
+            self.stdout.write(self.style.SUCCESS(line) if name == 'total' else line)
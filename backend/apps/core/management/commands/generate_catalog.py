@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Генерация детерминированного синтетического каталога (поставщики, товары, корзины, заказы)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suppliers', type=int, default=10)
+        parser.add_argument('--categories', type=int, default=100)
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--characteristics', type=int, default=5, help='Характеристик на товар')
+        parser.add_argument('--customers', type=int, default=100)
+        parser.add_argument('--carts', type=int, default=50, help='Сколько покупателей получат заполненную корзину')
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help='Удалить ранее сгенерированные данные')
+
+    def handle(self, *args, **options):
+        from apps.core.benchmarks import GENERATED_PASSWORD, clear_generated_catalog, generate_catalog
+
+        if options['clear']:
+            clear_generated_catalog()
+            self.stdout.write('Сгенерированные данные удалены')
+
+        result = generate_catalog(
+            suppliers=options['suppliers'],
+            categories=options['categories'],
+            products=options['products'],
+            characteristics=options['characteristics'],
+            customers=options['customers'],
+            carts=options['carts'],
+            orders=options['orders'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+
+        timings = ', '.join(f'{name} {seconds:.1f}с' for name, seconds in result['timings'].items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: поставщиков {result['suppliers']}, категорий {result['categories']}, "
+            f"товаров {result['products']}, покупателей {result['customers']}, заказов {result['orders']} ({timings})"
+        ))
+        self.stdout.write(f'Пароль сгенерированных пользователей: {GENERATED_PASSWORD}')
@@ -0,0 +1,37 @@
+import time
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Локальный SMTP-сервер, который принимает письма и никуда их не отправляет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+        parser.add_argument('--print', action='store_true', help='Выводить тему и получателей писем')
+
+    def handle(self, *args, **options):
+        from apps.core.smtp_sink import SMTPSink
+
+        sink = SMTPSink(options['host'], options['port']).start()
+        self.stdout.write(self.style.SUCCESS(
+            f"SMTP sink слушает {options['host']}:{sink.port}. Настройки: "
+            f"EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend EMAIL_HOST={options['host']} "
+            f"EMAIL_PORT={sink.port} EMAIL_USE_TLS=False"
+        ))
+
+        shown = 0
+        try:
+            while True:
+                time.sleep(1)
+                if options['print']:
+                    messages = sink.parsed_messages()
+                    for message in messages[max(0, len(messages) - (sink.stats['messages'] - shown)):]:
+                        self.stdout.write(f"{message['To']}: {message['Subject']}")
+                    shown = sink.stats['messages']
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sink.stop()
+            stats = sink.stats
+            self.stdout.write(f"Соединений: {stats['connections']}, писем: {stats['messages']}, байт: {stats['bytes']}")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Создает записи EmailTemplate из шаблонов по умолчанию, чтобы их можно было править в админке'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--overwrite', action='store_true', help='Перезаписать тему и текст существующих шаблонов')
+
+    def handle(self, *args, **options):
+        from apps.core.email_templates import DEFAULT_TEMPLATES
+        from apps.core.models import EmailTemplate
+
+        names = dict(EmailTemplate.TEMPLATE_TYPES)
+        for template_type, (subject, body) in DEFAULT_TEMPLATES.items():
+            template, created = EmailTemplate.objects.get_or_create(
+                template_type=template_type,
+                defaults={'name': names.get(template_type, template_type), 'subject': subject, 'body': body}
+            )
+            if not created and options['overwrite']:
+                template.subject = subject
+                template.body = body
+                template.save()
+            self.stdout.write(f"{template_type}: {'создан' if created else 'уже есть'}")
@@ -0,0 +1,276 @@
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from django.conf import settings
+
+
+# Положение значений в списке метрик одного ключа (view, method, status);
+# за ними идут счетчики по корзинам гистограммы (не накопительные)
+COUNT, DURATION, DB_QUERIES, DB_SECONDS, RENDER_SECONDS = range(5)
+FIXED_FIELDS = 5
+FILE_PREFIX = 'metrics_'
+# Счетчики завершившихся процессов, перенесенные из их файлов
+AGGREGATE_FILE = 'aggregate.json'
+LOCK_FILE = '.compact.lock'
+# Каталог метрик может быть общим для нескольких контейнеров: pid проверяются только у файлов своего хоста
+HOSTNAME = socket.gethostname()
+
+
+class MetricsRegistry:
+    """
+    Счетчики запросов в процессе: количество, гистограмма времени ответа,
+    число и время SQL-запросов, время рендеринга ответа DRF.
+
+    Обновление - одна короткая блокировка на запрос. Фоновый поток раз в
+    flush_interval секунд сохраняет снимок в собственный файл процесса
+    в METRICS['dir']; /metrics суммирует файлы всех процессов, а файлы
+    завершившихся процессов сворачивает в общий (см. compact).
+    """
+
+    def __init__(self, buckets, directory, flush_interval):
+        self.buckets = tuple(buckets)
+        self.directory = str(directory)
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.values = {}
+        self.pid = None
+        self.file_path = None
+        self.thread = None
+
+    def observe(self, view, method, status, duration, db_queries=0, db_seconds=0.0, render_seconds=0.0):
+        if self.pid != os.getpid():
+            self.reset_for_process()
+        key = (view, method, status)
+        bucket = bisect_left(self.buckets, duration)
+        with self.lock:
+            values = self.values.get(key)
+            if values is None:
+                values = self.values[key] = [0] * (FIXED_FIELDS + len(self.buckets))
+            values[COUNT] += 1
+            values[DURATION] += duration
+            values[DB_QUERIES] += db_queries
+            values[DB_SECONDS] += db_seconds
+            values[RENDER_SECONDS] += render_seconds
+            # Значение больше последней границы попадает только в +Inf (= count)
+            if bucket < len(self.buckets):
+                values[FIXED_FIELDS + bucket] += 1
+
+    def reset_for_process(self):
+        # После fork значения родителя уже учтены в его файле: дочерний процесс начинает с нуля
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.values = {}
+            self.pid = os.getpid()
+            # Файл с уникальным суффиксом: новый процесс с тем же pid не перезапишет чужие счетчики
+            self.file_path = os.path.join(
+                self.directory, f'{FILE_PREFIX}{HOSTNAME}_{self.pid}_{uuid.uuid4().hex[:8]}.json'
+            )
+            self.thread = threading.Thread(target=self.run, name='metrics-writer', daemon=True)
+            self.thread.start()
+
+    def snapshot(self):
+        with self.lock:
+            return {'\t'.join(key): list(values) for key, values in self.values.items()}
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.dump()
+            except OSError:
+                pass
+
+    def dump(self):
+        """Атомарно перезаписывает файл процесса текущими значениями"""
+        if self.file_path is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        write_values(self.file_path, self.buckets, self.snapshot())
+
+
+def write_values(path, buckets, values):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump({'buckets': list(buckets), 'values': values}, file)
+    os.replace(tmp_path, path)
+
+
+def read_values(path, buckets):
+    """Значения из файла метрик или None (файла нет, он поврежден или с другими границами)"""
+    try:
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return None
+    # Файлы с другими границами (до смены настроек) несовместимы
+    if data.get('buckets') != list(buckets):
+        return None
+    return data['values']
+
+
+def merge_values(total, values):
+    for key, items in values.items():
+        current = total.get(key)
+        if current is None:
+            total[key] = list(items)
+        else:
+            for index, value in enumerate(items):
+                current[index] += value
+    return total
+
+
+def file_owner(name):
+    """(хост, pid) из имени файла процесса или None"""
+    try:
+        host, pid, suffix = name[len(FILE_PREFIX):-len('.json')].rsplit('_', 2)
+        return host, int(pid)
+    except ValueError:
+        return None
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def process_files(directory):
+    try:
+        return [name for name in os.listdir(directory) if name.startswith(FILE_PREFIX) and name.endswith('.json')]
+    except FileNotFoundError:
+        return []
+
+
+def compact(directory, buckets):
+    """
+    Переносит счетчики завершившихся процессов этого хоста в AGGREGATE_FILE
+    и удаляет их файлы: после перезапусков воркеров каталог не растет.
+    """
+    dead = []
+    for name in process_files(directory):
+        owner = file_owner(name)
+        if owner is not None and owner[0] == HOSTNAME and owner[1] != os.getpid() and not pid_alive(owner[1]):
+            dead.append(name)
+    if not dead:
+        return 0
+
+    # Блокировка: два одновременных запроса /metrics не перенесут один файл дважды
+    with open(os.path.join(directory, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        aggregate_path = os.path.join(directory, AGGREGATE_FILE)
+        aggregate = read_values(aggregate_path, buckets) or {}
+        folded = []
+        for name in dead:
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                continue
+            values = read_values(path, buckets)
+            if values:
+                merge_values(aggregate, values)
+            folded.append(path)
+        write_values(aggregate_path, buckets, aggregate)
+        for path in folded:
+            os.remove(path)
+            if os.path.exists(f'{path}.tmp'):
+                os.remove(f'{path}.tmp')
+    return len(folded)
+
+
+def collect(directory, buckets):
+    """Сумма снимков всех процессов: {(view, method, status): значения}"""
+    if not os.path.isdir(directory):
+        return {}
+    compact(directory, buckets)
+    with open(os.path.join(directory, LOCK_FILE), 'a') as lock:
+        # Разделяемая блокировка: файл не будет перенесен в общий между двумя чтениями
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        total = read_values(os.path.join(directory, AGGREGATE_FILE), buckets) or {}
+        for name in process_files(directory):
+            merge_values(total, read_values(os.path.join(directory, name), buckets) or {})
+    return {tuple(key.split('\t')): values for key, values in total.items()}
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def render_prometheus(values, buckets):
+    """Текстовый формат Prometheus 0.0.4"""
+    lines = []
+
+    def family(name, metric_type, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+
+    def labels(key, extra=''):
+        view, method, status = key
+        text = f'view="{escape_label(view)}",method="{escape_label(method)}",status="{escape_label(status)}"'
+        return '{' + text + extra + '}'
+
+    keys = sorted(values)
+
+    family('procurepro_http_requests_total', 'counter', 'HTTP requests by view, method and status class')
+    for key in keys:
+        lines.append(f'procurepro_http_requests_total{labels(key)} {values[key][COUNT]}')
+
+    family('procurepro_http_request_duration_seconds', 'histogram', 'HTTP request latency')
+    for key in keys:
+        cumulative = 0
+        for index, bound in enumerate(buckets):
+            cumulative += values[key][FIXED_FIELDS + index]
+            bucket_labels = labels(key, ',le="%s"' % bound)
+            lines.append(f'procurepro_http_request_duration_seconds_bucket{bucket_labels} {cumulative}')
+        bucket_labels = labels(key, ',le="+Inf"')
+        lines.append(f'procurepro_http_request_duration_seconds_bucket{bucket_labels} {values[key][COUNT]}')
+        lines.append(f'procurepro_http_request_duration_seconds_sum{labels(key)} {format_number(values[key][DURATION])}')
+        lines.append(f'procurepro_http_request_duration_seconds_count{labels(key)} {values[key][COUNT]}')
+
+    for name, index, help_text in (
+        ('procurepro_db_queries_total', DB_QUERIES, 'SQL queries executed while handling requests'),
+        ('procurepro_db_query_duration_seconds_total', DB_SECONDS, 'Time spent in SQL queries'),
+        ('procurepro_render_duration_seconds_total', RENDER_SECONDS, 'Time spent rendering DRF responses'),
+    ):
+        family(name, 'counter', help_text)
+        for key in keys:
+            lines.append(f'{name}{labels(key)} {format_number(values[key][index])}')
+
+    return '\n'.join(lines) + '\n'
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                config = settings.METRICS
+                _registry = MetricsRegistry(config['buckets'], config['dir'], config['flush_interval'])
+    return _registry
+
+
+def export_metrics():
+    """Свежий снимок своего процесса и сумма по всем процессам в формате Prometheus"""
+    config = settings.METRICS
+    registry = get_registry()
+    if registry.pid == os.getpid():
+        registry.dump()
+    return render_prometheus(collect(config['dir'], config['buckets']), config['buckets'])
@@ -0,0 +1,88 @@
+import logging
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class APIRequestLogMiddleware:
+    """
+    Журнал запросов в APIRequestLog: запись попадает в буфер процесса и
+    сохраняется фоновым потоком пачкой (apps.core.request_log), запрос
+    не выполняет INSERT. Доля логируемых запросов - API_REQUEST_LOG['sample_rates'].
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from apps.core.request_log import log_request, read_request_body, should_sample
+
+        config = settings.API_REQUEST_LOG
+        if not config['enabled']:
+            return self.get_response(request)
+
+        sampled = should_sample(request.path, config)
+        request_body = read_request_body(request, config) if sampled and config['log_bodies'] else None
+
+        started = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        if sampled or (config['always_log_errors'] and response.status_code >= 500):
+            try:
+                log_request(request, response, duration, request_body)
+            except Exception as e:
+                logger.warning("Ошибка журнала API запросов: %s", e, extra={'request': request})
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Метрики по представлениям (apps.core.metrics): количество и время запросов,
+    число и время SQL-запросов, время рендеринга ответа DRF.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from django.db import connection
+        from apps.core.metrics import get_registry
+
+        if not settings.METRICS['enabled'] or request.path in settings.METRICS['exclude_paths']:
+            return self.get_response(request)
+
+        # [число запросов, секунды]: обертка вызывается на каждый SQL-запрос соединения default
+        db = [0, 0.0]
+
+        def count_queries(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db[0] += 1
+                db[1] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = (match.view_name or match.route) if match is not None else 'unmatched'
+        get_registry().observe(
+            view, request.method, f'{response.status_code // 100}xx', duration,
+            db[0], db[1], getattr(request, '_metrics_render_seconds', 0.0)
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся после возврата из представления: время до post-render callback
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._metrics_render_seconds = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 
 
@@ -30,6 +31,9 @@ class ImportJob(models.Model):
     ]
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='import_jobs')
+    supplier = models.ForeignKey(
+        'suppliers.Supplier', on_delete=models.SET_NULL, null=True, blank=True, related_name='import_jobs'
+    )
     file_path = models.CharField(max_length=500)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     task_id = models.CharField(max_length=100, blank=True, null=True)
@@ -38,8 +42,16 @@ class ImportJob(models.Model):
     total_processed = models.IntegerField(default=0)
     created_count = models.IntegerField(default=0)
     updated_count = models.IntegerField(default=0)
+    unchanged_count = models.IntegerField(default=0)
     error_count = models.IntegerField(default=0)
 
+    # Контрольная точка: сколько товаров файла уже обработано и зафиксировано
+    checkpoint_offset = models.IntegerField(default=0)
+
+    # Только проверка файла, без записи товаров
+    dry_run = models.BooleanField(default=False)
+    validation_report = models.JSONField(null=True, blank=True)
+
     # Ошибки
     error_message = models.TextField(blank=True)
     error_traceback = models.TextField(blank=True)
@@ -48,6 +60,7 @@ class ImportJob(models.Model):
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         app_label = 'core'
@@ -59,6 +72,23 @@ class ImportJob(models.Model):
         return f"Import #{self.id} - {self.status}"
 
 
+class ImportShard(models.Model):
+    """Шард параллельного импорта: сколько пачек уже записано (повторная доставка задачи их пропускает)"""
+    job = models.ForeignKey(ImportJob, on_delete=models.CASCADE, related_name='shards')
+    name = models.CharField(max_length=100)
+    chunks_done = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'core'
+        verbose_name = 'Import Shard'
+        verbose_name_plural = 'Import Shards'
+        unique_together = ('job', 'name')
+
+    def __str__(self):
+        return f"Import #{self.job_id} {self.name}: {self.chunks_done}"
+
+
 class ExportJob(models.Model):
     """Задача экспорта товаров"""
     STATUS_CHOICES = [
@@ -69,13 +99,39 @@ class ExportJob(models.Model):
         ('cancelled', 'Cancelled'),
     ]
 
+    FORMAT_CHOICES = [
+        ('yaml', 'YAML'),
+        ('jsonl', 'JSON Lines'),
+        ('csv', 'CSV (wide characteristics)'),
+        ('csv_long', 'CSV (long characteristics)'),
+    ]
+
+    COMPRESSION_CHOICES = [
+        ('none', 'None'),
+        ('gzip', 'gzip'),
+        ('zstd', 'Zstandard'),
+    ]
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='export_jobs')
+    supplier = models.ForeignKey(
+        'suppliers.Supplier', on_delete=models.SET_NULL, null=True, blank=True, related_name='export_jobs'
+    )
     file_path = models.CharField(max_length=500)
+    file_format = models.CharField(max_length=20, choices=FORMAT_CHOICES, default='yaml')
+    compression = models.CharField(max_length=10, choices=COMPRESSION_CHOICES, default='none')
+
+    # Инкрементальный экспорт: изменения в интервале (since, watermark]
+    since = models.DateTimeField(null=True, blank=True, help_text="Export only changes after this moment")
+    watermark = models.DateTimeField(null=True, blank=True, help_text="Upper bound of exported changes")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     task_id = models.CharField(max_length=100, blank=True, null=True)
 
     # Статистика
     total_exported = models.IntegerField(default=0)
+    tombstone_count = models.IntegerField(default=0)
+    timings = models.JSONField(default=dict, blank=True, help_text="Phase durations in seconds")
+    file_size = models.BigIntegerField(null=True, blank=True, help_text="Stored (compressed) size in bytes")
+    checksum = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the stored file")
 
     # Ошибки
     error_message = models.TextField(blank=True)
@@ -96,6 +152,51 @@ class ExportJob(models.Model):
         return f"Export #{self.id} - {self.status}"
 
 
+class TaskStatus(models.Model):
+    """Статус, прогресс и результат фоновой задачи (опрос без обращения к брокеру Celery)"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('success', 'Success'),
+        ('failed', 'Failed'),
+    ]
+
+    task_id = models.CharField(max_length=255, unique=True)
+    name = models.CharField(max_length=255)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='task_statuses'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+
+    # Прогресс: total может быть неизвестен (потоковый импорт)
+    progress_current = models.BigIntegerField(default=0)
+    progress_total = models.BigIntegerField(null=True, blank=True)
+    message = models.CharField(max_length=500, blank=True)
+
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'core'
+        verbose_name = 'Task Status'
+        verbose_name_plural = 'Task Statuses'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.name} [{self.task_id}] - {self.status}"
+
+    @property
+    def progress_percent(self):
+        if not self.progress_total:
+            return None
+        return min(100, round(self.progress_current * 100 / self.progress_total, 1))
+
+
 class EmailTemplate(models.Model):
     """Шаблоны email сообщений"""
     TEMPLATE_TYPES = [
@@ -104,6 +205,8 @@ class EmailTemplate(models.Model):
         ('welcome', 'Welcome Email'),
         ('password_reset', 'Password Reset'),
         ('admin_notification', 'Admin Notification'),
+        ('notification', 'User Notification'),
+        ('daily_sales_report', 'Daily Sales Report'),
     ]
 
     name = models.CharField(max_length=100)
@@ -123,6 +226,41 @@ class EmailTemplate(models.Model):
         return f"{self.name} ({self.template_type})"
 
 
+class OutgoingEmail(models.Model):
+    """Исходящее письмо в очереди: задачи кладут, диспетчер отправляет пачками"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Для sending - время захвата пачки, чтобы вернуть в очередь письма упавшего воркера
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'core'
+        verbose_name = 'Outgoing Email'
+        verbose_name_plural = 'Outgoing Emails'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+
 class SystemLog(models.Model):
     """Логи системы"""
     LEVEL_CHOICES = [
@@ -198,6 +336,8 @@ class BackupSchedule(models.Model):
     scheduled_time = models.TimeField(default='02:00')
     last_run = models.DateTimeField(null=True, blank=True)
     next_run = models.DateTimeField(null=True, blank=True)
+    # Блокировка на время выполнения: один и тот же график не запускается параллельно
+    locked_until = models.DateTimeField(null=True, blank=True)
 
     # Уведомления
     notify_on_success = models.BooleanField(default=False)
@@ -211,26 +351,43 @@ class BackupSchedule(models.Model):
         app_label = 'core'
         verbose_name = 'Backup Schedule'
         verbose_name_plural = 'Backup Schedules'
+        indexes = [
+            # Выбор графиков, подошедших к запуску
+            models.Index(fields=['is_active', 'next_run']),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.backup_type})"
 
+    def save(self, *args, **kwargs):
+        if self.is_active and self.next_run is None:
+            from apps.core.backups import compute_next_run
+            self.next_run = compute_next_run(self)
+        super().save(*args, **kwargs)
+
 
 class BackupRecord(models.Model):
     """Запись о резервной копии"""
     STATUS_CHOICES = [
+        ('pending', 'Pending'),
         ('running', 'Running'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
     ]
 
-    schedule = models.ForeignKey(BackupSchedule, on_delete=models.CASCADE, related_name='backups')
+    # Без расписания - разовая копия (задача generate_backup_task)
+    schedule = models.ForeignKey(
+        BackupSchedule, on_delete=models.CASCADE, null=True, blank=True, related_name='backups'
+    )
+    backup_type = models.CharField(max_length=20, choices=BackupSchedule.BACKUP_TYPES, default='database')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
     file_path = models.CharField(max_length=500, blank=True)
     file_size = models.BigIntegerField(null=True, blank=True, help_text="File size in bytes")
 
     # Статистика
     duration = models.DurationField(null=True, blank=True)
+    # Файлы копии и подробности: шаги снимка базы, измененные файлы медиа
+    details = models.JSONField(default=dict, blank=True)
 
     # Ошибки
     error_message = models.TextField(blank=True)
@@ -0,0 +1,132 @@
+import logging
+from django.apps import apps
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# Пользователей на одну задачу рассылки (один bulk_create)
+NOTIFICATION_CHUNK_SIZE = 2000
+BULK_CREATE_BATCH_SIZE = 500
+UNREAD_CACHE_KEY = 'notifications:unread:{}'
+# Счетчик в кеше живет недолго: гонку записи и сброса исправляет следующий запрос к БД
+UNREAD_CACHE_TIMEOUT = 5 * 60
+
+SEGMENTS = {
+    'all': 'Все активные пользователи',
+    'admins': 'Администраторы',
+    'clients': 'Клиенты',
+    'suppliers': 'Поставщики',
+    'supplier_clients': 'Клиенты, заказывавшие товары поставщика',
+}
+
+
+def segment_users(segment, supplier_id=None):
+    """QuerySet активных пользователей сегмента"""
+    User = apps.get_model('users', 'User')
+    Order = apps.get_model('orders', 'Order')
+
+    users = User.objects.filter(is_active=True)
+    if segment == 'all':
+        return users
+    if segment == 'admins':
+        return users.filter(Q(is_staff=True) | Q(user_type='admin'))
+    if segment == 'clients':
+        return users.filter(user_type='client')
+    if segment == 'suppliers':
+        return users.filter(user_type='supplier')
+    if segment == 'supplier_clients':
+        if supplier_id is None:
+            raise ValueError("Для сегмента supplier_clients нужен supplier_id")
+        # Подзапрос вместо JOIN по позициям заказов: без DISTINCT и повторов
+        return users.filter(id__in=Order.objects.filter(items__product__supplier_id=supplier_id).values('user_id'))
+    raise ValueError(f"Неизвестный сегмент {segment!r}")
+
+
+def segment_chunks(segment, supplier_id=None, chunk_size=NOTIFICATION_CHUNK_SIZE):
+    """
+    Границы пачек [start_id, end_id] по первичному ключу: задачи получают
+    только диапазон и сами выбирают пользователей, список id не передается
+    """
+    ids = segment_users(segment, supplier_id).order_by('id').values_list('id', flat=True)
+    chunks = []
+    start = None
+    previous = None
+    for index, user_id in enumerate(ids.iterator(chunk_size=chunk_size)):
+        if index % chunk_size == 0:
+            if start is not None:
+                chunks.append((start, previous))
+            start = user_id
+        previous = user_id
+    if start is not None:
+        chunks.append((start, previous))
+    return chunks
+
+
+def create_notifications(user_ids, title, message, type='info', object_id=None, object_type=''):
+    """Уведомление каждому пользователю из списка: один bulk_create и сброс счетчиков"""
+    Notification = apps.get_model('core', 'Notification')
+
+    user_ids = list(user_ids)
+    Notification.objects.bulk_create([
+        Notification(
+            user_id=user_id, type=type, title=title, message=message,
+            object_id=object_id, object_type=object_type or ''
+        )
+        for user_id in user_ids
+    ], batch_size=BULK_CREATE_BATCH_SIZE)
+    invalidate_unread_counts(user_ids)
+    return len(user_ids)
+
+
+def notify_range(segment, start_id, end_id, supplier_id=None, **payload):
+    """Уведомления пользователям сегмента с id в [start_id, end_id]"""
+    user_ids = segment_users(segment, supplier_id).filter(
+        id__gte=start_id, id__lte=end_id
+    ).values_list('id', flat=True)
+    return create_notifications(user_ids, **payload)
+
+
+def notify_user(user_id, title, message, type='info', object_id=None, object_type=''):
+    return create_notifications([user_id], title, message, type, object_id, object_type)
+
+
+def unread_count(user_id):
+    """Непрочитанные уведомления: из кеша, при промахе или недоступном кеше - COUNT по индексу"""
+    Notification = apps.get_model('core', 'Notification')
+
+    key = UNREAD_CACHE_KEY.format(user_id)
+    try:
+        count = cache.get(key)
+    except Exception as e:
+        logger.warning("Кеш счетчика уведомлений недоступен: %s", e)
+        return Notification.objects.filter(user_id=user_id, is_read=False).count()
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        try:
+            cache.set(key, count, UNREAD_CACHE_TIMEOUT)
+        except Exception as e:
+            logger.warning("Кеш счетчика уведомлений недоступен: %s", e)
+    return count
+
+
+def invalidate_unread_counts(user_ids):
+    try:
+        cache.delete_many([UNREAD_CACHE_KEY.format(user_id) for user_id in user_ids])
+    except Exception as e:
+        logger.warning("Кеш счетчика уведомлений недоступен: %s", e)
+
+
+def mark_read(user_id, notification_ids=None):
+    """Отмечает прочитанными указанные (или все) уведомления пользователя одним UPDATE"""
+    Notification = apps.get_model('core', 'Notification')
+
+    notifications = Notification.objects.filter(user_id=user_id, is_read=False)
+    if notification_ids is not None:
+        notifications = notifications.filter(id__in=notification_ids)
+    updated = notifications.update(is_read=True, read_at=timezone.now())
+    if updated:
+        invalidate_unread_counts([user_id])
+    return updated
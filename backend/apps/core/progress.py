@@ -0,0 +1,85 @@
+import time
+from django.apps import apps
+from django.utils import timezone
+
+from apps.core.import_export import ImportCancelled
+from apps.core.tracking import PROGRESS_INTERVAL, ProgressReporter
+
+
+class ImportJobProgress:
+    """
+    Запись прогресса и контрольной точки задачи импорта не чаще раза в interval
+    секунд. Интервал отсчитывает ProgressReporter задачи: в тот же момент
+    обновляется и прогресс в TaskStatus.
+    """
+
+    STATS_FIELDS = {
+        'processed': 'total_processed',
+        'created': 'created_count',
+        'updated': 'updated_count',
+        'unchanged': 'unchanged_count',
+        'errors': 'error_count',
+    }
+
+    def __init__(self, job, task_id=None, interval=PROGRESS_INTERVAL):
+        self.job = job
+        self.reporter = ProgressReporter(task_id, interval=interval)
+        # Первая запись - через interval после старта
+        self.reporter.last_write = time.monotonic()
+        # Последняя зафиксированная пачка: смещение и счетчики на тот момент
+        self.offset = job.checkpoint_offset
+        self.snapshot = {}
+
+    def restore(self, stats):
+        """Восстанавливает счетчики из задачи при возобновлении с контрольной точки"""
+        for key, field in self.STATS_FIELDS.items():
+            stats[key] = getattr(self.job, field) if self.job.checkpoint_offset else 0
+        return stats
+
+    def counters(self, stats):
+        return {field: stats.get(key, 0) for key, field in self.STATS_FIELDS.items()}
+
+    def update(self, offset, stats, force=False):
+        """
+        Обновляет счетчики и контрольную точку одним UPDATE.
+        Условие status='running' заодно проверяет, не отменена ли задача.
+        """
+        self.offset = offset
+        self.snapshot = dict(stats)
+
+        if not self.reporter.due(force):
+            return
+
+        ImportJob = apps.get_model('core', 'ImportJob')
+        updated = ImportJob.objects.filter(pk=self.job.pk, status='running').update(
+            checkpoint_offset=offset,
+            updated_at=timezone.now(),
+            **self.counters(stats)
+        )
+        if not updated:
+            raise ImportCancelled(f"Импорт #{self.job.pk} отменен")
+        self.reporter.write(offset, message=f"Обработано товаров: {offset}")
+
+    def finish(self, status, stats=None, error_message='', error_traceback=''):
+        """
+        Финальная запись статуса. Без stats (ошибка, отмена) сохраняются
+        счетчики последней зафиксированной пачки, чтобы при возобновлении
+        они совпадали с контрольной точкой.
+        """
+        ImportJob = apps.get_model('core', 'ImportJob')
+        if stats is not None:
+            fields = self.counters(stats)
+            fields['checkpoint_offset'] = stats.get('processed', self.offset)
+        elif self.snapshot:
+            fields = self.counters(self.snapshot)
+            fields['checkpoint_offset'] = self.offset
+        else:
+            fields = {}
+        ImportJob.objects.filter(pk=self.job.pk).update(
+            status=status,
+            error_message=error_message,
+            error_traceback=error_traceback,
+            completed_at=timezone.now() if status == 'completed' else None,
+            updated_at=timezone.now(),
+            **fields
+        )
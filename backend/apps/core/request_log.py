@@ -0,0 +1,196 @@
+import atexit
+import json
+import logging
+import os
+import random
+import threading
+from collections import deque
+from django.apps import apps
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Ключи тела запроса и ответа, значения которых не попадают в лог
+SENSITIVE_KEYS = ('password', 'token', 'secret', 'api_key', 'authorization')
+MASK = '***'
+
+
+def get_config():
+    return settings.API_REQUEST_LOG
+
+
+def sample_rate(path, config=None):
+    """Доля логируемых запросов: правило с самым длинным подходящим префиксом"""
+    config = config or get_config()
+    best = None
+    for prefix, rate in config['sample_rates'].items():
+        if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return config['sample_rates'][best] if best is not None else config['default_sample_rate']
+
+
+def should_sample(path, config=None):
+    rate = sample_rate(path, config)
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def mask_sensitive(value):
+    if isinstance(value, dict):
+        return {
+            key: MASK if any(word in str(key).lower() for word in SENSITIVE_KEYS) else mask_sensitive(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [mask_sensitive(item) for item in value]
+    return value
+
+
+def truncate_body(raw, content_type, max_length):
+    """Тело JSON или текста для лога: секреты скрыты, длина ограничена"""
+    if not raw:
+        return ''
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8', errors='replace')
+    if 'json' in content_type:
+        try:
+            raw = json.dumps(mask_sensitive(json.loads(raw)), ensure_ascii=False)
+        except ValueError:
+            pass
+    elif 'x-www-form-urlencoded' in content_type and any(word in raw.lower() for word in SENSITIVE_KEYS):
+        return MASK
+    return raw[:max_length]
+
+
+class RequestLogBuffer:
+    """
+    Ограниченный буфер записей APIRequestLog в процессе.
+
+    Запрос только добавляет словарь в deque; фоновый поток пишет накопленное
+    одним bulk_create, когда набралось flush_size записей или прошло
+    flush_interval секунд. Если база не успевает и буфер полон, новые записи
+    отбрасываются (счетчик dropped), запрос никогда не ждет записи в базу.
+    """
+
+    def __init__(self, buffer_size, flush_size, flush_interval):
+        self.entries = deque()
+        self.buffer_size = buffer_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.wakeup = threading.Event()
+        self.flush_lock = threading.Lock()
+        self.start_lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+        self.stats = {'logged': 0, 'dropped': 0, 'flushed': 0, 'flush_errors': 0}
+
+    def add(self, entry):
+        self.ensure_thread()
+        # len() и append() атомарны под GIL; небольшое превышение при гонке допустимо
+        if len(self.entries) >= self.buffer_size:
+            self.stats['dropped'] += 1
+            return False
+        self.entries.append(entry)
+        self.stats['logged'] += 1
+        if len(self.entries) >= self.flush_size:
+            self.wakeup.set()
+        return True
+
+    def ensure_thread(self):
+        # После fork (gunicorn, воркеры Celery) поток родителя в дочернем процессе не работает
+        if self.pid == os.getpid() and self.thread is not None and self.thread.is_alive():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid() and self.thread is not None and self.thread.is_alive():
+                return
+            if self.pid is not None and self.pid != os.getpid():
+                # Записи, скопированные из родителя, запишет сам родитель
+                self.entries.clear()
+                self.flush_lock = threading.Lock()
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name='api-request-log', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Пишет все накопленные записи пачками по flush_size"""
+        APIRequestLog = apps.get_model('core', 'APIRequestLog')
+
+        with self.flush_lock:
+            while self.entries:
+                batch = []
+                while self.entries and len(batch) < self.flush_size:
+                    batch.append(self.entries.popleft())
+                try:
+                    APIRequestLog.objects.bulk_create([APIRequestLog(**entry) for entry in batch])
+                    self.stats['flushed'] += len(batch)
+                except Exception as e:
+                    # Записи не возвращаются в буфер: лог не должен копить память при недоступной базе
+                    self.stats['flush_errors'] += 1
+                    self.stats['dropped'] += len(batch)
+                    logger.error("Ошибка записи журнала API запросов (%s записей): %s", len(batch), e)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                config = get_config()
+                _buffer = RequestLogBuffer(config['buffer_size'], config['flush_size'], config['flush_interval'])
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+def build_entry(request, response, duration, request_body=None, config=None):
+    from apps.core.log_handlers import resolved_user_id
+
+    config = config or get_config()
+    entry = {
+        # Ленивый request.user не вычисляется: запрос к сессии/БД ради лога не делается.
+        # DRF после аутентификации подставляет в запрос уже загруженного пользователя
+        'user_id': resolved_user_id(getattr(request, 'user', None)),
+        'method': request.method[:10],
+        'path': request.path[:500],
+        'query_params': request.META.get('QUERY_STRING', ''),
+        'status_code': response.status_code,
+        'response_time': round(duration, 6),
+        'ip_address': request.META.get('REMOTE_ADDR') or '0.0.0.0',
+        'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500],
+    }
+    if config['log_bodies']:
+        max_length = config['body_max_length']
+        entry['request_body'] = request_body
+        content_type = response.get('Content-Type', '')
+        if not response.streaming and ('json' in content_type or content_type.startswith('text/')):
+            entry['response_body'] = truncate_body(response.content, content_type, max_length)
+    return entry
+
+
+def read_request_body(request, config=None):
+    """Тело запроса для лога, только небольшие JSON, формы и текст (файлы импорта не читаются)"""
+    config = config or get_config()
+    content_type = request.META.get('CONTENT_TYPE', '')
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return None
+    if not length or length > config['body_read_limit']:
+        return None
+    if not ('json' in content_type or 'x-www-form-urlencoded' in content_type or content_type.startswith('text/')):
+        return None
+    # request.body кешируется в запросе: DRF прочитает его повторно без обращения к потоку
+    return truncate_body(request.body, content_type, config['body_max_length'])
+
+
+def log_request(request, response, duration, request_body=None):
+    return get_buffer().add(build_entry(request, response, duration, request_body))
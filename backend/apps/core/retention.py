@@ -0,0 +1,145 @@
+import os
+import time
+from django.apps import apps
+from django.conf import settings
+
+
+DELETE_BATCH_SIZE = 1000
+DAY = 24 * 60 * 60
+
+
+class RetentionSweeper:
+    """
+    Очистка каталогов MEDIA_ROOT по правилам MEDIA_RETENTION_POLICIES.
+
+    Каталог обходится через os.scandir без построения списка файлов:
+    файлы старше max_age_days удаляются пачками по мере обхода. В памяти
+    остаются только более новые файлы и только если задан keep_last или
+    max_total_mb (для них нужна сортировка по времени изменения).
+    Результат - только счетчики.
+    """
+
+    COUNTERS = ('scanned', 'deleted', 'deleted_bytes', 'kept', 'protected', 'errors', 'directories_removed')
+
+    def __init__(self, policies=None, media_root=None, batch_size=DELETE_BATCH_SIZE, dry_run=False, now=None):
+        self.policies = settings.MEDIA_RETENTION_POLICIES if policies is None else policies
+        self.media_root = str(media_root or settings.MEDIA_ROOT)
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.now = now or time.time()
+        self.protected = set()
+        self.pending = []
+        self.stats = None
+
+    def sweep(self):
+        """Обходит все каталоги из правил; {каталог: счетчики} и итог в 'total'"""
+        self.protected = self.protected_paths()
+        result = {}
+        total = dict.fromkeys(self.COUNTERS, 0)
+        for name, policy in self.policies.items():
+            stats = self.sweep_directory(name, policy)
+            for key in self.COUNTERS:
+                total[key] += stats[key]
+            result[name] = stats
+        result['total'] = total
+        return result
+
+    def protected_paths(self):
+        """Файлы незавершенных задач импорта удалять нельзя"""
+        ImportJob = apps.get_model('core', 'ImportJob')
+        return {
+            os.path.realpath(path)
+            for path in ImportJob.objects.filter(status__in=['pending', 'running']).values_list('file_path', flat=True)
+        }
+
+    def sweep_directory(self, name, policy):
+        self.stats = dict.fromkeys(self.COUNTERS, 0)
+        root = os.path.realpath(os.path.join(self.media_root, name))
+        if not os.path.isdir(root):
+            return self.stats
+
+        max_age = policy.get('max_age_days')
+        cutoff = self.now - max_age * DAY if max_age is not None else None
+        keep_last = policy.get('keep_last')
+        max_bytes = policy['max_total_mb'] * 1024 * 1024 if policy.get('max_total_mb') is not None else None
+        recursive = policy.get('recursive', False)
+
+        survivors = []
+        directories = []
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                self.stats['errors'] += 1
+                continue
+            with entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                stack.append(entry.path)
+                                directories.append((entry.path, entry.stat(follow_symlinks=False).st_mtime))
+                            continue
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        stat = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    except OSError:
+                        self.stats['errors'] += 1
+                        continue
+
+                    self.stats['scanned'] += 1
+                    if entry.path in self.protected:
+                        self.stats['protected'] += 1
+                    elif cutoff is not None and stat.st_mtime < cutoff:
+                        self.delete(entry.path, stat.st_size)
+                    elif keep_last is not None or max_bytes is not None:
+                        survivors.append((stat.st_mtime, stat.st_size, entry.path))
+                    else:
+                        self.stats['kept'] += 1
+
+        # Самые новые файлы остаются, пока не превышены keep_last и max_total_mb
+        survivors.sort(reverse=True)
+        total_size = 0
+        for index, (mtime, size, path) in enumerate(survivors):
+            if (keep_last is not None and index >= keep_last) or (
+                max_bytes is not None and total_size + size > max_bytes
+            ):
+                self.delete(path, size)
+            else:
+                total_size += size
+                self.stats['kept'] += 1
+        self.flush()
+
+        if recursive and cutoff is not None and not self.dry_run:
+            # Сначала вложенные: пустые старые каталоги (например, шарды брошенных импортов)
+            for path, mtime in sorted(directories, key=lambda item: -len(item[0])):
+                if mtime < cutoff:
+                    try:
+                        os.rmdir(path)
+                        self.stats['directories_removed'] += 1
+                    except OSError:
+                        pass
+        return self.stats
+
+    def delete(self, path, size):
+        self.pending.append((path, size))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for path, size in self.pending:
+            if not self.dry_run:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    continue
+                except OSError:
+                    self.stats['errors'] += 1
+                    continue
+            self.stats['deleted'] += 1
+            self.stats['deleted_bytes'] += size
+        self.pending = []
@@ -5,6 +5,7 @@ from apps.core.models import (
     SystemLog, BackupSchedule, BackupRecord, APIRequestLog,
     Notification, SystemHealthCheck
 )
+from apps.core.notifications import SEGMENTS
 
 
 class SystemSettingsSerializer(serializers.ModelSerializer):
@@ -32,14 +33,16 @@ class ImportJobSerializer(serializers.ModelSerializer):
     class Meta:
         model = ImportJob
         fields = [
-            'id', 'user', 'user_email', 'file_path', 'status', 'task_id',
-            'total_processed', 'created_count', 'updated_count', 'error_count',
-            'error_message', 'started_at', 'completed_at', 'created_at', 'duration'
+            'id', 'user', 'user_email', 'supplier', 'file_path', 'status', 'task_id',
+            'total_processed', 'created_count', 'updated_count', 'unchanged_count', 'error_count',
+            'checkpoint_offset', 'dry_run', 'validation_report', 'error_message', 'started_at',
+            'completed_at', 'created_at', 'updated_at', 'duration'
         ]
         read_only_fields = [
-            'id', 'user', 'user_email', 'status', 'task_id', 'total_processed',
-            'created_count', 'updated_count', 'error_count', 'error_message',
-            'started_at', 'completed_at', 'created_at', 'duration'
+            'id', 'user', 'user_email', 'supplier', 'status', 'task_id', 'total_processed',
+            'created_count', 'updated_count', 'unchanged_count', 'error_count',
+            'checkpoint_offset', 'dry_run', 'validation_report', 'error_message', 'started_at',
+            'completed_at', 'created_at', 'updated_at', 'duration'
         ]
 
     def get_duration(self, obj):
@@ -56,8 +59,11 @@ class ImportJobCreateSerializer(serializers.Serializer):
         import os
         if not os.path.exists(value):
             raise serializers.ValidationError("File does not exist")
-        if not value.endswith(('.yaml', '.yml')):
-            raise serializers.ValidationError("File must be YAML format (.yaml or .yml)")
+        from apps.core.formats import get_format
+        try:
+            get_format(value)
+        except ValueError:
+            raise serializers.ValidationError("Unsupported file format (YAML, CSV or JSON Lines expected)")
         return value
 
 
@@ -66,17 +72,19 @@ class ExportJobSerializer(serializers.ModelSerializer):
     user_email = serializers.CharField(source='user.email', read_only=True)
     duration = serializers.SerializerMethodField()
     file_size = serializers.SerializerMethodField()
+    file_size_bytes = serializers.IntegerField(source='file_size', read_only=True)
 
     class Meta:
         model = ExportJob
         fields = [
-            'id', 'user', 'user_email', 'file_path', 'status', 'task_id',
-            'total_exported', 'error_message', 'started_at', 'completed_at',
-            'created_at', 'duration', 'file_size'
+            'id', 'user', 'user_email', 'supplier', 'file_path', 'file_format', 'compression',
+            'since', 'watermark', 'status', 'task_id', 'total_exported', 'tombstone_count', 'timings', 'error_message', 'started_at',
+            'completed_at', 'created_at', 'duration', 'file_size', 'file_size_bytes', 'checksum'
         ]
         read_only_fields = [
-            'id', 'user', 'user_email', 'status', 'task_id', 'total_exported',
-            'error_message', 'started_at', 'completed_at', 'created_at', 'duration'
+            'id', 'user', 'user_email', 'supplier', 'file_format', 'compression', 'since', 'watermark',
+            'status', 'task_id', 'total_exported', 'tombstone_count', 'timings', 'error_message', 'started_at', 'completed_at', 'created_at',
+            'duration', 'file_size_bytes', 'checksum'
         ]
 
     def get_duration(self, obj):
@@ -85,9 +93,9 @@ class ExportJobSerializer(serializers.ModelSerializer):
         return None
 
     def get_file_size(self, obj):
-        import os
-        if obj.file_path and os.path.exists(obj.file_path):
-            size = os.path.getsize(obj.file_path)
+        # Размер сохраняется при экспорте, файл не читается при каждой сериализации
+        if obj.file_size is not None:
+            size = obj.file_size
             # Конвертируем в читаемый формат
             for unit in ['B', 'KB', 'MB', 'GB']:
                 if size < 1024.0:
@@ -100,12 +108,43 @@ class ExportJobCreateSerializer(serializers.Serializer):
     """Сериализатор для создания задачи экспорта"""
     file_path = serializers.CharField(max_length=500, required=False)
     supplier_id = serializers.IntegerField(required=False)
+    file_format = serializers.ChoiceField(choices=ExportJob.FORMAT_CHOICES, required=False)
+    compression = serializers.ChoiceField(choices=ExportJob.COMPRESSION_CHOICES, default='gzip')
+    # Инкрементальный экспорт: от момента времени или от предыдущей задачи экспорта
+    since = serializers.DateTimeField(required=False)
+    since_job_id = serializers.IntegerField(required=False)
 
     def validate_file_path(self, value):
-        if value and not value.endswith(('.yaml', '.yml')):
-            raise serializers.ValidationError("File must have .yaml or .yml extension")
+        from apps.core.formats import format_from_extension, supported_extensions
+        if value and format_from_extension(value) is None:
+            raise serializers.ValidationError(
+                f"Unsupported file extension. Supported extensions: {', '.join(supported_extensions())}"
+            )
         return value
 
+    def validate_compression(self, value):
+        from apps.core.formats import available_compressions
+        if value not in available_compressions():
+            raise serializers.ValidationError(f"Compression {value!r} is not available on this server")
+        return value
+
+    def validate(self, attrs):
+        from apps.core.formats import format_from_extension
+        # Формат берется из запроса, иначе из расширения файла (по умолчанию YAML)
+        if not attrs.get('file_format'):
+            codec = format_from_extension(attrs['file_path']) if attrs.get('file_path') else None
+            attrs['file_format'] = codec.name if codec else 'yaml'
+
+        since_job_id = attrs.pop('since_job_id', None)
+        if since_job_id is not None:
+            if attrs.get('since'):
+                raise serializers.ValidationError("Specify either since or since_job_id, not both")
+            job = ExportJob.objects.filter(pk=since_job_id, status='completed').first()
+            if job is None:
+                raise serializers.ValidationError({'since_job_id': "Completed export job not found"})
+            attrs['since'] = job.watermark or job.started_at
+        return attrs
+
 
 class EmailTemplateSerializer(serializers.ModelSerializer):
     """Сериализатор для шаблонов email"""
@@ -158,11 +197,11 @@ class BackupScheduleSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'backup_type', 'frequency', 'is_active',
             'keep_backups', 'include_media', 'compress_backup',
-            'scheduled_time', 'last_run', 'next_run',
+            'scheduled_time', 'last_run', 'next_run', 'locked_until',
             'notify_on_success', 'notify_on_failure', 'notification_email',
             'created_at', 'updated_at', 'last_run_status'
         ]
-        read_only_fields = ['created_at', 'updated_at', 'last_run', 'next_run']
+        read_only_fields = ['created_at', 'updated_at', 'last_run', 'next_run', 'locked_until']
 
     def get_last_run_status(self, obj):
         last_backup = obj.backups.order_by('-created_at').first()
@@ -171,14 +210,14 @@ class BackupScheduleSerializer(serializers.ModelSerializer):
 
 class BackupRecordSerializer(serializers.ModelSerializer):
     """Сериализатор для записей резервного копирования"""
-    schedule_name = serializers.CharField(source='schedule.name', read_only=True)
+    schedule_name = serializers.CharField(source='schedule.name', read_only=True, default=None)
     file_size_mb = serializers.SerializerMethodField()
 
     class Meta:
         model = BackupRecord
         fields = [
-            'id', 'schedule', 'schedule_name', 'status', 'file_path',
-            'file_size', 'file_size_mb', 'duration', 'error_message',
+            'id', 'schedule', 'schedule_name', 'backup_type', 'status', 'file_path',
+            'file_size', 'file_size_mb', 'duration', 'details', 'error_message',
             'created_at', 'completed_at'
         ]
         read_only_fields = ['created_at', 'completed_at']
@@ -242,6 +281,27 @@ class MarkNotificationsReadSerializer(serializers.Serializer):
     )
     mark_all = serializers.BooleanField(default=False)
 
+    def validate(self, attrs):
+        if not attrs.get('mark_all') and not attrs.get('notification_ids'):
+            raise serializers.ValidationError("Укажите notification_ids или mark_all")
+        return attrs
+
+
+class NotificationBroadcastSerializer(serializers.Serializer):
+    """Сериализатор для рассылки уведомлений сегменту пользователей"""
+    segment = serializers.ChoiceField(choices=list(SEGMENTS.items()))
+    supplier_id = serializers.IntegerField(required=False)
+    type = serializers.ChoiceField(choices=Notification.TYPE_CHOICES, default='info')
+    title = serializers.CharField(max_length=200)
+    message = serializers.CharField()
+    object_id = serializers.IntegerField(required=False, allow_null=True)
+    object_type = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+
+    def validate(self, attrs):
+        if attrs['segment'] == 'supplier_clients' and not attrs.get('supplier_id'):
+            raise serializers.ValidationError({'supplier_id': "Обязателен для сегмента supplier_clients"})
+        return attrs
+
 
 class SystemHealthCheckSerializer(serializers.ModelSerializer):
     """Сериализатор для проверки здоровья системы"""
@@ -276,9 +336,22 @@ class ImportStatsSerializer(serializers.Serializer):
 class TaskStatusSerializer(serializers.Serializer):
     """Сериализатор для статуса задачи"""
     task_id = serializers.CharField()
+    name = serializers.CharField(read_only=True)
     status = serializers.CharField()
-    result = serializers.DictField(required=False)
+    progress = serializers.SerializerMethodField()
+    message = serializers.CharField(read_only=True)
+    result = serializers.JSONField(required=False)
     error = serializers.CharField(required=False)
+    created_at = serializers.DateTimeField(read_only=True)
+    started_at = serializers.DateTimeField(read_only=True)
+    finished_at = serializers.DateTimeField(read_only=True)
+
+    def get_progress(self, obj):
+        return {
+            'current': obj.progress_current,
+            'total': obj.progress_total,
+            'percent': obj.progress_percent,
+        }
 
 
 class FileUploadSerializer(serializers.Serializer):
@@ -286,12 +359,16 @@ class FileUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
 
     def validate_file(self, value):
-        import os
-        valid_extensions = ['.yaml', '.yml']
-        ext = os.path.splitext(value.name)[1].lower()
-        if ext not in valid_extensions:
+        from apps.core.formats import SNIFF_SIZE, format_from_extension, sniff_format, supported_extensions
+        if format_from_extension(value.name) is not None:
+            return value
+
+        # Неизвестное расширение: определяем формат по содержимому
+        codec = sniff_format(value.read(SNIFF_SIZE))
+        value.seek(0)
+        if codec is None:
             raise serializers.ValidationError(
-                f"Unsupported file extension. Supported extensions: {', '.join(valid_extensions)}"
+                f"Unsupported file format. Supported extensions: {', '.join(supported_extensions())}"
             )
         return value
 
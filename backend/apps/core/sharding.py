@@ -0,0 +1,133 @@
+import json
+import os
+import zlib
+from django.apps import apps
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.core.formats import FORMATS, iter_goods
+from apps.core.import_export import (
+    IMPORT_CHUNK_SIZE, ProductImporter, ImportCancelled, chunked, record_sku
+)
+
+
+def shard_for_category(category, shard_count):
+    """Номер шарда категории: стабилен между запусками и процессами"""
+    return zlib.crc32(str(category).encode('utf-8')) % shard_count
+
+
+def split_into_shards(file_path, shard_dir, shard_count):
+    """
+    Разбивает файл импорта на шарды по категориям (JSON Lines).
+
+    Первый проход запоминает последнее вхождение каждого артикула, второй
+    пишет в шарды только его. Так артикул попадает ровно в один шард, а
+    результат совпадает с последовательным импортом (побеждает последняя
+    строка файла), даже если товар встречается в разных категориях.
+    """
+    last_position = {}
+    for position, good in enumerate(iter_goods(file_path)):
+        sku = record_sku(good)
+        if sku is not None:
+            last_position[sku] = position
+
+    os.makedirs(shard_dir, exist_ok=True)
+    files = {}
+    counts = {}
+    stats = {'total': 0, 'duplicates': 0}
+    categories = {}
+    try:
+        for position, good in enumerate(iter_goods(file_path, categories)):
+            stats['total'] += 1
+            sku = record_sku(good)
+            if sku is not None and last_position[sku] != position:
+                stats['duplicates'] += 1
+                continue
+
+            shard = shard_for_category(good.get('category'), shard_count)
+            if shard not in files:
+                path = os.path.join(shard_dir, f'shard_{shard:03d}.jsonl')
+                files[shard] = open(path, 'w', encoding='utf-8')
+                counts[shard] = 0
+            files[shard].write(json.dumps(good, ensure_ascii=False, default=str))
+            files[shard].write('\n')
+            counts[shard] += 1
+    finally:
+        for file in files.values():
+            file.close()
+
+    # Описания категорий нужны шардам при создании новых категорий
+    with open(os.path.join(shard_dir, 'categories.json'), 'w', encoding='utf-8') as file:
+        json.dump(categories, file, ensure_ascii=False)
+
+    stats['shards'] = [
+        {'path': os.path.join(shard_dir, f'shard_{shard:03d}.jsonl'), 'goods': counts[shard]}
+        for shard in sorted(files)
+    ]
+    return stats
+
+
+def import_shard(shard_path, supplier_id=None, job_id=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Импорт одного шарда. После каждой пачки счетчики родительской задачи
+    увеличиваются атомарно (F-выражения), поэтому шарды не мешают друг другу.
+
+    Товары пачки, ее счетчики и отметка в ImportShard фиксируются одной
+    транзакцией: повторно доставленная задача (acks_late) пропускает уже
+    записанные пачки и не учитывает их дважды.
+    """
+    ImportJob = apps.get_model('core', 'ImportJob')
+    ImportShard = apps.get_model('core', 'ImportShard')
+
+    importer = ProductImporter(chunk_size=chunk_size)
+    categories_path = os.path.join(os.path.dirname(shard_path), 'categories.json')
+    if os.path.exists(categories_path):
+        with open(categories_path, 'r', encoding='utf-8') as file:
+            importer.category_descriptions = json.load(file)
+    importer.prepare(supplier_id)
+
+    shard = None
+    if job_id is not None:
+        shard, created = ImportShard.objects.get_or_create(job_id=job_id, name=os.path.basename(shard_path))
+
+    try:
+        for index, chunk in enumerate(chunked(FORMATS['jsonl'].iter_goods(shard_path), chunk_size)):
+            if shard is None:
+                importer.import_chunk(chunk)
+                continue
+            if index < shard.chunks_done:
+                continue
+
+            with transaction.atomic():
+                before = dict(importer.stats)
+                importer.import_chunk(chunk)
+
+                # Пачку в тот же момент записала другая доставка задачи: откатываем свою
+                if not ImportShard.objects.filter(pk=shard.pk, chunks_done=index).update(chunks_done=index + 1):
+                    transaction.set_rollback(True)
+                    break
+
+                delta = {
+                    field: F(field) + importer.stats[key] - before[key]
+                    for key, field in (
+                        ('processed', 'total_processed'),
+                        ('created', 'created_count'),
+                        ('updated', 'updated_count'),
+                        ('unchanged', 'unchanged_count'),
+                        ('errors', 'error_count'),
+                    )
+                }
+                delta['updated_at'] = timezone.now()
+                if not ImportJob.objects.filter(pk=job_id, status='running').update(**delta):
+                    raise ImportCancelled(f"Импорт #{job_id} отменен")
+            shard.chunks_done = index + 1
+    finally:
+        importer.close()
+
+    if importer.images is not None:
+        importer.stats['images'] = importer.images.stats
+
+    if importer.error_details:
+        importer.stats['error_details'] = importer.error_details
+    return importer.stats
@@ -0,0 +1,91 @@
+import socketserver
+import threading
+from email import message_from_bytes
+from email.policy import default as default_policy
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Минимальный диалог SMTP: принимает любые письма и ничего не отправляет дальше"""
+    # Ответы короткие: без TCP_NODELAY каждое письмо ждало бы задержанный ACK
+    disable_nagle_algorithm = True
+
+    def reply(self, *lines):
+        self.wfile.write(b''.join(line.encode('ascii') + b'\r\n' for line in lines))
+
+    def handle(self):
+        self.server.count('connections')
+        self.reply('220 procurepro SMTP sink')
+        data = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if data is not None:
+                if line.rstrip(b'\r\n') == b'.':
+                    self.server.store(b''.join(data))
+                    data = None
+                    self.reply('250 OK')
+                else:
+                    data.append(line[1:] if line.startswith(b'..') else line)
+                continue
+
+            verb = line.decode('ascii', errors='replace').strip().split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.reply('250-procurepro', '250 8BITMIME')
+            elif verb in ('HELO', 'MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                data = []
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """
+    Локальная замена SMTP-сервера для разработки и бенчмарков.
+    Считает соединения и письма; последние keep писем хранятся в messages.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=1025, keep=100):
+        super().__init__((host, port), SMTPSinkHandler)
+        self.keep = keep
+        self.messages = []
+        self.stats = {'connections': 0, 'messages': 0, 'bytes': 0}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.stats[name] += value
+
+    def store(self, raw):
+        with self.lock:
+            self.stats['messages'] += 1
+            self.stats['bytes'] += len(raw)
+            if self.keep:
+                self.messages.append(raw)
+                del self.messages[:-self.keep]
+
+    def parsed_messages(self):
+        with self.lock:
+            return [message_from_bytes(raw, policy=default_policy) for raw in self.messages]
+
+    def start(self):
+        """Запуск в фоновом потоке (port=0 - свободный порт)"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -1,52 +1,36 @@
+import logging
 from celery import shared_task
 from django.apps import apps
-from django.core.mail import send_mail
 from django.conf import settings
 from django.db import models  # ДОБАВЛЕНО: импорт models
+from apps.core.tracking import TrackedTask
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task(bind=True)
 def debug_task(self):
     """Тестовая задача для проверки работы Celery"""
-    print(f'Debug task executed: {self.request.id}')
+    logger.info('Debug task executed: %s', self.request.id)
     return f'Task {self.request.id} completed successfully'
 
 
 @shared_task
 def send_order_confirmation_email(order_id):
-    """Отправка email подтверждения заказа клиенту"""
+    """Письмо клиенту с подтверждением заказа (через очередь исходящих писем)"""
+    from apps.core.email_templates import render_email
+    from apps.core.mail import enqueue_email
+
     try:
-        # ИСПРАВЛЕНО: используем apps.get_model вместо импорта
         Order = apps.get_model('orders', 'Order')
-        order = Order.objects.select_related('user').prefetch_related('items').get(id=order_id)
-
-        subject = f'Подтверждение заказа - #{order.id}'
-        message = f"""
-        Уважаемый(ая) {order.user.first_name or order.user.username},
-
-        Благодарим за ваш заказ! Детали заказа:
-
-        Номер заказа: #{order.id}
-        Общая сумма: {order.total_amount} руб.
-        Адрес доставки: {order.shipping_address}
-
-        Состав заказа:
-        """
+        order = Order.objects.select_related('user').prefetch_related('items__product').get(id=order_id)
 
-        for item in order.items.all():
-            message += f"\n- {item.product.name} x {item.quantity}: {item.total_price} руб."
+        subject, message = render_email('order_confirmation', {
+            'order': order, 'user': order.user, 'items': order.items.all()
+        })
+        enqueue_email(subject, message, [order.user.email], kind='order_confirmation')
 
-        message += "\n\nМы уведомим вас, когда заказ будет отправлен."
-
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[order.user.email],
-            fail_silently=False,
-        )
-
-        return f"Письмо с подтверждением отправлено для заказа #{order.id}"
+        return f"Письмо с подтверждением поставлено в очередь для заказа #{order.id}"
 
     except Exception as e:
         return f"Ошибка отправки письма с подтверждением: {str(e)}"
@@ -54,56 +38,63 @@ def send_order_confirmation_email(order_id):
 
 @shared_task
 def send_order_to_admin(order_id):
-    """Отправка уведомления о новом заказе администратору"""
+    """Уведомление администраторам о новом заказе (через очередь исходящих писем)"""
+    from apps.core.email_templates import render_email
+    from apps.core.mail import enqueue_email, get_admin_emails
+
     try:
-        # ИСПРАВЛЕНО: используем apps.get_model вместо импорта
         Order = apps.get_model('orders', 'Order')
-        order = Order.objects.select_related('user').prefetch_related('items').get(id=order_id)
-
-        subject = f'Новый заказ - #{order.id}'
-        message = f"""
-        Поступил новый заказ:
+        order = Order.objects.select_related('user').prefetch_related('items__product').get(id=order_id)
 
-        Номер заказа: #{order.id}
-        Клиент: {order.user.email}
-        Общая сумма: {order.total_amount} руб.
-        Адрес доставки: {order.shipping_address}
+        admin_emails = get_admin_emails()
+        if admin_emails:
+            subject, message = render_email('admin_notification', {
+                'order': order, 'user': order.user, 'items': order.items.all()
+            })
+            enqueue_email(subject, message, admin_emails, kind='admin_notification')
 
-        Состав заказа:
-        """
+        return f"Уведомление администратору поставлено в очередь для заказа #{order.id}"
 
-        for item in order.items.all():
-            message += f"\n- {item.product.name} x {item.quantity}: {item.total_price} руб."
+    except Exception as e:
+        return f"Ошибка отправки уведомления администратору: {str(e)}"
 
-        # Получаем email администраторов
-        User = apps.get_model('users', 'User')
-        admin_emails = User.objects.filter(
-            user_type='admin',
-            is_active=True
-        ).values_list('email', flat=True)
 
-        if admin_emails:
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=list(admin_emails),
-                fail_silently=False,
-            )
+@shared_task
+def drain_email_outbox_task(limit=None):
+    """Отправка очереди писем пачками через одно SMTP-соединение"""
+    from apps.core.mail import RETRY_DELAY, MailDispatcher, clear_drain_scheduled
 
-        return f"Уведомление администратору отправлено для заказа #{order.id}"
+    clear_drain_scheduled()
+    try:
+        stats = MailDispatcher().drain(limit=limit)
+        if stats['retried']:
+            drain_email_outbox_task.apply_async(countdown=RETRY_DELAY)
+        return {
+            'status': 'success',
+            **stats,
+            'message': f"Отправлено писем: {stats['sent']}, ошибок: {stats['failed']}"
+        }
 
     except Exception as e:
-        return f"Ошибка отправки уведомления администратору: {str(e)}"
+        return {
+            'status': 'error',
+            'error': str(e),
+            'message': f'Ошибка отправки очереди писем: {str(e)}'
+        }
 
 
-@shared_task
-def import_products_task(file_path):
+@shared_task(bind=True, base=TrackedTask, acks_late=True, reject_on_worker_lost=True,
+             soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+             time_limit=settings.LONG_TASK_TIME_LIMIT)
+def import_products_task(self, file_path=None, supplier_id=None, job_id=None):
     """Задача для импорта товаров из YAML файла"""
+    if job_id is not None:
+        return run_import_job(job_id, self.request.id)
+
     try:
         from .import_export import ProductImporter
         importer = ProductImporter()
-        result = importer.import_from_file(file_path)
+        result = importer.import_from_file(file_path, supplier_id)
         return {
             'status': 'success',
             'result': result,
@@ -117,19 +108,323 @@ def import_products_task(file_path):
         }
 
 
+def run_import_job(job_id, task_id=None):
+    """
+    Выполнение ImportJob с записью прогресса и контрольных точек.
+    Упавшая (acks_late: задача будет доставлена повторно) или отмененная
+    задача продолжает работу с последней контрольной точки.
+    """
+    import os
+    import traceback
+    from django.db.models import Q
+    from django.utils import timezone
+    from .import_export import ProductImporter, ImportCancelled
+    from .progress import ImportJobProgress
+
+    ImportJob = apps.get_model('core', 'ImportJob')
+    job = ImportJob.objects.get(id=job_id)
+
+    # Захват условным UPDATE: вторая копия задачи и отмена, сделанная пока задача
+    # ждала в очереди, не перезаписываются. Задача в статусе running подхватывается
+    # только повторной доставкой того же сообщения (acks_late после падения воркера).
+    claim = Q(status='pending')
+    if task_id:
+        claim |= Q(status='running', task_id=task_id)
+    started = ImportJob.objects.filter(claim, pk=job.pk).update(
+        status='running',
+        task_id=task_id or job.task_id,
+        started_at=job.started_at or timezone.now(),
+        error_message='',
+        error_traceback=''
+    )
+    if not started:
+        job.refresh_from_db(fields=['status'])
+        return {
+            'status': 'skipped',
+            'job_id': job.id,
+            'message': f"Импорт #{job.id} уже в статусе {job.status}"
+        }
+
+    if job.dry_run:
+        return run_validation_job(job)
+
+    progress = ImportJobProgress(job, task_id)
+    importer = ProductImporter()
+    progress.restore(importer.stats)
+
+    try:
+        stats = importer.import_from_file(
+            job.file_path,
+            job.supplier_id,
+            start_offset=job.checkpoint_offset,
+            on_progress=progress.update
+        )
+    except ImportCancelled:
+        progress.finish('cancelled')
+        return {
+            'status': 'cancelled',
+            'job_id': job.id,
+            'message': f"Импорт #{job.id} отменен"
+        }
+    except Exception as e:
+        # Файл сохраняется, чтобы задачу можно было возобновить
+        progress.finish('failed', error_message=str(e), error_traceback=traceback.format_exc())
+        return {
+            'status': 'error',
+            'job_id': job.id,
+            'error': str(e),
+            'message': f"Ошибка импорта: {str(e)}"
+        }
+
+    progress.finish('completed', stats, error_message='\n'.join(stats.get('error_details', [])))
+    if os.path.exists(job.file_path):
+        os.remove(job.file_path)
+
+    return {
+        'status': 'success',
+        'job_id': job.id,
+        'result': stats,
+        'message': 'Импорт завершен успешно'
+    }
+
+
+def run_validation_job(job):
+    """Проверка файла без импорта (dry run): отчет сохраняется в задаче"""
+    import os
+    from django.utils import timezone
+    from .validation import ImportValidator
+
+    ImportJob = apps.get_model('core', 'ImportJob')
+    try:
+        report = ImportValidator(job.supplier_id).validate_file(job.file_path)
+    except Exception as e:
+        ImportJob.objects.filter(pk=job.pk).update(status='failed', error_message=str(e), updated_at=timezone.now())
+        return {
+            'status': 'error',
+            'job_id': job.id,
+            'error': str(e),
+            'message': f"Ошибка проверки файла: {str(e)}"
+        }
+    finally:
+        if os.path.exists(job.file_path):
+            os.remove(job.file_path)
+
+    ImportJob.objects.filter(pk=job.pk).update(
+        status='completed',
+        total_processed=report['total'],
+        error_count=report['error_count'],
+        validation_report=report,
+        completed_at=timezone.now(),
+        updated_at=timezone.now()
+    )
+    return {
+        'status': 'success',
+        'job_id': job.id,
+        'valid': report['valid'],
+        'message': f"Проверка завершена: {report['total']} товаров, ошибок {report['error_count']}"
+    }
+
+
+@shared_task(bind=True, base=TrackedTask,
+             soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+             time_limit=settings.LONG_TASK_TIME_LIMIT)
+def import_products_sharded_task(self, job_id, shard_count=None):
+    """
+    Координатор параллельного импорта: делит файл на шарды по категориям
+    и запускает их группой (chord) на воркерах Celery.
+    """
+    import os
+    import traceback
+    from celery import chord
+    from django.utils import timezone
+    from .sharding import split_into_shards
+
+    ImportJob = apps.get_model('core', 'ImportJob')
+    job = ImportJob.objects.get(id=job_id)
+    shard_count = shard_count or settings.IMPORT_SHARD_COUNT
+    shard_dir = os.path.join(settings.MEDIA_ROOT, 'temp', f'import_{job.id}_shards')
+
+    # Условие на статус: отмена, сделанная пока задача ждала в очереди, не перезаписывается
+    started = ImportJob.objects.filter(pk=job.pk, status='pending').update(
+        status='running',
+        task_id=self.request.id,
+        started_at=timezone.now(),
+        total_processed=0,
+        created_count=0,
+        updated_count=0,
+        unchanged_count=0,
+        error_count=0
+    )
+    if not started:
+        job.refresh_from_db(fields=['status'])
+        return {
+            'status': 'skipped',
+            'job_id': job.id,
+            'message': f"Импорт #{job.id} уже в статусе {job.status}"
+        }
+
+    try:
+        split = split_into_shards(job.file_path, shard_dir, shard_count)
+    except Exception as e:
+        ImportJob.objects.filter(pk=job.pk).update(
+            status='failed',
+            error_message=str(e),
+            error_traceback=traceback.format_exc()
+        )
+        return {
+            'status': 'error',
+            'job_id': job.id,
+            'error': str(e),
+            'message': f"Ошибка разбиения файла на шарды: {str(e)}"
+        }
+
+    # Повторы артикула отброшены при разбиении, но учитываются как обработанные
+    ImportJob.objects.filter(pk=job.pk).update(total_processed=split['duplicates'])
+
+    chord(
+        import_shard_task.s(job.id, shard['path'], job.supplier_id)
+        for shard in split['shards']
+    )(finish_sharded_import.s(job.id, shard_dir))
+
+    return {
+        'status': 'dispatched',
+        'job_id': job.id,
+        'shards': len(split['shards']),
+        'duplicates': split['duplicates'],
+        'message': f"Импорт разбит на {len(split['shards'])} шардов"
+    }
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True,
+             soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+             time_limit=settings.LONG_TASK_TIME_LIMIT)
+def import_shard_task(job_id, shard_path, supplier_id=None):
+    """Импорт одного шарда в рамках ImportJob"""
+    from .import_export import ImportCancelled
+    from .sharding import import_shard
+
+    try:
+        return {'status': 'success', 'result': import_shard(shard_path, supplier_id, job_id)}
+    except ImportCancelled as e:
+        return {'status': 'cancelled', 'error': str(e)}
+    except Exception as e:
+        return {'status': 'error', 'error': f"{shard_path}: {str(e)}"}
+
+
 @shared_task
-def export_products_task(file_path):
-    """Задача для экспорта товаров в YAML файл"""
+def finish_sharded_import(results, job_id, shard_dir):
+    """Сводит результаты шардов в родительский ImportJob"""
+    import os
+    import shutil
+    from django.utils import timezone
+    from .tracking import record_result
+
+    ImportJob = apps.get_model('core', 'ImportJob')
+
+    messages = []
+    statuses = set()
+    for shard in results:
+        statuses.add(shard['status'])
+        if shard['status'] == 'success':
+            messages.extend(shard['result'].get('error_details', []))
+        elif shard.get('error'):
+            messages.append(shard['error'])
+
+    if 'error' in statuses:
+        final_status = 'failed'
+    elif 'cancelled' in statuses:
+        final_status = 'cancelled'
+    else:
+        final_status = 'completed'
+
+    ImportJob.objects.filter(pk=job_id).exclude(status='cancelled').update(
+        status=final_status,
+        error_message='\n'.join(messages[:50]),
+        completed_at=timezone.now() if final_status == 'completed' else None
+    )
+
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    job = ImportJob.objects.get(pk=job_id)
+    # Итоги - из счетчиков задачи: результат повторно доставленного шарда не содержит пропущенных пачек
+    totals = {
+        'processed': job.total_processed,
+        'created': job.created_count,
+        'updated': job.updated_count,
+        'unchanged': job.unchanged_count,
+        'errors': job.error_count,
+    }
+    if final_status == 'completed' and os.path.exists(job.file_path):
+        os.remove(job.file_path)
+
+    result = {
+        'status': final_status,
+        'job_id': job_id,
+        'result': totals,
+        'message': f"Параллельный импорт завершен: {final_status}"
+    }
+    # Итог пишется в статус задачи-координатора, которую опрашивает клиент
+    if job.task_id:
+        record_result(job.task_id, result)
+    return result
+
+
+@shared_task(bind=True, base=TrackedTask, acks_late=True,
+             soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+             time_limit=settings.LONG_TASK_TIME_LIMIT)
+def export_products_task(self, file_path=None, supplier_id=None, job_id=None, file_format=None,
+                         compression='none', since=None):
+    """Задача для экспорта товаров в файл (YAML, CSV или JSON Lines)"""
+    import traceback
+    from django.utils import timezone
+
+    ExportJob = apps.get_model('core', 'ExportJob')
+    if job_id is not None:
+        job = ExportJob.objects.get(id=job_id)
+        file_path, supplier_id = job.file_path, job.supplier_id
+        file_format, compression, since = job.file_format, job.compression, job.since
+        ExportJob.objects.filter(pk=job_id).update(
+            status='running', task_id=self.request.id, started_at=timezone.now()
+        )
+
     try:
         from .import_export import ProductExporter
+        from .tracking import ProgressReporter
         exporter = ProductExporter()
-        result = exporter.export_to_yaml(file_path)
+        reporter = ProgressReporter(self.request.id)
+        if isinstance(since, str):
+            from django.utils.dateparse import parse_datetime
+            since = parse_datetime(since)
+        result = exporter.export_to_file(
+            file_path, supplier_id, file_format, compression, since,
+            on_progress=lambda written: reporter.update(written, message=f"Выгружено записей: {written}")
+        )
+        if job_id is not None:
+            ExportJob.objects.filter(pk=job_id).update(
+                status='completed',
+                file_path=result['file_path'],
+                file_size=result['file_size'],
+                checksum=result['checksum'],
+                total_exported=result['exported'],
+                tombstone_count=result['tombstones'],
+                watermark=result['watermark'],
+                timings=result['timings'],
+                completed_at=timezone.now()
+            )
+        result['since'] = since.isoformat() if since else None
+        result['watermark'] = result['watermark'].isoformat()
         return {
             'status': 'success',
             'result': result,
             'message': 'Экспорт завершен успешно'
         }
     except Exception as e:
+        if job_id is not None:
+            ExportJob.objects.filter(pk=job_id).update(
+                status='failed',
+                error_message=str(e),
+                error_traceback=traceback.format_exc(),
+                completed_at=timezone.now()
+            )
         return {
             'status': 'error',
             'error': str(e),
@@ -137,79 +432,120 @@ def export_products_task(file_path):
         }
 
 
+@shared_task(soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+             time_limit=settings.LONG_TASK_TIME_LIMIT)
+def process_uploaded_images_task(model_label, object_ids):
+    """Миниатюры для изображений, загруженных через админку или API"""
+    from apps.core.images import ImagePipeline
+
+    try:
+        Model = apps.get_model(model_label)
+        with ImagePipeline() as pipeline:
+            processed = pipeline.attach_uploaded(Model.objects.filter(pk__in=object_ids))
+
+        return {
+            'status': 'success',
+            'processed': processed,
+            'stats': pipeline.stats,
+            'message': f'Обработано изображений: {processed}'
+        }
+
+    except Exception as e:
+        return {
+            'status': 'error',
+            'error': str(e),
+            'message': f'Ошибка обработки изображений: {str(e)}'
+        }
+
+
 @shared_task
 def send_notification_email(user_id, subject, message):
     """Отправка уведомления по email"""
+    from apps.core.email_templates import render_email
+    from apps.core.mail import enqueue_email
+
     try:
         User = apps.get_model('users', 'User')
         user = User.objects.get(id=user_id)
 
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=False,
-        )
+        subject, message = render_email('notification', {'user': user, 'subject': subject, 'message': message})
+        enqueue_email(subject, message, [user.email], kind='notification')
 
-        return f"Уведомление отправлено на {user.email}"
+        return f"Уведомление поставлено в очередь для {user.email}"
 
     except Exception as e:
         return f"Ошибка отправки уведомления: {str(e)}"
 
 
+@shared_task(bind=True, base=TrackedTask)
+def fan_out_notifications_task(self, segment, title, message, type='info', object_id=None,
+                               object_type='', supplier_id=None):
+    """Рассылка уведомлений сегменту пользователей: пачки по диапазонам id отдельными задачами"""
+    from .notifications import segment_chunks
+
+    try:
+        chunks = segment_chunks(segment, supplier_id)
+        for start_id, end_id in chunks:
+            create_notifications_task.delay(
+                segment, start_id, end_id, supplier_id=supplier_id, title=title, message=message,
+                type=type, object_id=object_id, object_type=object_type
+            )
+        return {
+            'status': 'success',
+            'segment': segment,
+            'chunks': len(chunks),
+            'message': f"Рассылка уведомлений поставлена в очередь: пачек {len(chunks)}"
+        }
+
+    except Exception as e:
+        return {
+            'status': 'error',
+            'error': str(e),
+            'message': f'Ошибка рассылки уведомлений: {str(e)}'
+        }
+
+
 @shared_task
-def cleanup_old_files_task(days_old=7):
-    """Очистка старых файлов импорта/экспорта"""
-    import os
-    import glob
-    from datetime import datetime, timedelta
+def create_notifications_task(segment, start_id, end_id, supplier_id=None, **payload):
+    """Одна пачка рассылки: уведомления пользователям сегмента с id в [start_id, end_id]"""
+    from .notifications import notify_range
 
     try:
-        import_dir = os.path.join(settings.MEDIA_ROOT, 'imports')
-        export_dir = os.path.join(settings.MEDIA_ROOT, 'exports')
-
-        cutoff_time = datetime.now() - timedelta(days=days_old)
-        deleted_files = []
-        error_files = []
-
-        # Очищаем файлы импорта
-        if os.path.exists(import_dir):
-            for file_path in glob.glob(os.path.join(import_dir, '*.yaml')) + glob.glob(
-                    os.path.join(import_dir, '*.yml')):
-                try:
-                    file_time = datetime.fromtimestamp(os.path.getctime(file_path))
-                    if file_time < cutoff_time:
-                        os.remove(file_path)
-                        deleted_files.append(os.path.basename(file_path))
-                except Exception as e:
-                    error_files.append({
-                        'file': os.path.basename(file_path),
-                        'error': str(e)
-                    })
-
-        # Очищаем файлы экспорта
-        if os.path.exists(export_dir):
-            for file_path in glob.glob(os.path.join(export_dir, '*.yaml')) + glob.glob(
-                    os.path.join(export_dir, '*.yml')):
-                try:
-                    file_time = datetime.fromtimestamp(os.path.getctime(file_path))
-                    if file_time < cutoff_time:
-                        os.remove(file_path)
-                        deleted_files.append(os.path.basename(file_path))
-                except Exception as e:
-                    error_files.append({
-                        'file': os.path.basename(file_path),
-                        'error': str(e)
-                    })
+        created = notify_range(segment, start_id, end_id, supplier_id, **payload)
+        return {
+            'status': 'success',
+            'created': created,
+            'message': f"Создано уведомлений: {created}"
+        }
 
+    except Exception as e:
+        return {
+            'status': 'error',
+            'error': str(e),
+            'message': f'Ошибка создания уведомлений: {str(e)}'
+        }
+
+
+@shared_task(acks_late=True)
+def cleanup_old_files_task(days_old=None, dry_run=False):
+    """Очистка временных файлов, импортов и выгрузок по MEDIA_RETENTION_POLICIES"""
+    from .retention import RetentionSweeper
+
+    try:
+        policies = settings.MEDIA_RETENTION_POLICIES
+        if days_old is not None:
+            # Явный срок заменяет max_age_days во всех правилах
+            policies = {name: {**policy, 'max_age_days': days_old} for name, policy in policies.items()}
+
+        result = RetentionSweeper(policies=policies, dry_run=dry_run).sweep()
+        total = result['total']
         return {
             'status': 'success',
-            'deleted_files': deleted_files,
-            'error_files': error_files,
-            'total_deleted': len(deleted_files),
-            'total_errors': len(error_files),
-            'message': f"Очистка завершена: {len(deleted_files)} файлов удалено, {len(error_files)} ошибок"
+            'directories': {name: stats for name, stats in result.items() if name != 'total'},
+            'total_deleted': total['deleted'],
+            'deleted_bytes': total['deleted_bytes'],
+            'total_errors': total['errors'],
+            'message': f"Очистка завершена: {total['deleted']} файлов удалено, {total['errors']} ошибок"
         }
 
     except Exception as e:
@@ -220,52 +556,35 @@ def cleanup_old_files_task(days_old=7):
         }
 
 
-@shared_task
-def generate_backup_task(backup_type='database'):
-    """Создание резервной копии"""
-    import os
-    from datetime import datetime
+@shared_task(base=TrackedTask,
+             soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+             time_limit=settings.LONG_TASK_TIME_LIMIT)
+def generate_backup_task(backup_type='database', schedule_id=None, record_id=None):
+    """Создание резервной копии (database, media или full) с записью в BackupRecord"""
+    from .backups import release_schedule, run_backup
 
     try:
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_dir = os.path.join(settings.BASE_DIR, 'backups')
-
-        # Создаем директорию для бэкапов если не существует
-        os.makedirs(backup_dir, exist_ok=True)
-
-        if backup_type == 'database':
-            # Бэкап базы данных SQLite
-            db_path = settings.DATABASES['default']['NAME']
-            backup_path = os.path.join(backup_dir, f'db_backup_{timestamp}.sqlite3')
-
-            import shutil
-            shutil.copy2(db_path, backup_path)
-
-            return {
-                'status': 'success',
-                'backup_path': backup_path,
-                'backup_type': 'database',
-                'message': 'Резервная копия базы данных создана успешно'
-            }
-
-        elif backup_type == 'media':
-            # Бэкап медиа файлов
-            media_backup_path = os.path.join(backup_dir, f'media_backup_{timestamp}.zip')
-
-            import zipfile
-            with zipfile.ZipFile(media_backup_path, 'w') as zipf:
-                for root, dirs, files in os.walk(settings.MEDIA_ROOT):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, settings.MEDIA_ROOT)
-                        zipf.write(file_path, arcname)
-
-            return {
-                'status': 'success',
-                'backup_path': media_backup_path,
-                'backup_type': 'media',
-                'message': 'Резервная копия медиа файлов создана успешно'
-            }
+        schedule = None
+        record = None
+        if schedule_id is not None:
+            schedule = apps.get_model('core', 'BackupSchedule').objects.get(pk=schedule_id)
+        if record_id is not None:
+            record = apps.get_model('core', 'BackupRecord').objects.get(pk=record_id)
+        try:
+            record = run_backup(backup_type, schedule=schedule, record=record)
+        finally:
+            if schedule_id is not None:
+                release_schedule(schedule_id)
+
+        return {
+            'status': 'success',
+            'backup_id': record.id,
+            'backup_path': record.file_path,
+            'backup_type': backup_type,
+            'file_size': record.file_size,
+            'duration': record.duration.total_seconds(),
+            'message': 'Резервная копия создана успешно'
+        }
 
     except Exception as e:
         return {
@@ -276,112 +595,158 @@ def generate_backup_task(backup_type='database'):
 
 
 @shared_task
-def update_product_availability():
-    """Периодическая задача для обновления доступности товаров"""
+def run_backup_schedules_task():
+    """Тик планировщика резервных копий: запуск подошедших графиков и удаление лишних копий"""
+    from .backups import dispatch_due_schedules, prune_backups
+
     try:
-        Product = apps.get_model('products', 'Product')
+        dispatched = dispatch_due_schedules()
+        pruned = prune_backups()
+        return {
+            'status': 'success',
+            'dispatched': len(dispatched),
+            'pruned': pruned['records'],
+            'message': f"Запущено копий: {len(dispatched)}, удалено старых: {pruned['records']}"
+        }
+    except Exception as e:
+        return {
+            'status': 'error',
+            'error': str(e),
+            'message': f"Ошибка планировщика резервных копий: {str(e)}"
+        }
 
-        # Находим товары, которые должны быть недоступны
-        products_to_disable = Product.objects.filter(
-            quantity__lt=models.F('min_quantity'),  # ТЕПЕРЬ models импортирован
-            is_available=True
-        )
 
-        disabled_count = products_to_disable.update(is_available=False)
+# Товаров на один шаг сверки доступности (диапазон первичного ключа)
+AVAILABILITY_SWEEP_CHUNK = 10000
+# Сколько id расхождений включать в отчет
+AVAILABILITY_DRIFT_SAMPLE = 20
 
-        # Находим товары, которые должны быть доступны
-        products_to_enable = Product.objects.filter(
-            quantity__gte=models.F('min_quantity'),  # ТЕПЕРЬ models импортирован
-            is_available=False
-        )
 
-        enabled_count = products_to_enable.update(is_available=True)
+@shared_task(acks_late=True,
+             soft_time_limit=settings.LONG_TASK_SOFT_TIME_LIMIT,
+             time_limit=settings.LONG_TASK_TIME_LIMIT)
+def update_product_availability(chunk_size=AVAILABILITY_SWEEP_CHUNK):
+    """
+    Сверка доступности товаров с остатками.
+    Доступность пересчитывается при каждом изменении остатка, поэтому задача
+    только ищет расхождения (ручные UPDATE, сбои) и исправляет их.
+    Таблица обходится диапазонами id: каждый запрос идет по первичному ключу
+    и затрагивает не больше chunk_size строк.
+    """
+    from django.db.models import Max, Min
+    from django.utils import timezone
+
+    try:
+        Product = apps.get_model('products', 'Product')
+
+        bounds = Product.objects.aggregate(first=Min('id'), last=Max('id'))
+        disabled_ids = []
+        enabled_ids = []
+        chunks = 0
+        if bounds['first'] is not None:
+            for start in range(bounds['first'], bounds['last'] + 1, chunk_size):
+                chunk = Product.objects.filter(id__gte=start, id__lt=start + chunk_size)
+                to_disable = list(chunk.filter(is_available=True).filter(
+                    models.Q(quantity__lt=models.F('min_quantity')) | models.Q(is_delisted=True)
+                ).values_list('id', flat=True))
+                to_enable = list(chunk.filter(
+                    is_available=False, is_delisted=False, quantity__gte=models.F('min_quantity')
+                ).values_list('id', flat=True))
+                if to_disable:
+                    Product.objects.filter(id__in=to_disable).update(is_available=False, updated_at=timezone.now())
+                if to_enable:
+                    Product.objects.filter(id__in=to_enable).update(is_available=True, updated_at=timezone.now())
+                disabled_ids.extend(to_disable)
+                enabled_ids.extend(to_enable)
+                chunks += 1
+
+        drift = len(disabled_ids) + len(enabled_ids)
+        if drift:
+            logger.warning(
+                "Расхождение доступности товаров: %s (отключены %s, включены %s)",
+                drift, disabled_ids[:AVAILABILITY_DRIFT_SAMPLE], enabled_ids[:AVAILABILITY_DRIFT_SAMPLE],
+                extra={'system_module': 'products'}
+            )
 
         return {
             'status': 'success',
-            'disabled_count': disabled_count,
-            'enabled_count': enabled_count,
-            'message': f'Обновлено доступности: отключено {disabled_count}, включено {enabled_count} товаров'
+            'chunks': chunks,
+            'drift_count': drift,
+            'disabled_count': len(disabled_ids),
+            'enabled_count': len(enabled_ids),
+            'disabled_sample': disabled_ids[:AVAILABILITY_DRIFT_SAMPLE],
+            'enabled_sample': enabled_ids[:AVAILABILITY_DRIFT_SAMPLE],
+            'message': f'Сверка доступности: расхождений {drift}, отключено {len(disabled_ids)}, '
+                       f'включено {len(enabled_ids)} товаров'
         }
 
     except Exception as e:
         return {
             'status': 'error',
             'error': str(e),
-            'message': f'Ошибка обновления доступности товаров: {str(e)}'
+            'message': f'Ошибка сверки доступности товаров: {str(e)}'
         }
 
 
-@shared_task
-def send_daily_sales_report():
-    """Ежедневный отчет о продажах"""
+@shared_task(acks_late=True)
+def refresh_sales_rollups_task():
+    """Почасовые сводки продаж: только новые часы и часы с измененными заказами"""
+    from apps.orders.rollups import refresh_sales_rollups
+
     try:
-        from datetime import datetime, timedelta
-        Order = apps.get_model('orders', 'Order')
-        OrderItem = apps.get_model('orders', 'OrderItem')
-
-        # Данные за последние 24 часа
-        yesterday = datetime.now() - timedelta(days=1)
-
-        # Статистика заказов
-        total_orders = Order.objects.filter(created_at__gte=yesterday).count()
-        completed_orders = Order.objects.filter(
-            created_at__gte=yesterday,
-            status='delivered'
-        ).count()
-
-        # Сумма продаж
-        total_sales = Order.objects.filter(
-            created_at__gte=yesterday,
-            status__in=['confirmed', 'processing', 'shipped', 'delivered']
-        ).aggregate(total=models.Sum('total_amount'))['total'] or 0
-
-        # Популярные товары
-        popular_products = OrderItem.objects.filter(
-            order__created_at__gte=yesterday
-        ).values(
-            'product__name'
-        ).annotate(
-            total_sold=models.Sum('quantity')
-        ).order_by('-total_sold')[:5]
+        stats = refresh_sales_rollups()
+        return {
+            'status': 'success',
+            'new_hours': stats['new_hours'],
+            'changed_hours': stats['changed_hours'],
+            'rolled_up_until': stats['rolled_up_until'].isoformat(),
+            'message': f"Сводки продаж обновлены: новых часов {stats['new_hours']}, "
+                       f"пересчитано {stats['changed_hours']}"
+        }
+    except Exception as e:
+        return {
+            'status': 'error',
+            'error': str(e),
+            'message': f'Ошибка обновления сводок продаж: {str(e)}'
+        }
 
-        # Формируем отчет
-        subject = f'Ежедневный отчет о продажах - {datetime.now().strftime("%d.%m.%Y")}'
-        message = f"""
-        Ежедневный отчет о продажах:
 
-        Период: последние 24 часа
-        Всего заказов: {total_orders}
-        Завершенных заказов: {completed_orders}
-        Общая сумма продаж: {total_sales} руб.
+@shared_task(base=TrackedTask)
+def send_daily_sales_report():
+    """Ежедневный отчет о продажах"""
+    from apps.core.email_templates import render_email
+
+    try:
+        from datetime import timedelta
+        from django.utils import timezone
+        from apps.orders.rollups import floor_hour, get_watermark, sales_summary
 
-        Популярные товары:
-        """
+        # Последние 24 часа из почасовых сводок в их текущем состоянии. Сводки обновляет
+        # только refresh_sales_rollups_task: параллельный пересчет отсюда гонялся бы с ним за границу
+        end = get_watermark() or floor_hour(timezone.now())
+        summary = sales_summary(end - timedelta(days=1), end)
 
-        for product in popular_products:
-            message += f"\n- {product['product__name']}: {product['total_sold']} шт."
+        # Формируем отчет
+        subject, message = render_email('daily_sales_report', {
+            'date': timezone.localtime(),
+            'total_orders': summary['total_orders'],
+            'completed_orders': summary['completed_orders'],
+            'total_sales': summary['total_sales'],
+            'popular_products': summary['popular_products'],
+        })
 
         # Отправляем администраторам
-        User = apps.get_model('users', 'User')
-        admin_emails = User.objects.filter(
-            user_type='admin',
-            is_active=True
-        ).values_list('email', flat=True)
+        from apps.core.mail import enqueue_email, get_admin_emails
+        admin_emails = get_admin_emails()
 
         if admin_emails:
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=list(admin_emails),
-                fail_silently=False,
-            )
+            enqueue_email(subject, message, admin_emails, kind='daily_report')
 
         return {
             'status': 'success',
-            'total_orders': total_orders,
-            'completed_orders': completed_orders,
-            'total_sales': total_sales,
+            'total_orders': summary['total_orders'],
+            'completed_orders': summary['completed_orders'],
+            'total_sales': summary['total_sales'],
             'message': 'Ежедневный отчет отправлен'
         }
 
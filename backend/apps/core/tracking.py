@@ -0,0 +1,114 @@
+import time
+from celery import Task
+from celery.utils import uuid
+from django.apps import apps
+from django.utils import timezone
+
+
+PROGRESS_INTERVAL = 2.0
+MESSAGE_LENGTH = 500
+
+
+def task_statuses():
+    return apps.get_model('core', 'TaskStatus').objects
+
+
+def mark_running(task_id, name):
+    updated = task_statuses().filter(task_id=task_id).update(
+        status='running', started_at=timezone.now(), updated_at=timezone.now()
+    )
+    # Задачи, запущенные не через apply_async (beat, send_task), записи еще не имеют
+    if not updated:
+        task_statuses().get_or_create(
+            task_id=task_id, defaults={'name': name, 'status': 'running', 'started_at': timezone.now()}
+        )
+
+
+def record_result(task_id, retval):
+    """
+    Итог задачи по ее результату: словарь со status='error' - ошибка,
+    'dispatched' - работа продолжается в других задачах (запись остается running).
+    """
+    status = retval.get('status') if isinstance(retval, dict) else None
+    if status == 'dispatched':
+        task_statuses().filter(task_id=task_id).update(
+            result=retval, message=str(retval.get('message', ''))[:MESSAGE_LENGTH], updated_at=timezone.now()
+        )
+        return
+    failed = status in ('error', 'failed', 'cancelled')
+    fields = {
+        'status': 'failed' if failed else 'success',
+        'result': retval,
+        'error': str(retval.get('error', '')) if failed else '',
+        'finished_at': timezone.now(),
+        'updated_at': timezone.now(),
+    }
+    if isinstance(retval, dict) and retval.get('message'):
+        fields['message'] = str(retval['message'])[:MESSAGE_LENGTH]
+    task_statuses().filter(task_id=task_id).update(**fields)
+
+
+class TrackedTask(Task):
+    """
+    Базовый класс задач со статусом в TaskStatus.
+
+    Запись создается при постановке в очередь (pending), воркер отмечает
+    начало и итог. Статус и прогресс читаются из БД, брокер и хранилище
+    результатов Celery для опроса не нужны.
+    """
+
+    def apply_async(self, args=None, kwargs=None, task_id=None, user_id=None, **options):
+        """user_id - пользователь, которому доступен статус задачи"""
+        task_id = task_id or uuid()
+        task_statuses().get_or_create(task_id=task_id, defaults={'name': self.name, 'user_id': user_id})
+        return super().apply_async(args, kwargs, task_id=task_id, **options)
+
+    def before_start(self, task_id, args, kwargs):
+        mark_running(task_id, self.name)
+
+    def on_success(self, retval, task_id, args, kwargs):
+        record_result(task_id, retval)
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        task_statuses().filter(task_id=task_id).update(
+            status='failed', error=str(exc), finished_at=timezone.now(), updated_at=timezone.now()
+        )
+
+
+class ProgressReporter:
+    """
+    Прогресс задачи в TaskStatus: одна запись UPDATE не чаще раза в interval секунд.
+    Тот же интервал через due() используют другие записи прогресса задачи (ImportJobProgress).
+    """
+
+    def __init__(self, task_id, total=None, interval=PROGRESS_INTERVAL):
+        self.task_id = task_id
+        self.total = total
+        self.interval = interval
+        self.last_write = 0
+
+    def due(self, force=False):
+        """Пора ли писать прогресс; при True отсчет интервала начинается заново"""
+        now = time.monotonic()
+        if not force and now - self.last_write < self.interval:
+            return False
+        self.last_write = now
+        return True
+
+    def update(self, current, total=None, message='', force=False):
+        if self.task_id is None or not self.due(force):
+            return
+        self.write(current, total, message)
+
+    def write(self, current, total=None, message=''):
+        """Запись без проверки интервала"""
+        if self.task_id is None:
+            return
+        if total is not None:
+            self.total = total
+        task_statuses().filter(task_id=self.task_id).update(
+            progress_current=current,
+            progress_total=self.total,
+            message=message[:MESSAGE_LENGTH],
+            updated_at=timezone.now(),
+        )
@@ -4,4 +4,16 @@ from . import views
 urlpatterns = [
     path('import-products/', views.import_products, name='import-products'),
     path('supplier-import/', views.supplier_import_products, name='supplier-import'),
+    path('validate-import/', views.validate_import, name='validate-import'),
+    path('import-jobs/<int:job_id>/', views.import_job_status, name='import-job-status'),
+    path('import-jobs/<int:job_id>/cancel/', views.cancel_import_job, name='import-job-cancel'),
+    path('import-jobs/<int:job_id>/resume/', views.resume_import_job, name='import-job-resume'),
+    path('export-products/', views.export_products, name='export-products'),
+    path('export-jobs/<int:job_id>/', views.export_job_status, name='export-job-status'),
+    path('export-jobs/<int:job_id>/download/', views.download_export, name='export-job-download'),
+    path('tasks/<str:task_id>/', views.task_status, name='task-status'),
+    path('notifications/', views.notifications_list, name='notifications'),
+    path('notifications/unread-count/', views.notifications_unread_count, name='notifications-unread-count'),
+    path('notifications/mark-read/', views.mark_notifications_read, name='notifications-mark-read'),
+    path('notifications/broadcast/', views.broadcast_notifications, name='notifications-broadcast'),
 ]
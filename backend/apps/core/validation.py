@@ -0,0 +1,243 @@
+import time
+from collections import Counter
+from django.apps import apps
+
+from apps.core.import_export import (
+    IMPORT_CHUNK_SIZE, ImportRecordError, chunked, price_limit, record_images, record_sku, to_decimal, to_int
+)
+
+
+MAX_REPORT_ERRORS = 200
+MAX_REPORT_CATEGORIES = 100
+# Загрузки не больше этого размера проверяются синхронно в запросе
+VALIDATE_SYNC_MAX_SIZE = 50 * 1024 * 1024
+
+
+class ImportValidator:
+    """
+    Проверка файла импорта без записи в БД (dry run).
+
+    Файл читается один раз тем же потоковым парсером, что и при импорте.
+    Каждая пачка раскладывается по колонкам, и проверки идут по колонке
+    целиком, а не через full_clean() на каждую строку. Ограничения длины
+    берутся из полей моделей.
+    """
+
+    def __init__(self, supplier_id=None, strict_categories=False, max_errors=MAX_REPORT_ERRORS,
+                 chunk_size=IMPORT_CHUNK_SIZE):
+        Product = apps.get_model('products', 'Product')
+        Category = apps.get_model('products', 'Category')
+        ProductCharacteristic = apps.get_model('products', 'ProductCharacteristic')
+
+        self.supplier_id = int(supplier_id) if supplier_id else None
+        self.strict_categories = strict_categories
+        self.max_errors = max_errors
+        self.chunk_size = chunk_size
+
+        self.price_limit = price_limit()
+        self.limits = {
+            'sku': Product._meta.get_field('sku').max_length,
+            'name': Product._meta.get_field('name').max_length,
+            'category': Category._meta.get_field('name').max_length,
+            'parameter_name': ProductCharacteristic._meta.get_field('name').max_length,
+            'parameter_value': ProductCharacteristic._meta.get_field('value').max_length,
+        }
+
+        self.total = 0
+        self.offset = 0
+        self.error_count = 0
+        self.errors = []
+        self.counts = Counter()
+        self.seen_skus = set()
+        self.unknown_categories = set()
+        self.known_categories = set()
+        self.supplier_ids = {}
+
+    def validate_file(self, file_path, file_format=None):
+        """Проверяет файл и возвращает отчет (список ошибок ограничен max_errors)"""
+        from apps.core.formats import iter_goods
+
+        Category = apps.get_model('products', 'Category')
+        Supplier = apps.get_model('suppliers', 'Supplier')
+
+        started = time.perf_counter()
+        self.known_categories = set(Category.objects.values_list('name', flat=True))
+        if self.supplier_id is None:
+            self.supplier_ids = dict(Supplier.objects.values_list('name', 'id'))
+
+        try:
+            for chunk in chunked(iter_goods(file_path, file_format=file_format), self.chunk_size):
+                self.validate_chunk(chunk)
+        except Exception as e:
+            # Синтаксическая ошибка файла: дальше проверять нечего
+            self.add_error(self.total + 1, None, 'file', f"ошибка разбора файла: {e}")
+
+        return self.report(time.perf_counter() - started)
+
+    def add_error(self, record, sku, field, message):
+        self.error_count += 1
+        self.counts[field] += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'record': record, 'sku': sku, 'field': field, 'error': message})
+
+    def add_errors(self, positions, skus, field, message):
+        for index in positions:
+            self.add_error(self.offset + index + 1, skus[index], field, message)
+
+    def validate_chunk(self, goods):
+        self.offset = self.total
+        self.total += len(goods)
+
+        skus = [record_sku(good) for good in goods]
+        names = [good.get('name') for good in goods]
+        categories = [good.get('category') for good in goods]
+        prices = [to_decimal(good.get('price')) for good in goods]
+        quantities = [good.get('quantity') for good in goods]
+        min_quantities = [good.get('min_quantity') for good in goods]
+        parsed_quantities = [to_int(value) if value not in (None, '') else 0 for value in quantities]
+        parsed_min_quantities = [to_int(value) if value not in (None, '') else 1 for value in min_quantities]
+
+        rows = range(len(goods))
+
+        # Артикулы: отсутствие, длина, повтор в файле
+        self.add_errors([i for i in rows if skus[i] is None], skus, 'sku', "не указан артикул (sku/code/id)")
+        self.add_errors(
+            [i for i in rows if skus[i] is not None and len(skus[i]) > self.limits['sku']],
+            skus, 'sku', f"артикул длиннее {self.limits['sku']} символов"
+        )
+        duplicates = []
+        for i in rows:
+            if skus[i] is None:
+                continue
+            if skus[i] in self.seen_skus:
+                duplicates.append(i)
+            else:
+                self.seen_skus.add(skus[i])
+        self.add_errors(duplicates, skus, 'sku', "артикул повторяется в файле")
+
+        # Название
+        self.add_errors([i for i in rows if not names[i]], skus, 'name', "не указано название")
+        self.add_errors(
+            [i for i in rows if names[i] and len(str(names[i])) > self.limits['name']],
+            skus, 'name', f"название длиннее {self.limits['name']} символов"
+        )
+
+        # Категории
+        self.add_errors([i for i in rows if categories[i] in (None, '')], skus, 'category', "не указана категория")
+        self.add_errors(
+            [i for i in rows if categories[i] not in (None, '') and len(str(categories[i])) > self.limits['category']],
+            skus, 'category', f"название категории длиннее {self.limits['category']} символов"
+        )
+        unknown = {str(name) for name in categories if name not in (None, '')} - self.known_categories
+        if unknown:
+            self.unknown_categories.update(unknown)
+            if self.strict_categories:
+                self.add_errors(
+                    [i for i in rows if categories[i] not in (None, '') and str(categories[i]) in unknown],
+                    skus, 'category', "неизвестная категория"
+                )
+
+        # Цена: число, не отрицательная, помещается в DecimalField
+        self.add_errors([i for i in rows if prices[i] is None], skus, 'price', "цена не является числом")
+        self.add_errors(
+            [i for i in rows if prices[i] is not None and prices[i] < 0], skus, 'price', "отрицательная цена"
+        )
+        self.add_errors(
+            [i for i in rows if prices[i] is not None and abs(prices[i]) >= self.price_limit],
+            skus, 'price', f"цена должна быть меньше {self.price_limit}"
+        )
+
+        # Количества
+        self.add_errors([i for i in rows if parsed_quantities[i] is None], skus, 'quantity', "количество не является целым числом")
+        self.add_errors(
+            [i for i in rows if parsed_quantities[i] is not None and parsed_quantities[i] < 0],
+            skus, 'quantity', "отрицательное количество"
+        )
+        self.add_errors(
+            [i for i in rows if parsed_min_quantities[i] is None or parsed_min_quantities[i] < 0],
+            skus, 'min_quantity', "некорректное минимальное количество"
+        )
+
+        self.validate_parameters(goods, skus)
+        self.validate_images(goods, skus)
+        self.validate_suppliers(goods, skus)
+
+    def validate_parameters(self, goods, skus):
+        name_limit, value_limit = self.limits['parameter_name'], self.limits['parameter_value']
+        invalid, long_names, long_values = [], [], []
+        for i, good in enumerate(goods):
+            parameters = good.get('parameters')
+            if parameters is None:
+                parameters = {
+                    item.get('name'): item.get('value', '')
+                    for item in good.get('characteristics') or [] if isinstance(item, dict)
+                }
+            if not isinstance(parameters, dict):
+                invalid.append(i)
+                continue
+            if any(len(str(name)) > name_limit for name in parameters):
+                long_names.append(i)
+            if any(len(str(value)) > value_limit for value in parameters.values()):
+                long_values.append(i)
+
+        self.add_errors(invalid, skus, 'parameters', "parameters должен быть словарем")
+        self.add_errors(long_names, skus, 'parameters', f"название характеристики длиннее {name_limit} символов")
+        self.add_errors(long_values, skus, 'parameters', f"значение характеристики длиннее {value_limit} символов")
+
+    def validate_images(self, goods, skus):
+        """Пути изображений: внутри IMAGE_IMPORT_ROOT и файл существует (без декодирования)"""
+        from apps.core.images import ImagePipeline
+
+        pipeline = None
+        for i, good in enumerate(goods):
+            if good.get('image') in (None, '') and not good.get('images'):
+                continue
+            try:
+                image, images = record_images(good, skus[i])
+            except ImportRecordError as e:
+                self.add_error(self.offset + i + 1, skus[i], 'images', str(e))
+                continue
+            pipeline = pipeline or ImagePipeline(workers=1)
+            for path in ([image] if image else []) + images:
+                try:
+                    pipeline.resolve_path(path)
+                except ValueError as e:
+                    self.add_error(self.offset + i + 1, skus[i], 'images', str(e))
+
+    def validate_suppliers(self, goods, skus):
+        """Поставщик товара и принадлежность уже существующих артикулов (один запрос на пачку)"""
+        Product = apps.get_model('products', 'Product')
+
+        if self.supplier_id is not None:
+            suppliers = [self.supplier_id] * len(goods)
+        else:
+            suppliers = [self.supplier_ids.get(good.get('supplier')) for good in goods]
+            self.add_errors(
+                [i for i, supplier_id in enumerate(suppliers) if supplier_id is None],
+                skus, 'supplier', "неизвестный поставщик"
+            )
+
+        owners = dict(Product.objects.filter(
+            sku__in=[sku for sku in skus if sku is not None]
+        ).values_list('sku', 'supplier_id'))
+        self.add_errors(
+            [
+                i for i, sku in enumerate(skus)
+                if sku in owners and suppliers[i] is not None and owners[sku] != suppliers[i]
+            ],
+            skus, 'sku', "артикул принадлежит другому поставщику"
+        )
+
+    def report(self, elapsed):
+        unknown_categories = sorted(self.unknown_categories)
+        return {
+            'valid': self.error_count == 0,
+            'total': self.total,
+            'error_count': self.error_count,
+            'errors_by_field': dict(self.counts),
+            'errors': sorted(self.errors, key=lambda error: error['record']),
+            'truncated': self.error_count > len(self.errors),
+            'new_categories': unknown_categories[:MAX_REPORT_CATEGORIES],
+            'new_category_count': len(unknown_categories),
+            'seconds': round(elapsed, 4),
+        }
@@ -3,17 +3,65 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from apps.core.import_export import ProductExporter, ProductImporter  # ← ИЗМЕНИТЕ ИМПОРТ
+from apps.core.models import ExportJob, ImportJob, Notification, TaskStatus
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from apps.core.serializers import (
+    ExportJobCreateSerializer, ExportJobSerializer, ImportJobSerializer, MarkNotificationsReadSerializer,
+    NotificationBroadcastSerializer, NotificationSerializer, TaskStatusSerializer
+)
 import os
+import uuid
+from django.utils import timezone
 from django.conf import settings
 
 
+def save_uploaded_file(file):
+    """Сохраняет загруженный файл во временную директорию под уникальным именем"""
+    file_path = os.path.join(settings.MEDIA_ROOT, 'temp', f"{uuid.uuid4().hex}_{os.path.basename(file.name)}")
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    with open(file_path, 'wb+') as destination:
+        for chunk in file.chunks():
+            destination.write(chunk)
+    return file_path
+
+
+def start_import_job(user, file_path, supplier_id=None, sharded=False, dry_run=False):
+    """Создает ImportJob и ставит импорт (или только проверку файла) в очередь Celery"""
+    from apps.core.tasks import import_products_task, import_products_sharded_task
+
+    job = ImportJob.objects.create(user=user, file_path=file_path, supplier_id=supplier_id, dry_run=dry_run)
+    if sharded:
+        result = import_products_sharded_task.apply_async((job.id,), user_id=user.id)
+    else:
+        result = import_products_task.apply_async(kwargs={'job_id': job.id}, user_id=user.id)
+    ImportJob.objects.filter(pk=job.pk, task_id__isnull=True).update(task_id=result.id)
+    job.refresh_from_db()
+    return job
+
+
+def import_job_response(job, http_status=status.HTTP_202_ACCEPTED):
+    return Response({
+        'detail': 'Импорт поставлен в очередь',
+        'job': ImportJobSerializer(job).data,
+    }, status=http_status)
+
+
+def get_user_import_job(request, job_id):
+    jobs = ImportJob.objects.select_related('user')
+    if not request.user.is_staff:
+        jobs = jobs.filter(user=request.user)
+    return jobs.filter(pk=job_id).first()
+
+
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
 def import_products(request):
     """API для импорта товаров"""
     try:
         file = request.FILES.get('file')
-        supplier_id = request.data.get('supplier_id')
+        supplier_id = request.data.get('supplier_id') or None
+        sharded = str(request.data.get('sharded', '')).lower() in ('1', 'true', 'yes')
 
         if not file:
             return Response(
@@ -21,25 +69,11 @@ def import_products(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Сохраняем временный файл
-        file_path = os.path.join(settings.MEDIA_ROOT, 'temp', file.name)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-        with open(file_path, 'wb+') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
-
-        # Импортируем товары
-        importer = ProductImporter()
-        stats = importer.import_from_file(file_path, supplier_id)
-
-        # Удаляем временный файл
-        os.remove(file_path)
+        # Сохраняем файл и запускаем фоновый импорт
+        file_path = save_uploaded_file(file)
+        job = start_import_job(request.user, file_path, supplier_id, sharded=sharded)
 
-        return Response({
-            'detail': 'Импорт завершен',
-            'stats': stats
-        })
+        return import_job_response(job)
 
     except Exception as e:
         return Response(
@@ -66,28 +100,330 @@ def supplier_import_products(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Сохраняем временный файл
-        file_path = os.path.join(settings.MEDIA_ROOT, 'temp', file.name)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # Импортируем товары для этого поставщика в фоне
+        file_path = save_uploaded_file(file)
+        job = start_import_job(request.user, file_path, request.user.supplier_profile.id)
 
-        with open(file_path, 'wb+') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
+        return import_job_response(job)
+
+    except Exception as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-        # Импортируем товары для этого поставщика
-        importer = ProductImporter()
-        stats = importer.import_from_file(file_path, request.user.supplier_profile.id)
 
-        # Удаляем временный файл
-        os.remove(file_path)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def validate_import(request):
+    """
+    Проверка файла импорта без записи (dry run). Небольшие файлы
+    проверяются сразу, большие - фоновой задачей с отчетом в ImportJob.
+    """
+    from apps.core.serializers import FileUploadSerializer
+    from apps.core.validation import VALIDATE_SYNC_MAX_SIZE, ImportValidator
+
+    if hasattr(request.user, 'supplier_profile'):
+        supplier_id = request.user.supplier_profile.id
+    elif request.user.is_staff:
+        supplier_id = request.data.get('supplier_id') or None
+    else:
+        return Response(
+            {'error': 'Доступно только для поставщиков и администраторов'},
+            status=status.HTTP_403_FORBIDDEN
+        )
 
-        return Response({
-            'detail': 'Импорт завершен',
-            'stats': stats
-        })
+    serializer = FileUploadSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    file = serializer.validated_data['file']
+
+    try:
+        file_path = save_uploaded_file(file)
+        if file.size > VALIDATE_SYNC_MAX_SIZE:
+            job = start_import_job(request.user, file_path, supplier_id, dry_run=True)
+            return Response({
+                'detail': 'Проверка файла поставлена в очередь',
+                'job': ImportJobSerializer(job).data,
+            }, status=status.HTTP_202_ACCEPTED)
+
+        try:
+            report = ImportValidator(supplier_id).validate_file(file_path)
+        finally:
+            os.remove(file_path)
+        return Response(report)
 
     except Exception as e:
         return Response(
             {'error': str(e)},
             status=status.HTTP_400_BAD_REQUEST
         )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def import_job_status(request, job_id):
+    """Статус и прогресс задачи импорта (один запрос к БД по первичному ключу)"""
+    job = get_user_import_job(request, job_id)
+    if job is None:
+        return Response({'error': 'Задача импорта не найдена'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(ImportJobSerializer(job).data)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def cancel_import_job(request, job_id):
+    """Отмена задачи импорта (задача остановится на ближайшей контрольной точке)"""
+    job = get_user_import_job(request, job_id)
+    if job is None:
+        return Response({'error': 'Задача импорта не найдена'}, status=status.HTTP_404_NOT_FOUND)
+
+    ImportJob.objects.filter(pk=job.pk, status__in=['pending', 'running']).update(status='cancelled')
+    job.refresh_from_db()
+    return Response(ImportJobSerializer(job).data)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def resume_import_job(request, job_id):
+    """Возобновление упавшей или отмененной задачи импорта с контрольной точки"""
+    from apps.core.tasks import import_products_task
+
+    job = get_user_import_job(request, job_id)
+    if job is None:
+        return Response({'error': 'Задача импорта не найдена'}, status=status.HTTP_404_NOT_FOUND)
+    if job.status not in ('failed', 'cancelled'):
+        return Response(
+            {'error': f'Нельзя возобновить задачу в статусе {job.status}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not os.path.exists(job.file_path):
+        return Response({'error': 'Файл импорта удален'}, status=status.HTTP_400_BAD_REQUEST)
+
+    ImportJob.objects.filter(pk=job.pk).update(status='pending')
+    result = import_products_task.apply_async(kwargs={'job_id': job.id}, user_id=job.user_id)
+    ImportJob.objects.filter(pk=job.pk, status='pending').update(task_id=result.id)
+    job.refresh_from_db()
+    return import_job_response(job)
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def export_products(request):
+    """API для фонового экспорта товаров (YAML, CSV или JSON Lines)"""
+    from apps.core.tasks import export_products_task
+
+    serializer = ExportJobCreateSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    from apps.core.formats import FORMATS
+
+    file_format = serializer.validated_data['file_format']
+    prefix = 'products_delta' if serializer.validated_data.get('since') else 'products'
+    file_path = serializer.validated_data.get('file_path') or os.path.join(
+        settings.MEDIA_ROOT, 'exports',
+        f"{prefix}_{timezone.now():%Y%m%d_%H%M%S}{FORMATS[file_format].extensions[0]}"
+    )
+    job = ExportJob.objects.create(
+        user=request.user,
+        file_path=file_path,
+        file_format=file_format,
+        compression=serializer.validated_data['compression'],
+        since=serializer.validated_data.get('since'),
+        supplier_id=serializer.validated_data.get('supplier_id')
+    )
+    result = export_products_task.apply_async(kwargs={'job_id': job.id}, user_id=request.user.id)
+    ExportJob.objects.filter(pk=job.pk, task_id__isnull=True).update(task_id=result.id)
+    job.refresh_from_db()
+
+    return Response({
+        'detail': 'Экспорт поставлен в очередь',
+        'job': ExportJobSerializer(job).data,
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_job_status(request, job_id):
+    """Статус задачи экспорта"""
+    job = ExportJob.objects.select_related('user').filter(pk=job_id).first()
+    if job is None:
+        return Response({'error': 'Задача экспорта не найдена'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(ExportJobSerializer(job).data)
+
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+COMPRESSION_CONTENT_TYPES = {
+    'gzip': 'application/gzip',
+    'zstd': 'application/zstd',
+}
+FORMAT_CONTENT_TYPES = {
+    'yaml': 'application/yaml',
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'csv_long': 'text/csv',
+}
+
+
+def parse_range_header(header, size):
+    """
+    Разбирает заголовок Range с одним диапазоном байт.
+    Возвращает (start, end) включительно, None если заголовка нет
+    или он не поддерживается, и False если диапазон невыполним.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start, _, end = header[len('bytes='):].strip().partition('-')
+    try:
+        if start:
+            start = int(start)
+            end = min(int(end), size - 1) if end else size - 1
+        elif end:
+            # bytes=-N: последние N байт
+            start, end = max(size - int(end), 0), size - 1
+        else:
+            return None
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def iter_file_range(file_path, start, length):
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(DOWNLOAD_CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def download_export(request, job_id):
+    """
+    Скачивание файла экспорта. Поддерживаются докачка (Range) и
+    условные запросы (If-None-Match по SHA-256 файла).
+    """
+    job = ExportJob.objects.filter(pk=job_id, status='completed').first()
+    if job is None or not os.path.exists(job.file_path):
+        return Response({'error': 'Файл экспорта не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+    etag = f'"{job.checksum}"' if job.checksum else None
+    if etag and etag in [value.strip() for value in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    size = os.path.getsize(job.file_path)
+    content_type = COMPRESSION_CONTENT_TYPES.get(job.compression) or FORMAT_CONTENT_TYPES.get(
+        job.file_format, 'application/octet-stream'
+    )
+    byte_range = None
+    # If-Range: докачка только если файл не изменился с первой загрузки
+    if etag is None or request.headers.get('If-Range', etag) == etag:
+        byte_range = parse_range_header(request.headers.get('Range'), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(job.file_path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            iter_file_range(job.file_path, start, end - start + 1),
+            status=status.HTTP_206_PARTIAL_CONTENT,
+            content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = f'attachment; filename="{os.path.basename(job.file_path)}"'
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def task_status(request, task_id):
+    """Статус, прогресс и результат фоновой задачи (только из БД, без обращения к брокеру)"""
+    tasks = TaskStatus.objects.all()
+    if not request.user.is_staff:
+        tasks = tasks.filter(user=request.user)
+    task = tasks.filter(task_id=task_id).first()
+    if task is None:
+        return Response({'error': 'Задача не найдена'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(TaskStatusSerializer(task).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def notifications_list(request):
+    """Уведомления текущего пользователя (?is_read=true|false)"""
+    from rest_framework.pagination import PageNumberPagination
+
+    notifications = Notification.objects.filter(user=request.user).select_related('user')
+    is_read = request.query_params.get('is_read')
+    if is_read is not None:
+        notifications = notifications.filter(is_read=is_read.lower() in ('1', 'true', 'yes'))
+
+    paginator = PageNumberPagination()
+    page = paginator.paginate_queryset(notifications, request)
+    return paginator.get_paginated_response(NotificationSerializer(page, many=True).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def notifications_unread_count(request):
+    """Количество непрочитанных уведомлений (счетчик в кеше)"""
+    from apps.core.notifications import unread_count
+
+    return Response({'unread_count': unread_count(request.user.id)})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_notifications_read(request):
+    """Отмечает прочитанными уведомления из списка или все сразу одним UPDATE"""
+    from apps.core.notifications import mark_read, unread_count
+
+    serializer = MarkNotificationsReadSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+
+    updated = mark_read(request.user.id, None if data['mark_all'] else data['notification_ids'])
+    return Response({'updated': updated, 'unread_count': unread_count(request.user.id)})
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def broadcast_notifications(request):
+    """Рассылка уведомления сегменту пользователей через Celery"""
+    from apps.core.tasks import fan_out_notifications_task
+
+    serializer = NotificationBroadcastSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    result = fan_out_notifications_task.apply_async(kwargs=serializer.validated_data, user_id=request.user.id)
+    return Response({
+        'detail': 'Рассылка поставлена в очередь',
+        'task_id': result.id,
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+def metrics(request):
+    """Метрики всех процессов в текстовом формате Prometheus (сборщик с разрешенного адреса или администратор)"""
+    from django.http import HttpResponseForbidden
+    from apps.core.metrics import export_metrics
+
+    user = getattr(request, 'user', None)
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS['allowed_ips'] and not (user and user.is_staff):
+        return HttpResponseForbidden('Доступ запрещен')
+    return HttpResponse(export_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
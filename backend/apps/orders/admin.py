@@ -1,5 +1,5 @@
 from django.contrib import admin
-from apps.orders.models import Order, OrderItem
+from apps.orders.models import Order, OrderItem, ProductSalesHourly, SalesHourly
 
 
 class OrderItemInline(admin.TabularInline):
@@ -22,3 +22,17 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'product', 'quantity', 'price', 'total_price']
     list_filter = ['order__status']
     search_fields = ['product__name', 'order__user__username']
+
+
+@admin.register(SalesHourly)
+class SalesHourlyAdmin(admin.ModelAdmin):
+    list_display = ['hour', 'status', 'orders_count', 'revenue']
+    list_filter = ['status']
+    date_hierarchy = 'hour'
+
+
+@admin.register(ProductSalesHourly)
+class ProductSalesHourlyAdmin(admin.ModelAdmin):
+    list_display = ['hour', 'product', 'units', 'revenue']
+    raw_id_fields = ['product']
+    date_hierarchy = 'hour'
@@ -32,8 +32,9 @@ class Order(models.Model):
     )
     shipping_address = models.TextField(verbose_name=_('Адрес доставки'))
     notes = models.TextField(blank=True, verbose_name=_('Примечания'))
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Дата создания'))
-    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Дата обновления'))
+    # По датам создания и изменения строятся почасовые сводки продаж
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name=_('Дата создания'))
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name=_('Дата обновления'))
 
     class Meta:
         verbose_name = _('Заказ')
@@ -71,3 +72,42 @@ class OrderItem(models.Model):
     @property
     def total_price(self):
         return self.quantity * self.price
+
+
+class SalesHourly(models.Model):
+    """Почасовая сводка заказов по статусам (час - начало часа в UTC)"""
+    hour = models.DateTimeField(verbose_name=_('Час'))
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name=_('Статус'))
+    orders_count = models.PositiveIntegerField(default=0, verbose_name=_('Заказов'))
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name=_('Сумма'))
+
+    class Meta:
+        verbose_name = _('Продажи за час')
+        verbose_name_plural = _('Продажи по часам')
+        db_table = 'sales_hourly'
+        unique_together = ['hour', 'status']
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.status}: {self.orders_count}"
+
+
+class ProductSalesHourly(models.Model):
+    """Почасовые продажи товара (все статусы, кроме отмененных)"""
+    hour = models.DateTimeField(db_index=True, verbose_name=_('Час'))
+    product = models.ForeignKey(
+        'products.Product',
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('Товар')
+    )
+    units = models.PositiveIntegerField(default=0, verbose_name=_('Продано, шт.'))
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name=_('Сумма'))
+
+    class Meta:
+        verbose_name = _('Продажи товара за час')
+        verbose_name_plural = _('Продажи товаров по часам')
+        db_table = 'product_sales_hourly'
+        unique_together = ['hour', 'product']
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.product_id}: {self.units}"
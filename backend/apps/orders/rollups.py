@@ -0,0 +1,183 @@
+import datetime
+from datetime import timedelta
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+
+# Статусы, которые считаются продажей
+SALES_STATUSES = ['confirmed', 'processing', 'shipped', 'delivered']
+# Граница уже свернутых часов хранится в SystemSettings
+WATERMARK_KEY = 'sales_rollup_watermark'
+HOUR = timedelta(hours=1)
+# Часов на один проход: первая сборка длинной истории идет частями
+ROLLUP_CHUNK_HOURS = 24 * 7
+# Заказ, созданный до границы часа, мог зафиксироваться уже после прохода
+LATE_COMMIT_WINDOW = timedelta(minutes=10)
+
+
+def floor_hour(value):
+    """Начало часа в UTC"""
+    return value.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def get_watermark():
+    SystemSettings = apps.get_model('core', 'SystemSettings')
+    value = SystemSettings.objects.filter(key=WATERMARK_KEY).values_list('value', flat=True).first()
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+def set_watermark(hour):
+    SystemSettings = apps.get_model('core', 'SystemSettings')
+    SystemSettings.objects.update_or_create(
+        key=WATERMARK_KEY,
+        defaults={'value': hour.isoformat(), 'description': 'Почасовые сводки продаж построены до этого часа'}
+    )
+
+
+def rebuild_range(start, end):
+    """Пересчитывает сводки за часы [start, end) двумя группирующими запросами"""
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    SalesHourly = apps.get_model('orders', 'SalesHourly')
+    ProductSalesHourly = apps.get_model('orders', 'ProductSalesHourly')
+
+    # order_by() сбрасывает сортировку модели, иначе она попадет в GROUP BY
+    order_rows = Order.objects.filter(
+        created_at__gte=start, created_at__lt=end
+    ).annotate(
+        hour=TruncHour('created_at', tzinfo=datetime.timezone.utc)
+    ).values('hour', 'status').annotate(
+        orders_count=models.Count('id'),
+        revenue=models.Sum('total_amount'),
+    ).order_by()
+    product_rows = OrderItem.objects.filter(
+        order__created_at__gte=start, order__created_at__lt=end
+    ).exclude(
+        order__status='cancelled'
+    ).annotate(
+        hour=TruncHour('order__created_at', tzinfo=datetime.timezone.utc)
+    ).values('hour', 'product_id').annotate(
+        units=models.Sum('quantity'),
+        revenue=models.Sum(
+            models.F('quantity') * models.F('price'),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2)
+        ),
+    ).order_by()
+
+    sales = [SalesHourly(**row) for row in order_rows]
+    products = [ProductSalesHourly(**row) for row in product_rows]
+    with transaction.atomic():
+        SalesHourly.objects.filter(hour__gte=start, hour__lt=end).delete()
+        ProductSalesHourly.objects.filter(hour__gte=start, hour__lt=end).delete()
+        SalesHourly.objects.bulk_create(sales, batch_size=500)
+        ProductSalesHourly.objects.bulk_create(products, batch_size=500)
+    return len(sales), len(products)
+
+
+def hour_ranges(hours):
+    """Отсортированные часы -> непрерывные диапазоны [start, end)"""
+    ranges = []
+    for hour in sorted(hours):
+        if ranges and ranges[-1][1] == hour:
+            ranges[-1][1] = hour + HOUR
+        else:
+            ranges.append([hour, hour + HOUR])
+    return ranges
+
+
+def refresh_sales_rollups(now=None):
+    """
+    Досчитывает сводки за закрытые часы после границы и пересчитывает
+    прошлые часы, заказы которых изменились (смена статуса) после прошлого прохода.
+    """
+    Order = apps.get_model('orders', 'Order')
+
+    boundary = floor_hour(now or timezone.now())
+    watermark = stored = get_watermark()
+    stats = {'new_hours': 0, 'changed_hours': 0, 'sales_rows': 0, 'product_rows': 0}
+
+    ranges = []
+    if watermark is None:
+        first = Order.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        watermark = floor_hour(first) if first else boundary
+    else:
+        changed = set(
+            Order.objects.filter(
+                updated_at__gte=watermark - LATE_COMMIT_WINDOW, created_at__lt=watermark
+            ).annotate(
+                hour=TruncHour('created_at', tzinfo=datetime.timezone.utc)
+            ).values_list('hour', flat=True).order_by().distinct()
+        )
+        stats['changed_hours'] = len(changed)
+        ranges.extend(hour_ranges(changed))
+
+    # Сначала прошлые часы: граница сдвигается только после них
+    for start, end in ranges:
+        sales_rows, product_rows = rebuild_range(start, end)
+        stats['sales_rows'] += sales_rows
+        stats['product_rows'] += product_rows
+
+    start = watermark
+    while start < boundary:
+        end = min(start + ROLLUP_CHUNK_HOURS * HOUR, boundary)
+        sales_rows, product_rows = rebuild_range(start, end)
+        stats['sales_rows'] += sales_rows
+        stats['product_rows'] += product_rows
+        stats['new_hours'] += int((end - start) / HOUR)
+        set_watermark(end)
+        start = end
+
+    if stored is None and watermark >= boundary:
+        # Заказов еще нет: сводки начнутся с текущего часа
+        set_watermark(boundary)
+    stats['rolled_up_until'] = boundary
+    return stats
+
+
+def sales_summary(start, end, top=5):
+    """Итоги за [start, end) по сводкам: заказы и суммы по статусам, популярные товары"""
+    SalesHourly = apps.get_model('orders', 'SalesHourly')
+    ProductSalesHourly = apps.get_model('orders', 'ProductSalesHourly')
+
+    by_status = {
+        row['status']: {'orders': row['orders'], 'revenue': row['revenue']}
+        for row in SalesHourly.objects.filter(hour__gte=start, hour__lt=end).values('status').annotate(
+            orders=models.Sum('orders_count'), revenue=models.Sum('revenue')
+        ).order_by()
+    }
+    popular_products = list(
+        ProductSalesHourly.objects.filter(hour__gte=start, hour__lt=end).values(
+            'product_id', 'product__name'
+        ).annotate(
+            total_sold=models.Sum('units'), revenue=models.Sum('revenue')
+        ).order_by('-total_sold', 'product_id')[:top]
+    )
+    return {
+        'total_orders': sum(value['orders'] for value in by_status.values()),
+        'completed_orders': by_status.get('delivered', {}).get('orders', 0),
+        'total_sales': sum(
+            (value['revenue'] for status, value in by_status.items() if status in SALES_STATUSES), 0
+        ),
+        'by_status': by_status,
+        'popular_products': popular_products,
+    }
+
+
+def daily_series(start, end):
+    """Заказы и продажи по дням (в текущем часовом поясе) за [start, end)"""
+    SalesHourly = apps.get_model('orders', 'SalesHourly')
+
+    days = {}
+    for row in SalesHourly.objects.filter(hour__gte=start, hour__lt=end).annotate(
+        day=TruncDate('hour', tzinfo=timezone.get_current_timezone())
+    ).values('day', 'status').annotate(
+        orders=models.Sum('orders_count'), revenue=models.Sum('revenue')
+    ).order_by('day'):
+        day = days.setdefault(row['day'], {'date': row['day'], 'orders': 0, 'sales': 0, 'by_status': {}})
+        day['orders'] += row['orders']
+        if row['status'] in SALES_STATUSES:
+            day['sales'] += row['revenue']
+        day['by_status'][row['status']] = {'orders': row['orders'], 'revenue': row['revenue']}
+    return list(days.values())
@@ -8,5 +8,6 @@ router = DefaultRouter()
 router.register(r'orders', views.OrderViewSet, basename='order')
 
 urlpatterns = [
+    path('sales-dashboard/', views.sales_dashboard, name='sales-dashboard'),
     path('', include(router.urls)),
 ]
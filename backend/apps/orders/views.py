@@ -1,12 +1,18 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from apps.orders.models import Order, OrderItem
+from apps.products.models import Product, availability_expression
 from apps.orders.serializers import (
     OrderSerializer, OrderCreateSerializer, OrderStatusUpdateSerializer
 )
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class OrderViewSet(viewsets.ModelViewSet):
@@ -67,9 +73,17 @@ class OrderViewSet(viewsets.ModelViewSet):
                     )
                     total_amount += order_item.total_price
 
-                    # Обновляем количество товара на складе
-                    cart_item.product.quantity -= cart_item.quantity
-                    cart_item.product.save()
+                    # Списываем остаток и пересчитываем доступность одним UPDATE;
+                    # условие на остаток не дает продать больше, чем есть, при параллельных заказах
+                    updated = Product.objects.filter(
+                        pk=cart_item.product_id, quantity__gte=cart_item.quantity
+                    ).update(
+                        quantity=F('quantity') - cart_item.quantity,
+                        is_available=availability_expression(cart_item.quantity),
+                        updated_at=timezone.now(),
+                    )
+                    if not updated:
+                        raise Exception(f"Недостаточно товара на складе: {cart_item.product.name}")
 
                 # Обновляем общую сумму заказа
                 order.total_amount = total_amount
@@ -78,8 +92,10 @@ class OrderViewSet(viewsets.ModelViewSet):
                 # Очищаем корзину
                 cart.items.all().delete()
 
-                # Отправляем email уведомления (асинхронно через Celery)
-                self._send_order_emails_async(order.id)
+                # Отправляем email уведомления (асинхронно через Celery) после фиксации заказа:
+                # иначе задача может прочитать заказ раньше, чем он появится в базе
+                order_id = order.id
+                transaction.on_commit(lambda: self._send_order_emails_async(order_id))
 
                 serializer = OrderSerializer(order)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -103,7 +119,8 @@ class OrderViewSet(viewsets.ModelViewSet):
             send_order_to_admin.delay(order_id)
         except Exception as e:
             # Логируем ошибку, но не прерываем создание заказа
-            print(f"Ошибка отправки email: {e}")
+            logger.error("Ошибка отправки email по заказу #%s: %s", order_id, e, exc_info=True,
+                         extra={'system_module': 'email', 'object_id': order_id, 'object_type': 'orders.Order'})
 
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
@@ -127,29 +144,16 @@ class OrderViewSet(viewsets.ModelViewSet):
     def _send_status_update_email(self, order):
         """Отправка email об изменении статуса заказа"""
         try:
-            from django.core.mail import send_mail
-            from django.conf import settings
-
-            subject = f'Статус заказа #{order.id} изменен'
-            message = f"""
-            Статус вашего заказа #{order.id} изменен на: {order.get_status_display()}
-
-            Текущий статус: {order.get_status_display()}
-            Сумма заказа: {order.total_amount} руб.
-            Адрес доставки: {order.shipping_address}
-
-            Спасибо, что выбрали наш магазин!
-            """
-
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [order.user.email],
-                fail_silently=True
-            )
+            from apps.core.email_templates import render_email
+            from apps.core.mail import enqueue_email
+
+            subject, message = render_email('order_status_update', {
+                'order': order, 'status': order.get_status_display()
+            })
+            enqueue_email(subject, message, [order.user.email], kind='order_status_update')
         except Exception as e:
-            print(f"Ошибка отправки email о смене статуса: {e}")
+            logger.error("Ошибка отправки email о смене статуса заказа #%s: %s", order.id, e, exc_info=True,
+                         extra={'system_module': 'email', 'object': order, 'user': order.user_id})
 
     @action(detail=False, methods=['get'])
     def stats(self, request):
@@ -164,3 +168,36 @@ class OrderViewSet(viewsets.ModelViewSet):
         }
 
         return Response(stats)
+
+
+# Максимальный период панели продаж (дней)
+DASHBOARD_MAX_DAYS = 366
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales_dashboard(request):
+    """Панель продаж по почасовым сводкам: ряд по дням, итоги и популярные товары"""
+    from datetime import timedelta
+    from apps.orders.rollups import daily_series, floor_hour, get_watermark, sales_summary
+
+    try:
+        days = min(max(int(request.query_params.get('days', 30)), 1), DASHBOARD_MAX_DAYS)
+    except ValueError:
+        return Response({'error': 'days должен быть числом'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Сводки доступны до последнего обработанного часа
+    end = get_watermark() or floor_hour(timezone.now())
+    start = end - timedelta(days=days)
+    summary = sales_summary(start, end, top=10)
+    return Response({
+        'start': start,
+        'end': end,
+        'days': days,
+        'total_orders': summary['total_orders'],
+        'completed_orders': summary['completed_orders'],
+        'total_sales': summary['total_sales'],
+        'by_status': summary['by_status'],
+        'popular_products': summary['popular_products'],
+        'series': daily_series(start, end),
+    })
@@ -1,6 +1,6 @@
 # apps/products/admin.py
 from django.contrib import admin
-from apps.products.models import Category, Product, ProductCharacteristic
+from apps.products.models import Category, ImageAsset, Product, ProductCharacteristic
 # УБРАТЬ ProductImage и ProductReview ↑
 
 @admin.register(Category)
@@ -9,14 +9,24 @@ class CategoryAdmin(admin.ModelAdmin):
     list_filter = ['is_active', 'parent']
     search_fields = ['name']
     prepopulated_fields = {'slug': ['name']}
+    raw_id_fields = ['image_asset']
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'supplier', 'price', 'is_available']
-    list_filter = ['category', 'supplier', 'is_available']
+    list_display = ['name', 'category', 'supplier', 'price', 'is_available', 'is_delisted']
+    list_filter = ['category', 'supplier', 'is_available', 'is_delisted']
     search_fields = ['name', 'sku']
+    raw_id_fields = ['image_asset']
+    # Доступность вычисляется из остатка при сохранении; снять товар с продажи - флаг is_delisted
+    readonly_fields = ['is_available']
 
 @admin.register(ProductCharacteristic)
 class ProductCharacteristicAdmin(admin.ModelAdmin):
     list_display = ['product', 'name', 'value']
     list_filter = ['product']
+
+@admin.register(ImageAsset)
+class ImageAssetAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'original', 'width', 'height', 'file_size', 'created_at']
+    search_fields = ['sha256']
+    readonly_fields = ['sha256', 'original', 'width', 'height', 'file_size', 'thumbnails', 'created_at']
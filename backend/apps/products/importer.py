@@ -1,19 +1,99 @@
+import hashlib
+import json
+import time
+from contextlib import contextmanager
+from decimal import Decimal
 
 import yaml
 from django.core.files import File
-from .models import Product, Category, ProductCharacteristic
+from django.db import transaction
+from django.utils import timezone
+from .models import Product, Category, ProductCharacteristic, is_stock_available
+
+try:
+    from yaml import CSafeLoader as YAMLLoader
+except ImportError:
+    from yaml import SafeLoader as YAMLLoader
+
+
+BULK_BATCH_SIZE = 500
+
+
+def compute_content_hash(product_data, category_name, with_images=True):
+    """
+    Хеш импортируемых полей и характеристик товара из файла поставщика.
+    with_images=False - для импорта, который не записывает изображения: иначе хеш
+    совпал бы у товара, картинки которого так и не были загружены.
+    """
+    payload = {
+        'name': product_data['name'],
+        'category': category_name,
+        'price': str(Decimal(str(product_data['price'])).normalize()),
+        'quantity': int(product_data.get('quantity', 0)),
+        'description': product_data.get('description', ''),
+        'parameters': sorted(
+            (str(name), str(value))
+            for name, value in (product_data.get('parameters') or {}).items()
+        ),
+    }
+    if product_data.get('min_quantity') is not None:
+        payload['min_quantity'] = int(product_data['min_quantity'])
+    # Пути изображений входят в хеш, только если указаны: хеши товаров без картинок не меняются
+    if with_images and product_data.get('image'):
+        payload['image'] = str(product_data['image'])
+    if with_images and product_data.get('images'):
+        payload['images'] = product_data['images']
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
 
 
 class ProductImporter:
-    def __init__(self, supplier):
+    def __init__(self, supplier, deactivate_missing=False, bulk=False):
         self.supplier = supplier
+        self.deactivate_missing = deactivate_missing
+        # bulk=True: сравнение в памяти и пакетная запись в одной транзакции
+        self.bulk = bulk
+        self.stats = {
+            'created': 0,
+            'changed': 0,
+            'unchanged': 0,
+            'removed': 0,
+            'errors': 0,
+        }
+        self.timings = {}
+        # sku -> content_hash товаров поставщика, загруженных одним запросом
+        self.existing_hashes = {}
+        self.seen_skus = set()
+
+    @contextmanager
+    def phase(self, name):
+        """Замер времени этапа импорта"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(self.timings.get(name, 0) + time.perf_counter() - started, 4)
 
     def import_from_yaml(self, yaml_file_path):
-        with open(yaml_file_path, 'r', encoding='utf-8') as file:
-            data = yaml.safe_load(file)
+        with self.phase('parse'):
+            with open(yaml_file_path, 'r', encoding='utf-8') as file:
+                data = yaml.load(file, Loader=YAMLLoader) or {}
+
+        if self.bulk:
+            self.import_bulk(data)
+        else:
+            self.existing_hashes = dict(
+                Product.objects.filter(supplier=self.supplier).values_list('sku', 'content_hash')
+            )
+
+            for category_data in data.get('categories', []):
+                self.import_category(category_data)
 
-        for category_data in data.get('categories', []):
-            self.import_category(category_data)
+            if self.deactivate_missing:
+                self.deactivate_missing_products()
+
+        self.stats['timings'] = self.timings
+        return self.stats
 
     def import_category(self, category_data):
         category, created = Category.objects.get_or_create(
@@ -25,22 +105,197 @@ class ProductImporter:
             self.import_product(product_data, category)
 
     def import_product(self, product_data, category):
+        sku = str(product_data['code'])
+        self.seen_skus.add(sku)
+
+        # Изображения этот импорт не записывает, поэтому и в хеш они не входят
+        content_hash = compute_content_hash(product_data, category.name, with_images=False)
+        if self.existing_hashes.get(sku) == content_hash:
+            self.stats['unchanged'] += 1
+            return
+
+        defaults = {
+            'name': product_data['name'],
+            'category': category,
+            'price': product_data['price'],
+            'quantity': product_data.get('quantity', 0),
+            'description': product_data.get('description', ''),
+            'content_hash': content_hash,
+        }
+        if product_data.get('min_quantity') is not None:
+            defaults['min_quantity'] = int(product_data['min_quantity'])
         product, created = Product.objects.update_or_create(
-            sku=product_data['code'],
+            sku=sku,
             supplier=self.supplier,
-            defaults={
-                'name': product_data['name'],
-                'category': category,
-                'price': product_data['price'],
-                'quantity': product_data.get('quantity', 0),
-                'description': product_data.get('description', ''),
-            }
+            defaults=defaults
         )
+        self.stats['created' if created else 'changed'] += 1
 
         # Характеристики товара
-        for param_name, param_value in product_data.get('parameters', {}).items():
+        parameters = product_data.get('parameters') or {}
+        for param_name, param_value in parameters.items():
             ProductCharacteristic.objects.update_or_create(
                 product=product,
                 name=param_name,
                 defaults={'value': param_value}
-            )
\ No newline at end of file
+            )
+        if not created:
+            product.characteristics.exclude(name__in=list(parameters)).delete()
+
+    def deactivate_missing_products(self):
+        """Снимает с продажи товары поставщика, отсутствующие в файле (одним UPDATE)"""
+        missing_skus = set(self.existing_hashes) - self.seen_skus
+        if not missing_skus:
+            return
+
+        # Остаток обнуляется, чтобы периодический пересчет доступности не вернул товар в продажу;
+        # хеш сбрасывается, чтобы товар, снова появившийся в файле, не был пропущен как неизмененный
+        self.stats['removed'] = Product.objects.filter(
+            supplier=self.supplier,
+            sku__in=missing_skus,
+            is_available=True
+        ).update(is_available=False, quantity=0, content_hash='', updated_at=timezone.now())
+
+    def import_bulk(self, data):
+        """Пакетный импорт: предзагрузка справочников, сравнение в памяти, пакетная запись"""
+        with self.phase('preload'):
+            existing = {
+                sku: (product_id, content_hash, min_quantity, is_delisted)
+                for sku, product_id, content_hash, min_quantity, is_delisted in Product.objects.filter(
+                    supplier=self.supplier
+                ).values_list('sku', 'id', 'content_hash', 'min_quantity', 'is_delisted')
+            }
+            self.existing_hashes = {sku: values[1] for sku, values in existing.items()}
+            characteristics = {
+                (product_id, name): (char_id, value)
+                for char_id, product_id, name, value in ProductCharacteristic.objects.filter(
+                    product__supplier=self.supplier
+                ).values_list('id', 'product_id', 'name', 'value')
+            }
+            category_ids = {}
+            for category_id, name in Category.objects.order_by('id').values_list('id', 'name'):
+                category_ids.setdefault(name, category_id)
+
+        with self.phase('diff'):
+            goods = {}
+            # Новые категории создаются в транзакции записи вместе с товарами
+            new_categories = {}
+            for category_data in data.get('categories', []):
+                name = category_data['name']
+                if name not in category_ids:
+                    new_categories.setdefault(name, category_data.get('description', ''))
+                for product_data in category_data.get('goods', []):
+                    # Повтор артикула в файле: побеждает последнее вхождение
+                    goods[str(product_data['code'])] = (product_data, name)
+            self.seen_skus = set(goods)
+
+            # Артикул уникален глобально: товары других поставщиков не трогаем
+            new_skus = [sku for sku in goods if sku not in existing]
+            foreign_skus = set()
+            for start in range(0, len(new_skus), BULK_BATCH_SIZE):
+                foreign_skus.update(
+                    Product.objects.filter(sku__in=new_skus[start:start + BULK_BATCH_SIZE])
+                    .exclude(supplier=self.supplier).values_list('sku', flat=True)
+                )
+            self.stats['errors'] += len(foreign_skus)
+
+            to_create = []
+            to_update = []
+            parameters = {}
+            # sku -> название категории для товаров, чья категория еще не создана
+            pending_categories = {}
+            for sku, (product_data, category_name) in goods.items():
+                if sku in foreign_skus:
+                    continue
+                content_hash = compute_content_hash(product_data, category_name, with_images=False)
+                product_id, current_hash, min_quantity, is_delisted = existing.get(sku, (None, None, 1, False))
+                if current_hash == content_hash:
+                    self.stats['unchanged'] += 1
+                    continue
+                if product_data.get('min_quantity') is not None:
+                    min_quantity = int(product_data['min_quantity'])
+
+                product = Product(
+                    pk=product_id,
+                    sku=sku,
+                    supplier=self.supplier,
+                    name=product_data['name'],
+                    category_id=category_ids.get(category_name),
+                    price=product_data['price'],
+                    quantity=product_data.get('quantity', 0),
+                    min_quantity=min_quantity,
+                    # bulk_create/bulk_update не вызывают save(): доступность считается здесь
+                    is_available=is_stock_available(int(product_data.get('quantity', 0)), min_quantity, is_delisted),
+                    description=product_data.get('description', ''),
+                    content_hash=content_hash,
+                )
+                (to_update if product_id else to_create).append(product)
+                if product.category_id is None:
+                    pending_categories[sku] = category_name
+                parameters[sku] = {
+                    str(name): str(value)
+                    for name, value in (product_data.get('parameters') or {}).items()
+                }
+
+        with transaction.atomic():
+            if new_categories:
+                with self.phase('write_categories'):
+                    # Поштучно: slug категории формируется в save(), новых категорий в файле единицы
+                    for name, description in new_categories.items():
+                        category_ids[name] = Category.objects.create(name=name, description=description).id
+                    for product in to_create + to_update:
+                        if product.sku in pending_categories:
+                            product.category_id = category_ids[pending_categories[product.sku]]
+
+            with self.phase('write_products'):
+                # Метка изменения - в момент записи: по ней инкрементальный экспорт ищет изменения
+                now = timezone.now()
+                for product in to_create + to_update:
+                    product.updated_at = now
+                Product.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+                Product.objects.bulk_update(to_update, [
+                    'name', 'category', 'price', 'quantity', 'min_quantity', 'is_available', 'description',
+                    'content_hash', 'updated_at'
+                ], batch_size=BULK_BATCH_SIZE)
+                self.stats['created'] = len(to_create)
+                self.stats['changed'] = len(to_update)
+
+                product_ids = {product.sku: product.pk for product in to_create + to_update}
+                missing_ids = [sku for sku, product_id in product_ids.items() if product_id is None]
+                if missing_ids:
+                    # bulk_create не вернул id (СУБД без RETURNING)
+                    product_ids.update(
+                        Product.objects.filter(sku__in=missing_ids).values_list('sku', 'id')
+                    )
+
+            with self.phase('write_characteristics'):
+                self.flush_characteristics(parameters, product_ids, characteristics)
+
+            if self.deactivate_missing:
+                with self.phase('deactivate'):
+                    self.deactivate_missing_products()
+
+    def flush_characteristics(self, parameters, product_ids, characteristics):
+        """Пакетные вставки/обновления/удаления характеристик по разнице с БД"""
+        to_create = []
+        to_update = []
+        for sku, params in parameters.items():
+            product_id = product_ids[sku]
+            for name, value in params.items():
+                current = characteristics.pop((product_id, name), None)
+                if current is None:
+                    to_create.append(ProductCharacteristic(product_id=product_id, name=name, value=value))
+                elif current[1] != value:
+                    to_update.append(ProductCharacteristic(pk=current[0], value=value))
+
+        # Оставшиеся в карте характеристики измененных товаров отсутствуют в файле
+        changed_ids = set(product_ids.values())
+        to_delete = [
+            char_id for (product_id, name), (char_id, value) in characteristics.items()
+            if product_id in changed_ids
+        ]
+
+        ProductCharacteristic.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+        ProductCharacteristic.objects.bulk_update(to_update, ['value'], batch_size=BULK_BATCH_SIZE)
+        for start in range(0, len(to_delete), BULK_BATCH_SIZE):
+            ProductCharacteristic.objects.filter(id__in=to_delete[start:start + BULK_BATCH_SIZE]).delete()
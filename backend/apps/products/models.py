@@ -1,8 +1,77 @@
+from datetime import timedelta
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.urls import reverse
 from django.core.validators import MinValueValidator
 from django.utils import timezone
+from django.utils.text import slugify
+
+
+# Сколько товар считается новым
+NEW_PRODUCT_PERIOD = timedelta(days=30)
+
+
+def is_stock_available(quantity, min_quantity, delisted=False):
+    """Товар доступен для заказа, пока остаток не меньше минимального заказа и его не сняли вручную"""
+    return not delisted and quantity >= min_quantity
+
+
+def availability_expression(decrease=0):
+    """
+    is_available для UPDATE, меняющего остаток: вычисляется в том же запросе
+    по остатку после списания decrease единиц.
+    """
+    return models.Case(
+        models.When(
+            is_delisted=False, quantity__gte=models.F('min_quantity') + decrease, then=models.Value(True)
+        ),
+        default=models.Value(False),
+        output_field=models.BooleanField(),
+    )
+
+
+def build_category_slug(name):
+    """Slug категории по названию (с суффиксом при совпадении)"""
+    base = slugify(name, allow_unicode=True)[:240] or 'category'
+    slug = base
+    suffix = 1
+    while Category.objects.filter(slug=slug).exists():
+        suffix += 1
+        slug = f"{base}-{suffix}"
+    return slug
+
+
+class ImageAsset(models.Model):
+    """Изображение, сохраненное один раз по хешу содержимого, и его миниатюры"""
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name=_('SHA-256'))
+    original = models.ImageField(upload_to='images/', max_length=255, verbose_name=_('Оригинал'))
+    width = models.PositiveIntegerField(default=0, verbose_name=_('Ширина'))
+    height = models.PositiveIntegerField(default=0, verbose_name=_('Высота'))
+    file_size = models.PositiveBigIntegerField(default=0, verbose_name=_('Размер оригинала (байт)'))
+    # {'small': {'webp': 'thumbnails/..../small.webp', 'jpeg': '...'}, ...}
+    thumbnails = models.JSONField(default=dict, blank=True, verbose_name=_('Миниатюры'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Дата создания'))
+
+    class Meta:
+        verbose_name = _('Файл изображения')
+        verbose_name_plural = _('Файлы изображений')
+        db_table = 'image_assets'
+
+    def __str__(self):
+        return self.original.name
+
+    def thumbnail_urls(self):
+        """URL миниатюр по размерам и форматам"""
+        from django.core.files.storage import default_storage
+        return {
+            size: {image_format: default_storage.url(path) for image_format, path in formats.items()}
+            for size, formats in self.thumbnails.items()
+        }
+
+    def thumbnail_url(self, size='medium', image_format='jpeg'):
+        from django.core.files.storage import default_storage
+        path = self.thumbnails.get(size, {}).get(image_format)
+        return default_storage.url(path) if path else None
 
 
 class Category(models.Model):
@@ -23,6 +92,14 @@ class Category(models.Model):
         null=True,
         verbose_name=_('Изображение')
     )
+    image_asset = models.ForeignKey(
+        ImageAsset,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_('Миниатюры изображения')
+    )
     slug = models.SlugField(
         max_length=255,
         unique=True,
@@ -55,6 +132,12 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # slug уникален, поэтому пустое значение допустимо только у одной категории
+        if not self.slug:
+            self.slug = build_category_slug(self.name)
+        super().save(*args, **kwargs)
+
     @property
     def products_count(self):
         """Количество товаров в категории"""
@@ -113,6 +196,11 @@ class Product(models.Model):
         default=True,
         verbose_name=_('Доступен для заказа')
     )
+    # Ручное снятие с продажи: is_available вычисляется из остатка, этот флаг его перекрывает
+    is_delisted = models.BooleanField(
+        default=False,
+        verbose_name=_('Снят с продажи вручную')
+    )
     is_featured = models.BooleanField(
         default=False,
         verbose_name=_('Рекомендуемый товар')
@@ -125,6 +213,14 @@ class Product(models.Model):
         null=True,
         verbose_name=_('Изображение')
     )
+    image_asset = models.ForeignKey(
+        ImageAsset,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_('Миниатюры изображения')
+    )
 
     # SEO и идентификация
     sku = models.CharField(
@@ -134,13 +230,23 @@ class Product(models.Model):
         verbose_name=_('Артикул')
     )
 
+    # Хеш импортированных полей и характеристик (для пропуска неизмененных товаров при реимпорте)
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        verbose_name=_('Хеш содержимого')
+    )
+
     # Даты
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name=_('Дата создания')
     )
+    # Маркер изменения товара (в т.ч. характеристик и изображений), по нему строится инкрементальный экспорт
     updated_at = models.DateTimeField(
         auto_now=True,
+        db_index=True,
         verbose_name=_('Дата обновления')
     )
 
@@ -153,6 +259,14 @@ class Product(models.Model):
     def __str__(self):
         return f"{self.name} - {self.supplier.name}"
 
+    def save(self, *args, **kwargs):
+        # Доступность следует из остатка и ручного снятия с продажи (админка, API, update_or_create)
+        self.is_available = is_stock_available(self.quantity, self.min_quantity, self.is_delisted)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'quantity', 'min_quantity', 'is_delisted'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'is_available'}
+        super().save(*args, **kwargs)
+
     @property
     def available_quantity(self):
         """Доступное для заказа количество"""
@@ -163,6 +277,47 @@ class Product(models.Model):
         """Есть ли скидка на товар"""
         return self.old_price and self.old_price > self.price
 
+    @property
+    def discount_percentage(self):
+        """Размер скидки в процентах"""
+        if not self.has_discount:
+            return 0
+        return int((self.old_price - self.price) * 100 / self.old_price)
+
+    @property
+    def is_new(self):
+        """Товар добавлен недавно"""
+        return self.created_at is not None and self.created_at >= timezone.now() - NEW_PRODUCT_PERIOD
+
+    @property
+    def main_image_url(self):
+        """URL миниатюры основного изображения (оригинал в списки не отдается)"""
+        return self.image_asset.thumbnail_url() if self.image_asset else None
+
+    @property
+    def thumbnails(self):
+        """URL всех миниатюр основного изображения"""
+        return self.image_asset.thumbnail_urls() if self.image_asset else {}
+
+
+class DeletedProduct(models.Model):
+    """След удаленного товара для инкрементального экспорта"""
+    product_id = models.BigIntegerField(verbose_name=_('ID товара'))
+    sku = models.CharField(max_length=100, blank=True, verbose_name=_('Артикул'))
+    # Без внешнего ключа: запись должна пережить удаление поставщика
+    supplier_id = models.BigIntegerField(null=True, blank=True, db_index=True, verbose_name=_('ID поставщика'))
+    supplier_name = models.CharField(max_length=255, blank=True, verbose_name=_('Поставщик'))
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name=_('Дата удаления'))
+
+    class Meta:
+        verbose_name = _('Удаленный товар')
+        verbose_name_plural = _('Удаленные товары')
+        ordering = ['deleted_at']
+        db_table = 'deleted_products'
+
+    def __str__(self):
+        return f"{self.sku} ({self.deleted_at})"
+
 
 class ProductCharacteristic(models.Model):
     """Модель характеристики товара"""
@@ -195,6 +350,14 @@ class ProductImage(models.Model):
         upload_to='products/images/',
         verbose_name=_('Изображение')
     )
+    image_asset = models.ForeignKey(
+        ImageAsset,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_('Миниатюры изображения')
+    )
     alt_text = models.CharField(
         max_length=255,
         blank=True,
@@ -5,23 +5,26 @@ from apps.products.models import Product, Category, ProductCharacteristic, Produ
 class ProductCharacteristicSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductCharacteristic
-        fields = ['name', 'value', 'unit', 'is_important']
+        fields = ['name', 'value']
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    thumbnails = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = ['image', 'alt_text', 'is_main', 'display_order']
+        fields = ['image', 'thumbnails', 'alt_text', 'display_order']
+
+    def get_thumbnails(self, obj):
+        return obj.image_asset.thumbnail_urls() if obj.image_asset else {}
 
 
 class ProductReviewSerializer(serializers.ModelSerializer):
     user_name = serializers.CharField(source='user.get_full_name', read_only=True)
-    rating_stars = serializers.CharField(source='rating_stars', read_only=True)
 
     class Meta:
         model = ProductReview
-        fields = ['id', 'user', 'user_name', 'rating', 'rating_stars', 'title',
-                 'comment', 'advantages', 'disadvantages', 'created_at']
+        fields = ['id', 'user', 'user_name', 'rating', 'comment', 'created_at']
         read_only_fields = ['user', 'created_at']
 
 
@@ -31,7 +34,8 @@ class ProductSerializer(serializers.ModelSerializer):
     characteristics = ProductCharacteristicSerializer(many=True, read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
     reviews = ProductReviewSerializer(many=True, read_only=True)
-    main_image_url = serializers.CharField(source='main_image_url', read_only=True)
+    main_image_url = serializers.CharField(read_only=True)
+    thumbnails = serializers.DictField(read_only=True)
     available_quantity = serializers.IntegerField(read_only=True)
     has_discount = serializers.BooleanField(read_only=True)
     discount_percentage = serializers.IntegerField(read_only=True)
@@ -41,28 +45,37 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'description', 'short_description', 'category', 'category_name',
             'supplier', 'supplier_name', 'price', 'old_price', 'quantity', 'available_quantity',
-            'min_quantity', 'is_available', 'is_featured', 'is_new', 'main_image', 'main_image_url',
-            'sku', 'slug', 'characteristics', 'images', 'reviews', 'has_discount',
+            'min_quantity', 'is_available', 'is_delisted', 'is_featured', 'is_new', 'image', 'main_image_url',
+            'thumbnails', 'sku', 'characteristics', 'images', 'reviews', 'has_discount',
             'discount_percentage', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at']
+        read_only_fields = ['is_available', 'created_at', 'updated_at']
 
 
 class CategorySerializer(serializers.ModelSerializer):
     products_count = serializers.IntegerField(read_only=True)
     children = serializers.SerializerMethodField()
+    # Миниатюра вместо оригинала
+    image = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
         fields = [
-            'id', 'name', 'description', 'parent', 'image', 'slug',
+            'id', 'name', 'description', 'parent', 'image', 'thumbnails', 'slug',
             'display_order', 'is_active', 'products_count', 'children'
         ]
         read_only_fields = ['created_at', 'updated_at']
 
+    def get_image(self, obj):
+        return obj.image_asset.thumbnail_url() if obj.image_asset else None
+
+    def get_thumbnails(self, obj):
+        return obj.image_asset.thumbnail_urls() if obj.image_asset else {}
+
     def get_children(self, obj):
         """Рекурсивно получаем дочерние категории"""
-        children = obj.children.filter(is_active=True)
+        children = obj.children.filter(is_active=True).select_related('image_asset')
         return CategorySerializer(children, many=True).data
 
 
@@ -70,14 +83,16 @@ class ProductListSerializer(serializers.ModelSerializer):
     """Упрощенный сериализатор для списка товаров"""
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
-    main_image_url = serializers.CharField(source='main_image_url', read_only=True)
+    main_image_url = serializers.CharField(read_only=True)
+    thumbnails = serializers.DictField(read_only=True)
     has_discount = serializers.BooleanField(read_only=True)
     discount_percentage = serializers.IntegerField(read_only=True)
+    is_new = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'short_description', 'category_name', 'supplier_name',
-            'price', 'old_price', 'is_available', 'main_image_url',
+            'price', 'old_price', 'is_available', 'main_image_url', 'thumbnails',
             'has_discount', 'discount_percentage', 'is_featured', 'is_new'
         ]
@@ -0,0 +1,54 @@
+import logging
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.products.models import Category, DeletedProduct, Product, ProductCharacteristic, ProductImage
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_delete, sender=Product)
+def record_deleted_product(sender, instance, **kwargs):
+    """Сохраняет след удаленного товара для инкрементального экспорта"""
+    from apps.suppliers.models import Supplier
+
+    supplier_name = Supplier.objects.filter(pk=instance.supplier_id).values_list('name', flat=True).first()
+    DeletedProduct.objects.create(
+        product_id=instance.pk,
+        sku=instance.sku,
+        supplier_id=instance.supplier_id,
+        supplier_name=supplier_name or ''
+    )
+
+
+@receiver(post_save, sender=ProductCharacteristic)
+@receiver(post_delete, sender=ProductCharacteristic)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product(sender, instance, **kwargs):
+    """Изменение характеристики или изображения меняет маркер изменения товара"""
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=ProductImage)
+def schedule_image_processing(sender, instance, **kwargs):
+    """Новое загруженное изображение обрабатывается в фоне (миниатюры и дедупликация)"""
+    from apps.core.images import ORIGINALS_DIR
+
+    # Файл уже лежит под именем по хешу: обработан раньше (без запроса к ImageAsset)
+    if not instance.image or (instance.image_asset_id and instance.image.name.startswith(ORIGINALS_DIR + '/')):
+        return
+
+    def enqueue():
+        try:
+            from apps.core.tasks import process_uploaded_images_task
+            process_uploaded_images_task.delay(sender._meta.label, [instance.pk])
+        except Exception as e:
+            # Без брокера изображение останется без миниатюр до build_thumbnails
+            logger.warning("Ошибка постановки обработки изображения: %s", e, extra={'object': instance})
+
+    transaction.on_commit(enqueue)
@@ -3,7 +3,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
-from apps.products.models import Product, Category, ProductReview
+from django.utils import timezone
+from apps.products.models import NEW_PRODUCT_PERIOD, Product, Category, ProductReview
 from apps.products.serializers import (
     ProductSerializer, CategorySerializer, ProductListSerializer, ProductReviewSerializer
 )
@@ -11,12 +12,12 @@ from apps.products.serializers import (
 
 class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Product.objects.filter(is_available=True).select_related(
-        'category', 'supplier'
+        'category', 'supplier', 'image_asset'
     ).prefetch_related(
-        'characteristics', 'images', 'reviews'
+        'characteristics', 'images__image_asset', 'reviews__user'
     )
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'supplier', 'is_featured', 'is_new']
+    filterset_fields = ['category', 'supplier', 'is_featured']
     search_fields = ['name', 'description', 'short_description', 'sku']
     ordering_fields = ['price', 'created_at', 'name']
     ordering = ['-created_at']
@@ -33,7 +34,7 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         similar_products = Product.objects.filter(
             category=product.category,
             is_available=True
-        ).exclude(id=product.id)[:8]
+        ).select_related('category', 'supplier', 'image_asset').exclude(id=product.id)[:8]
 
         serializer = ProductListSerializer(similar_products, many=True)
         return Response(serializer.data)
@@ -44,7 +45,7 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         featured_products = Product.objects.filter(
             is_featured=True,
             is_available=True
-        )[:12]
+        ).select_related('category', 'supplier', 'image_asset')[:12]
 
         serializer = ProductListSerializer(featured_products, many=True)
         return Response(serializer.data)
@@ -53,9 +54,9 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     def new(self, request):
         """Новые товары"""
         new_products = Product.objects.filter(
-            is_new=True,
+            created_at__gte=timezone.now() - NEW_PRODUCT_PERIOD,
             is_available=True
-        )[:12]
+        ).select_related('category', 'supplier', 'image_asset').order_by('-created_at')[:12]
 
         serializer = ProductListSerializer(new_products, many=True)
         return Response(serializer.data)
@@ -92,7 +93,7 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Category.objects.filter(is_active=True)
+    queryset = Category.objects.filter(is_active=True).select_related('image_asset')
     serializer_class = CategorySerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'description']
@@ -104,7 +105,7 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
         products = Product.objects.filter(
             category=category,
             is_available=True
-        )
+        ).select_related('category', 'supplier', 'image_asset')
 
         page = self.paginate_queryset(products)
         if page is not None:
@@ -1,7 +1,9 @@
 import os
 import sys
 from pathlib import Path
+from celery.schedules import crontab
 from decouple import config
+from kombu import Queue
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -40,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.core.middleware.MetricsMiddleware',
+    'apps.core.middleware.APIRequestLogMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -75,6 +79,14 @@ DATABASES = {
     }
 }
 
+# Кеш, общий для веб-процессов и воркеров Celery (счетчики уведомлений, версии шаблонов писем).
+# Без CACHE_URL - локальный кеш процесса: значения между процессами не согласуются
+CACHE_URL = config('CACHE_URL', default='')
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}
+    if CACHE_URL else {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+}
+
 # Настройки Email
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 if EMAIL_BACKEND == 'django.core.mail.backends.smtp.EmailBackend':
@@ -85,6 +97,12 @@ if EMAIL_BACKEND == 'django.core.mail.backends.smtp.EmailBackend':
     EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
     DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@procurepro.com')
 
+# Очередь исходящих писем: размер пачки на одно SMTP-соединение,
+# задержка запуска отправки (письма успевают накопиться) и число попыток
+EMAIL_OUTBOX_BATCH_SIZE = config('EMAIL_OUTBOX_BATCH_SIZE', default=100, cast=int)
+EMAIL_OUTBOX_DELAY = config('EMAIL_OUTBOX_DELAY', default=2, cast=int)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+
 # Настройки Celery для асинхронных задач
 CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
@@ -93,6 +111,140 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Europe/Moscow'
 
+# Очереди: письма не ждут многочасовых импортов и копий, у каждой очереди свой воркер
+# (профили в docker-compose.yml). Проверка маршрутов: manage.py check_task_routes
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_QUEUES = (
+    Queue('default'),
+    Queue('email'),        # письма и уведомления пользователям
+    Queue('bulk'),         # импорт, экспорт, изображения, резервные копии
+    Queue('maintenance'),  # короткие периодические задачи обслуживания
+    Queue('reports'),      # сводки и отчеты
+)
+CELERY_TASK_ROUTES = {
+    'apps.core.tasks.send_order_confirmation_email': {'queue': 'email'},
+    'apps.core.tasks.send_order_to_admin': {'queue': 'email'},
+    'apps.core.tasks.send_notification_email': {'queue': 'email'},
+    'apps.core.tasks.drain_email_outbox_task': {'queue': 'email'},
+    'apps.core.tasks.fan_out_notifications_task': {'queue': 'email'},
+    'apps.core.tasks.create_notifications_task': {'queue': 'email'},
+    'apps.core.tasks.import_products_task': {'queue': 'bulk'},
+    'apps.core.tasks.import_products_sharded_task': {'queue': 'bulk'},
+    'apps.core.tasks.import_shard_task': {'queue': 'bulk'},
+    'apps.core.tasks.finish_sharded_import': {'queue': 'bulk'},
+    'apps.core.tasks.export_products_task': {'queue': 'bulk'},
+    'apps.core.tasks.process_uploaded_images_task': {'queue': 'bulk'},
+    'apps.core.tasks.generate_backup_task': {'queue': 'bulk'},
+    'apps.core.tasks.cleanup_old_files_task': {'queue': 'maintenance'},
+    'apps.core.tasks.run_backup_schedules_task': {'queue': 'maintenance'},
+    'apps.core.tasks.update_product_availability': {'queue': 'maintenance'},
+    'apps.core.tasks.refresh_sales_rollups_task': {'queue': 'reports'},
+    'apps.core.tasks.send_daily_sales_report': {'queue': 'reports'},
+    'apps.core.tasks.debug_task': {'queue': 'default'},
+}
+# Воркер берет по одной задаче на процесс: длинная задача не держит за собой очередь
+# из уже полученных сообщений (воркер писем переопределяет множитель в docker-compose.yml)
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Ограничения времени по умолчанию (секунды); длинные задачи задают свои
+CELERY_TASK_SOFT_TIME_LIMIT = config('CELERY_TASK_SOFT_TIME_LIMIT', default=10 * 60, cast=int)
+CELERY_TASK_TIME_LIMIT = config('CELERY_TASK_TIME_LIMIT', default=15 * 60, cast=int)
+LONG_TASK_SOFT_TIME_LIMIT = config('LONG_TASK_SOFT_TIME_LIMIT', default=6 * 60 * 60, cast=int)
+LONG_TASK_TIME_LIMIT = config('LONG_TASK_TIME_LIMIT', default=LONG_TASK_SOFT_TIME_LIMIT + 10 * 60, cast=int)
+# Redis возвращает неподтвержденное (acks_late) сообщение в очередь через visibility_timeout:
+# он должен быть больше самой длинной задачи, иначе импорт запустится второй раз
+CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': LONG_TASK_TIME_LIMIT + 60 * 60}
+
+# Периодические задачи (celery beat)
+CELERY_BEAT_SCHEDULE = {
+    # Почасовые сводки продаж: через несколько минут после начала часа, когда заказы прошлого часа зафиксированы
+    'refresh-sales-rollups': {
+        'task': 'apps.core.tasks.refresh_sales_rollups_task',
+        'schedule': crontab(minute=5),
+    },
+    'run-backup-schedules': {
+        'task': 'apps.core.tasks.run_backup_schedules_task',
+        'schedule': crontab(),
+    },
+    'cleanup-media-files': {
+        'task': 'apps.core.tasks.cleanup_old_files_task',
+        'schedule': crontab(hour=3, minute=30),
+    },
+}
+
+# Количество шардов параллельного импорта (обычно 1-2 на воркер)
+IMPORT_SHARD_COUNT = config('IMPORT_SHARD_COUNT', default=8, cast=int)
+
+# Логирование: приложения пишут в консоль и в SystemLog (от SYSTEM_LOG_LEVEL). Запись в SystemLog
+# идет из фонового потока пачками, обработка запроса не ждет базу
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {
+            'format': '{asctime} {levelname} {name}: {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'verbose',
+        },
+        'system_log': {
+            'class': 'apps.core.log_handlers.SystemLogHandler',
+            'level': config('SYSTEM_LOG_LEVEL', default='WARNING'),
+            'queue_size': 10000,
+            'batch_size': 200,
+            'flush_interval': 2.0,
+        },
+    },
+    'loggers': {
+        'apps': {
+            'handlers': ['console', 'system_log'],
+            'level': config('APPS_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+        'django.request': {
+            'handlers': ['system_log'],
+            'level': 'ERROR',
+        },
+    },
+}
+
+# Журнал API запросов (APIRequestLog): записи копятся в буфере процесса и пишутся пачками
+# фоновым потоком - по flush_size записей или раз в flush_interval секунд. При полном буфере
+# новые записи отбрасываются. sample_rates - доля логируемых запросов по префиксу пути
+# (выбирается самый длинный подходящий), ошибки 5xx пишутся всегда
+API_REQUEST_LOG = {
+    'enabled': config('API_REQUEST_LOG_ENABLED', default=True, cast=bool),
+    'buffer_size': 10000,
+    'flush_size': 500,
+    'flush_interval': 2.0,
+    'sample_rates': {
+        '/api/': 1.0,
+        '/api/products/': 0.1,
+    },
+    'default_sample_rate': 0.0,
+    'always_log_errors': True,
+    # Тела запросов и ответов (JSON, формы, текст): секреты скрываются, длина ограничена
+    'log_bodies': config('API_REQUEST_LOG_BODIES', default=False, cast=bool),
+    'body_max_length': 2000,
+    'body_read_limit': 64 * 1024,
+}
+
+# Метрики по представлениям в формате Prometheus (/metrics). Каждый процесс раз в flush_interval
+# секунд сохраняет свои счетчики в файл в dir; каталог должен быть общим для всех процессов сервера.
+# buckets - границы гистограммы времени ответа (секунды)
+METRICS = {
+    'enabled': config('METRICS_ENABLED', default=True, cast=bool),
+    'dir': config('METRICS_DIR', default=str(BASE_DIR / 'logs' / 'metrics')),
+    'flush_interval': 5.0,
+    'buckets': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+    'exclude_paths': ['/metrics'],
+    # Без аутентификации /metrics доступен только с этих адресов (сборщик Prometheus)
+    'allowed_ips': config('METRICS_ALLOWED_IPS', default='127.0.0.1', cast=lambda value: value.split(',')),
+}
+
 # Настройки REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -136,6 +288,35 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Изображения: импорт принимает локальные пути только внутри этого каталога
+IMAGE_IMPORT_ROOT = config('IMAGE_IMPORT_ROOT', default=str(MEDIA_ROOT / 'import_images'))
+# Миниатюры: название -> максимальная сторона в пикселях
+IMAGE_THUMBNAIL_SIZES = {'small': 200, 'medium': 600, 'large': 1200}
+# Процессов обработки изображений (0 - по числу ядер)
+IMAGE_WORKERS = config('IMAGE_WORKERS', default=0, cast=int)
+
+# Резервные копии: каталог, сжатие (gzip/zstd/none) и снимок SQLite порциями страниц
+# с паузой между ними, чтобы запись в базу не ждала окончания копирования
+BACKUP_ROOT = config('BACKUP_ROOT', default=str(BASE_DIR / 'backups'))
+BACKUP_COMPRESSION = config('BACKUP_COMPRESSION', default='gzip')
+BACKUP_PAGES_PER_STEP = config('BACKUP_PAGES_PER_STEP', default=1024, cast=int)
+BACKUP_STEP_PAUSE = config('BACKUP_STEP_PAUSE', default=0.005, cast=float)
+# Перезапусков снимка из-за записи в базу, после которых остаток копируется за один шаг
+BACKUP_MAX_RESTARTS = config('BACKUP_MAX_RESTARTS', default=3, cast=int)
+# Через сколько секунд блокировка графика копирования считается брошенной (упавший воркер)
+BACKUP_LOCK_TIMEOUT = config('BACKUP_LOCK_TIMEOUT', default=6 * 60 * 60, cast=int)
+# Каталоги MEDIA_ROOT, которые не попадают в копию
+BACKUP_MEDIA_EXCLUDE = ['temp']
+
+# Хранение временных файлов и выгрузок: каталог относительно MEDIA_ROOT -> правила.
+# max_age_days - удалять старше N дней, keep_last - оставлять N самых новых,
+# max_total_mb - удалять самые старые, пока каталог больше лимита
+MEDIA_RETENTION_POLICIES = {
+    'temp': {'max_age_days': 2, 'recursive': True},
+    'imports': {'max_age_days': 7},
+    'exports': {'max_age_days': 7, 'keep_last': 50, 'max_total_mb': 2048},
+}
+
 LANGUAGE_CODE = 'ru-ru'
 TIME_ZONE = 'Europe/Moscow'
 USE_I18N = True
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from apps.core.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -12,6 +13,7 @@ urlpatterns = [
     path('api/suppliers/', include('apps.suppliers.urls')),
     path('api/core/', include('apps.core.urls')),
     path('api-auth/', include('rest_framework.urls')),
+    path('metrics', metrics, name='metrics'),
 ]
 
 if settings.DEBUG: